@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import os
 
+from dashboard_data import DashboardData
+from downsampling import point_budget
+from forecast_jobs import JobQueue
+from paths import BACKTEST_CITY_PATH, BACKTEST_HORIZON_PATH
+
 # ======================================================
 # PAGE CONFIG
 # ======================================================
@@ -58,49 +62,32 @@ st.title(" Renewable Energy Forecasting Analytics")
 # ======================================================
 # DATA LOADING
 # ======================================================
+# Walk-forward reliability tables from backtest.py (None until it has run)
 @st.cache_data
-def load_main_data():
-    path = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\master\india_renewable_energy_analytics_master.csv"
-    df = pd.read_csv(path)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
-
-@st.cache_data
-def load_forecast_data():
-    path = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\master\renewable_energy_forecast_till_2034.csv"
-    df = pd.read_csv(path)
-
-    # Normalize column names
-    df.columns = df.columns.str.lower().str.strip()
+def load_backtest_metrics():
+    if not (os.path.exists(BACKTEST_CITY_PATH) and os.path.exists(BACKTEST_HORIZON_PATH)):
+        return None, None
+    return pd.read_csv(BACKTEST_CITY_PATH), pd.read_csv(BACKTEST_HORIZON_PATH)
 
-    # --- Flexible time handling ---
-    if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"])
+# One per server process: per-city reads + a small LRU shared by every session
+@st.cache_resource
+def load_dashboard_data():
+    return DashboardData()
 
-    elif "year" in df.columns:
-        df["date"] = pd.to_datetime(df["year"].astype(str) + "-01-01")
 
-    elif "forecast_year" in df.columns:
-        df["date"] = pd.to_datetime(df["forecast_year"].astype(str) + "-01-01")
 
-    elif "ds" in df.columns:
-        df["date"] = pd.to_datetime(df["ds"])
-
-    else:
-        # LAST RESORT: generate year sequence (2014–2034)
-        start_year = 2014
-        df["date"] = pd.date_range(
-            start=f"{start_year}-01-01",
-            periods=len(df),
-            freq="YS"
-        )
+@st.cache_resource
+def load_job_queue():
+    return JobQueue()
 
-    return df
 
 
+data = load_dashboard_data()
+jobs = load_job_queue()
 
-df_main = load_main_data()
-df_forecast = load_forecast_data()
+# A background refresh finished since these slices were cached -> reread
+if data.sync(jobs.data_version()):
+    load_backtest_metrics.clear()
 
 # ======================================================
 # SIDEBAR – OBJECTIVE NAVIGATION
@@ -119,10 +106,38 @@ if st.sidebar.button("3️⃣ Weather Contribution Analysis"):
 if st.sidebar.button("4️⃣ Forecast Reliability Assessment"):
     st.session_state.objective = 4
 
+# ======================================================
+# SIDEBAR – BACKGROUND FORECAST REFRESH
+# ======================================================
+# Jobs run in forecast_jobs.py workers; the page keeps showing the last
+# good snapshot and only polls the queue
+st.sidebar.divider()
+st.sidebar.header("Forecast Refresh")
+
+if st.sidebar.button("🔁 Refresh forecasts"):
+    job_id = jobs.submit("refresh", reason="dashboard")
+    st.sidebar.caption(f"Job {job_id} queued")
+
+@st.fragment(run_every="10s")
+def render_job_status():
+    job = jobs.latest()
+    if job is None:
+        st.caption("No refresh jobs yet (start: python forecast_jobs.py worker --watch)")
+    else:
+        when = job["finished"] or job["started"] or job["submitted"]
+        st.caption(f"Last job {job['id']} ({job['kind']}): {job['status']} · {when}")
+
+    # Rerun the whole page as soon as a new snapshot is available
+    if jobs.data_version() != data.version:
+        st.rerun()
+
+with st.sidebar:
+    render_job_status()
+
 st.sidebar.divider()
 st.sidebar.header("Filters")
 
-city = st.sidebar.selectbox("City", sorted(df_main.city.unique()))
+city = st.sidebar.selectbox("City", data.cities())
 
 # Date filter ONLY for Objectives 1–3
 start, end = st.sidebar.date_input(
@@ -131,16 +146,18 @@ start, end = st.sidebar.date_input(
     format="DD/MM/YYYY"
 )
 
+# Charts never get more points than they have pixels (see downsampling.py)
+chart_width = st.sidebar.select_slider(
+    "Chart width (px)", options=[800, 1200, 1600, 2400], value=1600
+)
+max_points = point_budget(chart_width)
+
 # ======================================================
 # COMMON FILTERED DATA (OBJECTIVES 1–3)
 # ======================================================
-df_filtered = df_main[
-    (df_main.city == city) &
-    (df_main.date >= pd.to_datetime(start)) &
-    (df_main.date <= pd.to_datetime(end))
-].copy()
-
-df_filtered["date_str"] = df_filtered["date"].dt.strftime("%d/%m/%Y")
+# Only this city is read (and then kept hot); binary search on its dates
+df_filtered = data.slice(city, start, end)
+kpi = data.kpis(city, start, end)
 
 # ======================================================
 # METRICS (UNCHANGED)
@@ -148,14 +165,13 @@ df_filtered["date_str"] = df_filtered["date"].dt.strftime("%d/%m/%Y")
 c1, c2, c3, c4 = st.columns(4)
 
 with c1:
-    st.markdown(f"<div class='metric-box'><b>Total Energy</b><br>{df_filtered.energy_generated.sum():,.0f}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='metric-box'><b>Total Energy</b><br>{kpi['total_energy']:,.0f}</div>", unsafe_allow_html=True)
 with c2:
-    st.markdown(f"<div class='metric-box'><b>Avg Efficiency Index</b><br>{df_filtered.energy_efficiency_index.mean():.2f}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='metric-box'><b>Avg Efficiency Index</b><br>{kpi['avg_efficiency']:.2f}</div>", unsafe_allow_html=True)
 with c3:
-    st.markdown(f"<div class='metric-box'><b>Max Energy Output</b><br>{df_filtered.energy_generated.max():.1f}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='metric-box'><b>Max Energy Output</b><br>{kpi['max_energy']:.1f}</div>", unsafe_allow_html=True)
 with c4:
-    mae = np.mean(np.abs(df_filtered.energy_generated - df_filtered.predicted_energy))
-    st.markdown(f"<div class='metric-box'><b>Forecast MAE</b><br>{mae:.3f}</div>", unsafe_allow_html=True)
+    st.markdown(f"<div class='metric-box'><b>Forecast MAE</b><br>{kpi['mae']:.3f}</div>", unsafe_allow_html=True)
 
 st.divider()
 
@@ -165,7 +181,8 @@ st.divider()
 def render_objective_1(df):
     st.subheader(" Energy Generation Performance")
 
-    fig = px.area(df, x="date_str", y="energy_generated",
+    chart_df = data.area(city, start, end, "energy_generated", max_points)
+    fig = px.area(chart_df, x="date_str", y="energy_generated",
                   template="plotly_dark")
     st.plotly_chart(fig, use_container_width=True)
 
@@ -198,7 +215,8 @@ def render_objective_1(df):
 def render_objective_2(df):
     st.subheader(" Energy Efficiency Dominance")
 
-    fig = px.bar(df, x="date_str", y="energy_efficiency_index",
+    chart_df = data.line(city, start, end, "energy_efficiency_index", max_points)
+    fig = px.bar(chart_df, x="date_str", y="energy_efficiency_index",
                  template="plotly_dark")
     st.plotly_chart(fig, use_container_width=True)
 
@@ -234,10 +252,14 @@ def render_objective_3(df):
     feature = st.selectbox("Weather Variable",
                            ["sunshine_hours", "wind_speed", "temperature"])
 
-    corr = df[[feature, "energy_generated"]].corr().iloc[0, 1]
+    # Combined from precomputed monthly sums (correlation_cube.py), no row scan
+    corr = data.correlation(city, feature, start, end)
 
-    fig = px.scatter(df, x=feature, y="energy_generated",
+    # Dense ranges are averaged per grid cell; "points" is the cell's row count
+    chart_df = data.scatter(city, start, end, feature, "energy_generated", max_points)
+    fig = px.scatter(chart_df, x=feature, y="energy_generated",
                      size="energy_generated",
+                     hover_data=["points"],
                      template="plotly_dark")
     st.plotly_chart(fig, use_container_width=True)
 
@@ -262,16 +284,22 @@ def render_objective_3(df):
         </div>
         """, unsafe_allow_html=True)
 
+    # Every city x weather variable for the same range, straight from the cube
+    with st.expander("Cross-city weather correlation"):
+        matrix = data.correlation_matrix(start, end)
+        fig_m = px.imshow(matrix, text_auto=".2f", aspect="auto",
+                          color_continuous_scale="RdBu", zmin=-1, zmax=1,
+                          template="plotly_dark",
+                          labels={"x": "Weather variable", "y": "City", "color": "Correlation"})
+        st.plotly_chart(fig_m, use_container_width=True)
+
 # ======================================================
 # OBJECTIVE 4 FUNCTION (FORECAST)
 # ======================================================
 def render_objective_4(city):
     st.subheader(" Forecast Reliability Assessment (2016–2034)")
 
-    df_city = df_forecast[df_forecast["city"] == city].copy()
-
-    df_city.columns = df_city.columns.str.lower()
-    df_city["date"] = pd.to_datetime(df_city["date"])
+    df_city = data.forecast(city)
 
     forecast_col = "energy_generated"
 
@@ -288,6 +316,24 @@ def render_objective_4(city):
         line=dict(color="#d62728")
     ))
 
+    # P10–P90 band from the forest's per-tree forecast paths
+    if {"energy_p10", "energy_p90"}.issubset(future.columns):
+        fig.add_trace(go.Scatter(
+            x=future["date"],
+            y=future["energy_p90"],
+            line=dict(width=0),
+            showlegend=False,
+            hoverinfo="skip"
+        ))
+        fig.add_trace(go.Scatter(
+            x=future["date"],
+            y=future["energy_p10"],
+            name="P10–P90 Band",
+            fill="tonexty",
+            fillcolor="rgba(148, 103, 189, 0.25)",
+            line=dict(width=0)
+        ))
+
     # Forecast (monthly resolution)
     fig.add_trace(go.Scatter(
         x=future["date"],
@@ -308,6 +354,32 @@ def render_objective_4(city):
 
     st.plotly_chart(fig, use_container_width=True)
 
+    # -------------------------------
+    # Walk-forward backtest
+    # -------------------------------
+    bt_city, bt_horizon = load_backtest_metrics()
+
+    if bt_city is None:
+        st.info("Run backtest.py to add walk-forward reliability metrics.")
+    else:
+        row = bt_city[bt_city["CITY"] == city]
+        if row.empty:
+            row = bt_city[bt_city["CITY"] == "ALL"]
+
+        b1, b2, b3 = st.columns(3)
+        with b1:
+            st.markdown(f"<div class='metric-box'><b>Backtest MAE</b><br>{row['MAE'].iloc[0]:.2f}</div>", unsafe_allow_html=True)
+        with b2:
+            st.markdown(f"<div class='metric-box'><b>Backtest RMSE</b><br>{row['RMSE'].iloc[0]:.2f}</div>", unsafe_allow_html=True)
+        with b3:
+            st.markdown(f"<div class='metric-box'><b>Backtest R²</b><br>{row['R2'].iloc[0]:.3f}</div>", unsafe_allow_html=True)
+
+        fig_h = px.line(bt_horizon, x="HORIZON", y=["MAE", "RMSE"], markers=True,
+                        template="plotly_dark",
+                        labels={"HORIZON": "Months ahead", "value": "Error"},
+                        title="Backtest error by forecast horizon (all cities)")
+        st.plotly_chart(fig_h, use_container_width=True)
+
     # -------------------------------
     # Dynamic Insights
     # -------------------------------
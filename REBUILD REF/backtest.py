@@ -0,0 +1,310 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from city_models import TRAINING_MODES
+from forecasters import ENGINES, make_forecaster
+from instrumentation import stage
+from model_registry import NON_FIT_PARAMS, training_key
+from parallel import ordered_map, resolve_workers
+from paths import (BACKTEST_CITY_PATH, BACKTEST_HORIZON_PATH, BACKTEST_PREDICTIONS_PATH,
+                   CACHE_DIR)
+from storage import read_dataset
+from train_random_forest_model import (DATA_PATH, FEATURES, FORECAST_ENGINE, LAG_FEATURES,
+                                       MODEL_PARAMS, TARGET, TRAIN_WORKERS, TRAINING_MODE,
+                                       prepare_training_frame)
+
+# ======================================================
+# WALK-FORWARD BACKTESTING
+# ======================================================
+# Expanding-window folds on the calendar, evaluated per city:
+#
+#   fold 1: train <= 2020-12 | forecast 2021-01 .. 2021-12
+#   fold 2: train <= 2021-12 | forecast 2022-01 .. 2022-12
+#   ...
+#
+# Every fold trains the trainer's model (any engine of forecasters.py, the
+# forest in the trainer's TRAINING_MODE) on all rows up to its origin, then forecasts the way the product does from
+# each city's latest observations, so horizon h errors are what a planner
+# would really see h months out. Cities with a shorter history join the
+# folds they have data for.
+#
+# The lag-feature matrix is built once, saved as .npy files under a content
+# key and memory-mapped by every fold, so worker processes neither rebuild
+# nor receive a pickled copy of it. Fold predictions are cached as well:
+# rerunning with more folds only trains the new ones.
+#
+#   python backtest.py --folds 4 --horizon 12 --workers 0 --engine ridge
+
+N_FOLDS = 4
+HORIZON = 12        # months forecast from every origin
+FOLD_STEP = 12      # months between origins
+MIN_TRAIN_MONTHS = 24
+
+# Fold processes: 1 = sequential, 0 = one per CPU core
+WORKERS = 0
+
+MATRIX_CACHE = os.path.join(CACHE_DIR, "feature_matrix")
+FOLD_CACHE = os.path.join(CACHE_DIR, "backtest")
+
+
+# ======================================================
+# SHARED FEATURE MATRIX
+# ======================================================
+class FeatureMatrix:
+    """X / y / date / city arrays of the training frame, memory-mapped from disk.
+
+    Rows are sorted by city, then date, exactly like the trainer's frame.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.key = os.path.basename(folder)
+
+        with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        self.features = self.metadata["features"]
+
+        def load(name):
+            return np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+
+        self.X = load("X")
+        self.y = load("y")
+        self.dates = load("dates")      # int64 ns
+        self.cities = load("cities")    # unicode labels
+
+        breaks = np.flatnonzero(self.cities[1:] != self.cities[:-1]) + 1
+        self.starts = np.concatenate(([0], breaks))
+        self.stops = np.concatenate((breaks, [len(self.cities)]))
+
+    @classmethod
+    def from_frame(cls, df, features, target, cache_root=MATRIX_CACHE):
+        """Save (once) and open the matrix for a prepared training frame."""
+        key = training_key(df, df[target], {"lag_features": LAG_FEATURES}, features)
+        folder = os.path.join(cache_root, key)
+
+        if not os.path.exists(os.path.join(folder, "meta.json")):
+            tmp_folder = folder + ".tmp"
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+            os.makedirs(tmp_folder)
+
+            np.save(os.path.join(tmp_folder, "X.npy"), df[features].to_numpy(dtype=np.float64))
+            np.save(os.path.join(tmp_folder, "y.npy"), df[target].to_numpy(dtype=np.float64))
+            np.save(os.path.join(tmp_folder, "dates.npy"),
+                    df["DATE"].to_numpy(dtype="datetime64[ns]").view("i8"))
+            np.save(os.path.join(tmp_folder, "cities.npy"), df["CITY"].astype(str).to_numpy(dtype=str))
+
+            with open(os.path.join(tmp_folder, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"features": list(features), "target": target, "rows": len(df)}, f, indent=2)
+
+            shutil.rmtree(folder, ignore_errors=True)
+            os.replace(tmp_folder, folder)
+
+        return cls(folder)
+
+    def months(self):
+        return np.unique(self.dates)
+
+    def last_rows_at(self, origin):
+        """Row index of each city's latest observation on or before `origin`."""
+        idx = []
+        for s, e in zip(self.starts, self.stops):
+            pos = s + np.searchsorted(self.dates[s:e], origin, side="right") - 1
+            if pos >= s:
+                idx.append(pos)
+        return np.asarray(idx, dtype=np.int64)
+
+
+def fold_origins(months, n_folds=N_FOLDS, horizon=HORIZON, step=FOLD_STEP,
+                 min_train=MIN_TRAIN_MONTHS):
+    """Origins (int64 ns), oldest first, each followed by `horizon` known months."""
+    last = len(months) - 1 - horizon
+    origins = [last - k * step for k in range(n_folds)]
+    return [int(months[o]) for o in sorted(origins) if o + 1 >= min_train]
+
+
+# ======================================================
+# ONE FOLD (RUNS IN WORKER PROCESSES)
+# ======================================================
+def fold_params(params, workers):
+    # Parallel folds each get one core instead of fighting over all of them
+    params = dict(params)
+    if "n_jobs" in params and resolve_workers(workers) > 1:
+        params["n_jobs"] = 1
+    return params
+
+
+def fold_cache_path(matrix_key, origin, horizon, config, features=None):
+    # `config` is the forecaster's config(): engine, version, params, training mode
+    fit_config = {k: v for k, v in config.items() if k not in NON_FIT_PARAMS}
+    key = [matrix_key, origin, horizon, fit_config]
+    if features is not None:
+        key.append(list(features))
+    raw = json.dumps(key, sort_keys=True, default=str)
+    return os.path.join(FOLD_CACHE, hashlib.sha256(raw.encode()).hexdigest()[:16] + ".csv")
+
+
+def run_fold(matrix_folder, origin, horizon, params, features=None, engine="random_forest",
+             training_mode="global", train_workers=1):
+    """Train up to `origin`, forecast `horizon` months; one row per city and month.
+
+    `features` picks a subset of the matrix columns (tune_model.py feature
+    sets); by default the model sees all of them. `engine` is any engine of
+    forecasters.py; the forest is fitted in `training_mode` like STEP 7 of
+    the trainer, its routed models over `train_workers` processes.
+    """
+    m = FeatureMatrix(matrix_folder)
+
+    model_features = list(features or m.features)
+    options = {}
+    if engine == "random_forest":
+        options = dict(training_mode=training_mode, n_cities=len(np.unique(m.cities)),
+                       workers=train_workers)
+    model = make_forecaster(engine, model_features, params, **options)
+
+    cache_path = fold_cache_path(m.key, origin, horizon, model.config(), features)
+    if os.path.exists(cache_path):
+        return pd.read_csv(cache_path, parse_dates=["ORIGIN", "DATE"], float_precision="round_trip")
+
+    features = model_features
+    cols = [m.features.index(f) for f in features]
+
+    is_train = m.dates <= origin
+    X_train, y_train = m.X[is_train][:, cols], m.y[is_train]
+    model.fit(X_train, y_train)
+
+    # The engine forecasts from the training rows (last row / last year per city)
+    history = pd.DataFrame(X_train, columns=features)
+    history["CITY"] = m.cities[is_train]
+    history["DATE"] = np.asarray(m.dates[is_train]).astype("datetime64[ns]")
+    history[TARGET] = y_train
+
+    months = m.months()
+    future = months[months > origin][:horizon]
+    forecast = model.forecast(history, future.astype("datetime64[ns]"))
+    forecast["HORIZON"] = np.tile(np.arange(1, len(future) + 1), forecast["CITY"].nunique())
+    forecast = forecast.rename(columns={TARGET: "PREDICTED"})
+
+    actual = pd.DataFrame({
+        "DATE": np.asarray(m.dates).astype("datetime64[ns]"),
+        "CITY": np.asarray(m.cities),
+        "ACTUAL": np.asarray(m.y),
+    })
+
+    # Only months the city actually has are scored
+    result = forecast.merge(actual, on=["DATE", "CITY"], how="inner")
+    result.insert(0, "ORIGIN", pd.Timestamp(origin))
+    result = result[["ORIGIN", "DATE", "CITY", "HORIZON", "ACTUAL", "PREDICTED"]]
+
+    os.makedirs(FOLD_CACHE, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    result.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+    return result
+
+
+# ======================================================
+# METRICS
+# ======================================================
+def error_metrics(frame):
+    err = frame["PREDICTED"] - frame["ACTUAL"]
+    ss_res = float((err ** 2).sum())
+    ss_tot = float(((frame["ACTUAL"] - frame["ACTUAL"].mean()) ** 2).sum())
+    return pd.Series({
+        "MAE": err.abs().mean(),
+        "RMSE": np.sqrt((err ** 2).mean()),
+        "R2": 1 - ss_res / ss_tot if ss_tot > 0 else np.nan,
+        "N": len(frame),
+    })
+
+
+def summarize(predictions):
+    """(by city, by horizon) metric tables, each with an ALL row."""
+    by_city = predictions.groupby("CITY").apply(error_metrics)
+    by_city.loc["ALL"] = error_metrics(predictions)
+
+    by_horizon = predictions.groupby("HORIZON").apply(error_metrics)
+
+    for table in (by_city, by_horizon):
+        table["N"] = table["N"].astype(int)
+    return by_city.reset_index(), by_horizon.reset_index()
+
+
+# ======================================================
+# MAIN
+# ======================================================
+def run(df=None, n_folds=N_FOLDS, horizon=HORIZON, step=FOLD_STEP,
+        params=None, workers=WORKERS, engine=FORECAST_ENGINE, training_mode=TRAINING_MODE):
+    """Walk-forward backtest; writes and returns (predictions, by city, by horizon)."""
+    if params is None:
+        params = MODEL_PARAMS if engine == "random_forest" else {}
+    params = fold_params(params, workers)
+    # Fold processes cannot start pools of their own for routed models
+    train_workers = 1 if resolve_workers(workers) > 1 else TRAIN_WORKERS
+
+    with stage("BACKTEST: FEATURE MATRIX") as s:
+        if df is None:
+            df = read_dataset(DATA_PATH)
+        prepared, _ = prepare_training_frame(df)
+        matrix = FeatureMatrix.from_frame(prepared, FEATURES, TARGET)
+        s.output(prepared, matrix_key=matrix.key)
+
+    origins = fold_origins(matrix.months(), n_folds, horizon, step)
+    if not origins:
+        raise ValueError("❌ Not enough history for a single backtest fold")
+
+    mode = f" ({training_mode})" if engine == "random_forest" else ""
+    print(f"🔁 {engine}{mode}: {len(origins)} folds, horizon {horizon}: "
+          + ", ".join(str(pd.Timestamp(o).date()) for o in origins))
+
+    with stage("BACKTEST: FOLDS", rows_in=len(origins)) as s:
+        folds = ordered_map(
+            run_fold,
+            [matrix.folder] * len(origins),
+            origins,
+            [horizon] * len(origins),
+            [params] * len(origins),
+            [None] * len(origins),
+            [engine] * len(origins),
+            [training_mode] * len(origins),
+            [train_workers] * len(origins),
+            workers=workers
+        )
+        predictions = pd.concat(folds, ignore_index=True)
+        s.output(predictions)
+
+    by_city, by_horizon = summarize(predictions)
+
+    predictions.to_csv(BACKTEST_PREDICTIONS_PATH, index=False)
+    by_city.to_csv(BACKTEST_CITY_PATH, index=False)
+    by_horizon.to_csv(BACKTEST_HORIZON_PATH, index=False)
+
+    print("\n📊 BACKTEST BY HORIZON")
+    print(by_horizon.to_string(index=False, float_format="%.3f"))
+    print("\n📊 BACKTEST BY CITY")
+    print(by_city.to_string(index=False, float_format="%.3f"))
+    print(f"\n📄 Saved at: {BACKTEST_CITY_PATH}")
+
+    return predictions, by_city, by_horizon
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the forest model.")
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="months per fold")
+    parser.add_argument("--step", type=int, default=FOLD_STEP, help="months between origins")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="0 = one per CPU core")
+    parser.add_argument("--engine", default=FORECAST_ENGINE, choices=sorted(ENGINES))
+    parser.add_argument("--training-mode", default=TRAINING_MODE, choices=TRAINING_MODES,
+                        help="how the forest is fitted (see city_models.py)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(n_folds=args.folds, horizon=args.horizon, step=args.step, workers=args.workers,
+        engine=args.engine, training_mode=args.training_mode)
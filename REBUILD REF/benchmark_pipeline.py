@@ -0,0 +1,345 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+from build_features_and_master import build_city_features
+from city_index import CityIndex
+from convert_nasa_matrix_to_clean import convert_nasa_matrix
+from forecasters import ENGINES, make_forecaster
+from lag_features import add_lag_features
+from parallel import ordered_map
+
+# ======================================================
+# PIPELINE BENCHMARKS
+# ======================================================
+# Generates synthetic NASA POWER matrix files and master datasets at a given
+# scale, then times each pipeline stage with the real project code:
+#
+#   ingest     convert_nasa_matrix on every solar/wind file
+#   features   build_city_features (pivot + merge) for every city
+#   train      lag features + fit, for every engine of forecasters.py
+#   forecast   engine.forecast over the horizon for every city; the first
+#              HOLDOUT steps are held out of training and scored (MAE)
+#   dashboard  CityIndex build + random (city, date range) KPI queries
+#
+# Each stage records wall time and peak memory: the growth of the process
+# RSS over the stage, polled by a background thread. Unlike allocation
+# tracing this counts native allocations (sklearn tree building) and does
+# not slow the timed code; memory of ingest worker processes is not
+# included.
+# Results are appended as JSON lines so runs can be compared over time.
+#
+#   python benchmark_pipeline.py --cities 15 100 1000 --freq MS D
+#
+# Only monthly POWER matrix files exist, so --freq scales the master dataset
+# used by train/forecast/dashboard; ingest always uses monthly matrices.
+
+SOLAR_PARAMS = ["ALLSKY_SFC_SW_DIFF", "ALLSKY_SFC_SW_DNI", "ALLSKY_SFC_SW_DWN",
+                "PS", "RH2M", "T2M_MAX", "T2M_MIN"]
+WIND_PARAMS = ["WD10M", "WS10M", "WS2M"]
+
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+          "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+FEATURES = [
+    "CITY_ENCODED", "EFFICIENCY_INDEX", "SUNSHINE_HOURS", "SOLAR_IRRADIANCE",
+    "TEMPERATURE", "WIND_SPEED", "HUMIDITY", "ENERGY_LAG_1", "ENERGY_LAG_12"
+]
+
+RESULTS_FILE = "benchmark_results.jsonl"
+
+# Seconds between RSS polls while a stage runs
+RSS_INTERVAL = 0.01
+
+# Trailing periods left out of training and scored against the forecast
+HOLDOUT = 12
+
+
+# ======================================================
+# SYNTHETIC DATA
+# ======================================================
+def city_names(n_cities):
+    return [f"City{i:04d}" for i in range(n_cities)]
+
+
+def write_power_matrix(path, params, years, rng):
+    lines = [
+        "-BEGIN HEADER-",
+        "NASA/POWER Source Native Resolution Monthly and Annual (synthetic)",
+        "-END HEADER-",
+        "PARAMETER,YEAR," + ",".join(MONTHS) + ",ANN",
+    ]
+    for param in params:
+        base = rng.uniform(1, 100)
+        for year in years:
+            values = base + rng.normal(0, base * 0.1, 12)
+            row = [param, str(year)] + [f"{v:.4f}" for v in values] + [f"{values.mean():.4f}"]
+            lines.append(",".join(row))
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def make_power_files(folder, n_cities, years, seed=0):
+    rng = np.random.default_rng(seed)
+    for city in city_names(n_cities):
+        write_power_matrix(os.path.join(folder, f"{city}_solar.csv"), SOLAR_PARAMS, years, rng)
+        write_power_matrix(os.path.join(folder, f"{city}_wind.csv"), WIND_PARAMS, years, rng)
+
+
+def make_master_frame(n_cities, start, end, freq, seed=0):
+    """Synthetic analytics master with the same columns as the real one."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, end, freq=freq)
+    n_dates = len(dates)
+    n = n_cities * n_dates
+
+    season = np.sin(2 * np.pi * (dates.dayofyear.to_numpy() / 365.25))
+    level = rng.uniform(150, 450, n_cities)[:, None]
+    energy = (level * (1 + 0.15 * season[None, :]) + rng.normal(0, 10, (n_cities, n_dates))).ravel()
+
+    return pd.DataFrame({
+        "date": np.tile(dates.values, n_cities),
+        "city": np.repeat(city_names(n_cities), n_dates),
+        "energy_generated": energy,
+        "predicted_energy": energy + rng.normal(0, 5, n),
+        "energy_efficiency_index": rng.uniform(20, 60, n),
+        "sunshine_hours": rng.uniform(2, 10, n),
+        "temperature": rng.uniform(10, 40, n),
+        "wind_speed": rng.uniform(1, 6, n),
+        "allsky_sfc_sw_dwn": rng.uniform(2, 7, n),
+        "rh2m": rng.uniform(20, 90, n),
+    })
+
+
+# ======================================================
+# STAGE TIMING
+# ======================================================
+def current_rss_mb():
+    """Resident set size of this process in MB, or None if the OS won't say."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return None
+
+
+class RssPeak(threading.Thread):
+    """Highest RSS seen while a stage runs, polled every RSS_INTERVAL seconds."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if self.start_mb is None:
+            return
+        while not self._stop_event.wait(RSS_INTERVAL):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        if self.start_mb is not None:
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def growth_mb(self):
+        return None if self.start_mb is None else round(self.peak_mb - self.start_mb, 2)
+
+
+@contextlib.contextmanager
+def measure(results, stage, **info):
+    record = {"stage": stage, **info}
+    watcher = RssPeak()
+    watcher.start()
+    t0 = time.perf_counter()
+
+    try:
+        # The pipeline functions print per-file status lines; keep output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - t0, 4)
+        watcher.stop()
+
+    record["peak_mb"] = watcher.growth_mb()
+    results.append(record)
+    label = f"{stage} {record['engine']}" if "engine" in record else stage
+    peak = "-" if record["peak_mb"] is None else f"{record['peak_mb']:.1f}"
+    print(f"  {label:<24} {record['seconds']:>9.3f}s  {peak:>9} MB")
+
+
+def bench_ingest(results, workdir, n_cities, years, workers):
+    data_dir = os.path.join(workdir, "data")
+    clean_dir = os.path.join(workdir, "cleaned")
+    feature_dir = os.path.join(workdir, "features")
+    for folder in (data_dir, clean_dir, feature_dir):
+        os.makedirs(folder, exist_ok=True)
+
+    make_power_files(data_dir, n_cities, years)
+    files = sorted(os.listdir(data_dir))
+
+    with measure(results, "ingest", files=len(files)) as record:
+        ordered_map(
+            convert_nasa_matrix,
+            [os.path.join(data_dir, f) for f in files],
+            [os.path.join(clean_dir, f.replace(".csv", "_clean.csv")) for f in files],
+            workers=workers
+        )
+        record["rows_out"] = len(files) * len(years) * 12
+
+    cities = city_names(n_cities)
+    city_files = [
+        {dtype: os.path.join(clean_dir, f"{city}_{dtype}_clean.csv") for dtype in ("solar", "wind")}
+        for city in cities
+    ]
+
+    with measure(results, "features", cities=n_cities) as record:
+        frames = ordered_map(
+            build_city_features,
+            cities,
+            city_files,
+            [os.path.join(feature_dir, f"{city}_features.csv") for city in cities],
+            workers=workers
+        )
+        record["rows_out"] = sum(len(f) for f in frames)
+
+
+def bench_model(results, master, freq, horizon, n_trees, max_depth, engines):
+    master = master.rename(columns={
+        "date": "DATE", "city": "CITY", "energy_generated": "ENERGY_GENERATED",
+        "energy_efficiency_index": "EFFICIENCY_INDEX", "sunshine_hours": "SUNSHINE_HOURS",
+        "temperature": "TEMPERATURE", "wind_speed": "WIND_SPEED",
+        "allsky_sfc_sw_dwn": "SOLAR_IRRADIANCE", "rh2m": "HUMIDITY"
+    })
+
+    dates = np.sort(master["DATE"].unique())
+    cutoff = dates[-HOLDOUT]
+    actual = master.loc[master["DATE"] >= cutoff, ["DATE", "CITY", "ENERGY_GENERATED"]]
+    master = master[master["DATE"] < cutoff]
+
+    params = {
+        "random_forest": dict(n_estimators=n_trees, max_depth=max_depth, random_state=42, n_jobs=-1)
+    }
+
+    for engine in engines:
+        with measure(results, "train", engine=engine, rows_in=len(master)) as record:
+            df = add_lag_features(master, [("lag", 1), ("lag", 12)]).dropna().reset_index(drop=True)
+            df["CITY_ENCODED"] = LabelEncoder().fit_transform(df["CITY"])
+            model = make_forecaster(engine, FEATURES, params.get(engine))
+            model.fit(df[FEATURES], df["ENERGY_GENERATED"])
+            record["rows_out"] = len(df)
+
+        step = pd.tseries.frequencies.to_offset(freq)
+        future_dates = pd.date_range(df["DATE"].max() + step, periods=horizon, freq=step)
+
+        with measure(results, "forecast", engine=engine, cities=df["CITY"].nunique(),
+                     horizon=horizon) as record:
+            forecast = model.forecast(df, future_dates)
+            record["rows_out"] = len(forecast)
+
+        scored = forecast.merge(actual, on=["DATE", "CITY"], suffixes=("", "_ACTUAL"))
+        record["holdout_mae"] = round(float(
+            (scored["ENERGY_GENERATED"] - scored["ENERGY_GENERATED_ACTUAL"]).abs().mean()
+        ), 4)
+        print(f"  {'holdout MAE':<24} {record['holdout_mae']:>10.3f}")
+
+
+def bench_dashboard(results, master, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+
+    with measure(results, "dashboard", rows_in=len(master), queries=n_queries) as record:
+        index = CityIndex(master)
+        dates = index.frame["date"]
+        lo, hi = dates.min().value, dates.max().value
+        for _ in range(n_queries):
+            city = index.cities[rng.integers(len(index.cities))]
+            a, b = np.sort(rng.integers(lo, hi, 2))
+            index.kpis(city, pd.Timestamp(a), pd.Timestamp(b))
+            index.slice(city, pd.Timestamp(a), pd.Timestamp(b))
+        record["rows_out"] = len(index.frame)
+
+
+# ======================================================
+# MAIN
+# ======================================================
+def run(args):
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    years = list(range(args.start_year, args.end_year + 1))
+    records = []
+
+    for n_cities in args.cities:
+        for freq in args.freq:
+            print(f"\n📏 {n_cities} cities, freq={freq}")
+            results = []
+            workdir = tempfile.mkdtemp(prefix="renewlytics_bench_")
+            try:
+                if not args.skip_ingest:
+                    bench_ingest(results, workdir, n_cities, years, args.workers)
+
+                master = make_master_frame(
+                    n_cities, f"{args.start_year}-01-01", f"{args.end_year}-12-31", freq
+                )
+                bench_model(results, master, freq, args.horizon, args.trees, args.max_depth,
+                            args.engines)
+                bench_dashboard(results, master, args.queries)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+            for r in results:
+                r.update(run_id=run_id, cities=n_cities, freq=freq)
+            records.extend(results)
+
+    meta = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+    with open(args.output, "a", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps({**r, **meta}) + "\n")
+
+    print(f"\n✅ {len(records)} results appended to {args.output}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Renewlytics pipeline stages.")
+    parser.add_argument("--cities", type=int, nargs="+", default=[15, 100])
+    parser.add_argument("--freq", nargs="+", default=["MS"],
+                        help="pandas frequencies for the master dataset, e.g. MS D h")
+    parser.add_argument("--start-year", type=int, default=2015)
+    parser.add_argument("--end-year", type=int, default=2024)
+    parser.add_argument("--horizon", type=int, default=120, help="forecast steps")
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--max-depth", type=int, default=20)
+    parser.add_argument("--engines", nargs="+", default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument("--queries", type=int, default=1000, help="dashboard queries")
+    parser.add_argument("--workers", type=int, default=1, help="ingest workers (0 = all cores)")
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -1,46 +1,51 @@
+import argparse
 import pandas as pd
 import os
 from collections import defaultdict
 
-# ======================================================
-# CONFIGURATION (CHANGE PATHS IF NEEDED)
-# ======================================================
-CLEANED_FOLDER = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\cleaned"
-FEATURE_FOLDER = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\features"
-MASTER_FOLDER = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\master"
-
-os.makedirs(FEATURE_FOLDER, exist_ok=True)
-os.makedirs(MASTER_FOLDER, exist_ok=True)
+from ingest_manifest import IngestManifest
+from instrumentation import stage
+from parallel import ordered_map
+from paths import CLEANED_DIR, FEATURE_DIR, MASTER_DIR
+from schemas import CLEAN_LONG, enforce, read_csv
+from storage import DatasetWriter, list_cities, read_dataset
 
 # ======================================================
-# STEP 1: GROUP FILES BY CITY
+# CONFIGURATION (CHANGE PATHS IF NEEDED)
 # ======================================================
-city_files = defaultdict(dict)
+CLEANED_FOLDER = CLEANED_DIR
+FEATURE_FOLDER = FEATURE_DIR
+MASTER_FOLDER = MASTER_DIR
 
-for file in os.listdir(CLEANED_FOLDER):
-    if not file.endswith("_clean.csv"):
-        continue
+# Rebuild every city and the whole master even if nothing changed
+FULL_REBUILD = False
 
-    parts = file.replace("_clean.csv", "").split("_")
-    city = parts[0]
-    data_type = parts[1]   # solar or wind
+# Worker processes for the per-city pivots: 1 = sequential, 0 = one per CPU core
+WORKERS = 1
 
-    city_files[city][data_type] = os.path.join(CLEANED_FOLDER, file)
+# Write the master one city at a time instead of concatenating every city
+# in memory (see write_master_streaming); workers then return no frames
+STREAMING = False
 
 # ======================================================
-# STEP 2: BUILD CITY-LEVEL FEATURE FILES
+# PER-CITY FEATURE BUILD (RUNS IN WORKER PROCESSES)
 # ======================================================
-all_cities_df = []
-
-for city, files in city_files.items():
+def build_city_features(city, files, city_feature_path, keep=True):
 
     dfs = []
 
+    # Values are cleaned file paths, or the frames themselves when the
+    # pipeline runner passes them straight from the convert step; both come
+    # out in the cleaned-file schema (dates, PARAM labels, float32 values)
     for dtype, path in files.items():
-        df = pd.read_csv(path)
+        if isinstance(path, pd.DataFrame):
+            df = enforce(path.copy(), CLEAN_LONG)
+        else:
+            df = read_csv(path)
 
         # Pivot PARAM → columns
         pivot_df = df.pivot(index="DATE", columns="PARAM", values="VALUE")
+        pivot_df.columns = pivot_df.columns.astype(str)
         dfs.append(pivot_df)
 
     # Merge solar + wind on DATE
@@ -50,20 +55,187 @@ for city, files in city_files.items():
     city_df["CITY"] = city
 
     # Save city-level feature file
-    city_feature_path = os.path.join(FEATURE_FOLDER, f"{city}_features.csv")
     city_df.to_csv(city_feature_path, index=False)
 
     print(f"✅ Features created: {city}_features.csv")
 
-    all_cities_df.append(city_df)
-
-# ======================================================
-# STEP 3: CREATE MASTER DATASET
-# ======================================================
-master_df = pd.concat(all_cities_df, ignore_index=True)
-master_path = os.path.join(MASTER_FOLDER, "india_renewable_master.csv")
-master_df.to_csv(master_path, index=False)
-
-print("\n🎯 MASTER DATASET CREATED")
-print(f"📄 Saved at: {master_path}")
-print(master_df.head())
+    # Streaming builds re-read the file when writing the master, so the
+    # frame is not shipped back from the worker process
+    return city_df if keep else len(city_df)
+
+
+def write_master_streaming(master_path, cities, rebuilt, master_exists):
+    """Write the master city by city, in `cities` order.
+
+    Rebuilt cities (and every city on a first run) come from their feature
+    file, the others from the existing master's per-city Parquet copy, so
+    only one city's rows are in memory. Columns are the union of all parts,
+    in the order pd.concat would give them. Returns the number of rows.
+    """
+    existing = set(list_cities(master_path)) if master_exists else set()
+
+    sources = {}
+    columns = {}
+    for city in cities:
+        if city in rebuilt or city not in existing:
+            sources[city] = os.path.join(FEATURE_FOLDER, f"{city}_features.csv")
+        else:
+            sources[city] = None
+        header = pd.read_csv(sources[city] or master_path, nrows=0).columns
+        columns.update(dict.fromkeys(header))
+
+    with DatasetWriter(master_path) as writer:
+        for city, source in sources.items():
+            if source is None:
+                part = read_dataset(master_path, cities=[city])
+            else:
+                part = read_csv(source)
+            writer.append(part.reindex(columns=list(columns)))
+
+    return writer.rows
+
+
+def run(frames=None, full_rebuild=FULL_REBUILD, workers=WORKERS, streaming=STREAMING):
+    """Rebuild changed cities and patch the master.
+
+    Returns the new master frame, or None if it was already up to date.
+    `frames` optionally maps cleaned file paths to frames already in memory.
+    With `streaming` the master is written city by city and None is
+    returned.
+    """
+    frames = {os.path.abspath(k): v for k, v in (frames or {}).items()}
+
+    os.makedirs(FEATURE_FOLDER, exist_ok=True)
+    os.makedirs(MASTER_FOLDER, exist_ok=True)
+
+    manifest = IngestManifest(os.path.join(FEATURE_FOLDER, "feature_manifest.json"))
+
+    # ======================================================
+    # STEP 1: GROUP FILES BY CITY
+    # ======================================================
+    with stage("STEP 1: GROUP FILES BY CITY") as s:
+        city_files = defaultdict(dict)
+
+        # Sorted, so city and column order are the same on every OS
+        for file in sorted(os.listdir(CLEANED_FOLDER)):
+            if not file.endswith("_clean.csv"):
+                continue
+
+            parts = file.replace("_clean.csv", "").split("_")
+            city = parts[0]
+            data_type = parts[1]   # solar or wind
+
+            city_files[city][data_type] = os.path.join(CLEANED_FOLDER, file)
+
+        s.output(rows=len(city_files))
+
+    # ======================================================
+    # STEP 2: BUILD CITY-LEVEL FEATURE FILES (CHANGED CITIES ONLY)
+    # ======================================================
+    with stage("STEP 2: BUILD CITY-LEVEL FEATURE FILES") as s:
+        # Outputs whose input file has since been deleted must be rebuilt too
+        stale_outputs = manifest.forget_missing()
+
+        todo = []
+
+        for city, files in city_files.items():
+
+            city_feature_path = os.path.join(FEATURE_FOLDER, f"{city}_features.csv")
+
+            unchanged = (
+                not full_rebuild
+                and os.path.abspath(city_feature_path) not in stale_outputs
+                and all(manifest.is_current(path, city_feature_path) for path in files.values())
+            )
+            if unchanged:
+                print(f"⏭️ Unchanged: {city}_features.csv")
+                continue
+
+            # In-memory frames from the convert step replace the CSV re-read
+            todo.append((
+                city,
+                {dtype: frames.get(os.path.abspath(path), path) for dtype, path in files.items()},
+                city_feature_path
+            ))
+
+        # Cities are independent; results come back in `todo` order
+        city_frames = ordered_map(
+            build_city_features,
+            [t[0] for t in todo],
+            [t[1] for t in todo],
+            [t[2] for t in todo],
+            [not streaming] * len(todo),
+            workers=workers
+        )
+
+        rebuilt_cities = {}
+
+        for (city, _, city_feature_path), city_df in zip(todo, city_frames):
+            for path in city_files[city].values():
+                manifest.record(path, city_feature_path)
+            rebuilt_cities[city] = city_df
+
+        rows = sum(f if streaming else len(f) for f in city_frames)
+        s.output(rows=rows, rebuilt=len(todo), workers=workers)
+
+    # ======================================================
+    # STEP 3: CREATE / PATCH MASTER DATASET
+    # ======================================================
+    with stage("STEP 3: CREATE / PATCH MASTER DATASET") as s:
+        master_df = None
+        master_path = os.path.join(MASTER_FOLDER, "india_renewable_master.csv")
+        master_exists = os.path.exists(master_path) and not full_rebuild
+
+        if master_exists and not rebuilt_cities and not stale_outputs:
+            print("\n🎯 MASTER DATASET UP TO DATE")
+            print(f"📄 {master_path}")
+
+        elif streaming:
+            if master_exists:
+                print(f"\n🩹 Patching master for: {', '.join(rebuilt_cities) or 'removed files'}")
+            rows = write_master_streaming(master_path, list(city_files), rebuilt_cities, master_exists)
+            s.output(rows=rows)
+
+            print("\n🎯 MASTER DATASET CREATED (streaming)")
+            print(f"📄 Saved at: {master_path}")
+
+        else:
+            # Untouched cities keep their existing master rows (or feature file on a
+            # first run); only rebuilt cities are swapped in
+            existing = {}
+            if master_exists:
+                existing = dict(tuple(read_csv(master_path).groupby("CITY", sort=False, observed=True)))
+                print(f"\n🩹 Patching master for: {', '.join(rebuilt_cities) or 'removed files'}")
+
+            parts = []
+            for city in city_files:
+                if city in rebuilt_cities:
+                    parts.append(rebuilt_cities[city])
+                elif city in existing:
+                    parts.append(existing[city])
+                else:
+                    parts.append(read_csv(os.path.join(FEATURE_FOLDER, f"{city}_features.csv")))
+
+            master_df = pd.concat(parts, ignore_index=True)
+            master_df.to_csv(master_path, index=False)
+            s.output(master_df)
+
+            print("\n🎯 MASTER DATASET CREATED")
+            print(f"📄 Saved at: {master_path}")
+            print(master_df.head())
+
+    manifest.save()
+    return master_df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build city feature files and the feature master.")
+    parser.add_argument("--full-rebuild", action="store_true", default=FULL_REBUILD)
+    parser.add_argument("--streaming", action="store_true", default=STREAMING,
+                        help="write the master one city at a time")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(full_rebuild=args.full_rebuild, streaming=args.streaming)
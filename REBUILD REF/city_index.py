@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# PER-CITY AGGREGATE INDEX FOR THE DASHBOARD
+# ======================================================
+# Built once per process from the master frame:
+#   * rows sorted by (city, date), so each city is one contiguous slice
+#   * date_str formatted once instead of on every rerun
+#   * prefix sums (and non-NaN counts) for energy, efficiency and absolute
+#     forecast error
+#   * a sparse table of energy maxima over every power-of-two window
+#
+# A (city, start, end) query is two binary searches on that city's dates;
+# the KPI boxes are then differences of prefix sums plus one max of two
+# overlapping sparse-table windows, so no KPI scans the range, and the chart
+# data is a positional slice of the sorted frame (no boolean masks, no .copy()).
+
+
+def _prefix(values):
+    """Cumulative sum and non-NaN count, both with a leading 0."""
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    return sums, counts
+
+
+def _sparse_max(values):
+    """Level k holds the max of every 2**k-row window; NaN never wins."""
+    levels = [np.where(np.isnan(values), -np.inf, values)]
+    width = 1
+    while 2 * width <= len(values):
+        prev = levels[-1]
+        levels.append(np.maximum(prev[:-width], prev[width:]))
+        width *= 2
+    return levels
+
+
+class CityIndex:
+
+    def __init__(self, df, city_col="city", date_col="date"):
+        df = df.sort_values([city_col, date_col], kind="stable").reset_index(drop=True)
+        df["date_str"] = df[date_col].dt.strftime("%d/%m/%Y")
+        self.frame = df
+
+        # Dates as int64 nanoseconds, whatever unit the reader produced
+        self._dates = df[date_col].to_numpy(dtype="datetime64[ns]").view("i8")
+
+        labels = df[city_col].astype(str).to_numpy()
+        breaks = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+        starts = np.concatenate(([0], breaks))
+        stops = np.concatenate((breaks, [len(df)]))
+        self._bounds = {labels[s]: (s, e) for s, e in zip(starts, stops) if e > s}
+        self.cities = sorted(self._bounds)
+
+        self._energy = df["energy_generated"].to_numpy(dtype=np.float64)
+        self._energy_sum, self._energy_n = _prefix(self._energy)
+        self._energy_max = _sparse_max(self._energy)
+        self._eff_sum, self._eff_n = _prefix(
+            df["energy_efficiency_index"].to_numpy(dtype=np.float64)
+        )
+        self._err_sum, self._err_n = _prefix(
+            np.abs(self._energy - df["predicted_energy"].to_numpy(dtype=np.float64))
+        )
+
+    def span(self, city, start, end):
+        """Positional [lo, hi) rows of `city` with start <= date <= end."""
+        if city not in self._bounds:
+            return 0, 0
+
+        s, e = self._bounds[city]
+        dates = self._dates[s:e]
+        lo = s + np.searchsorted(dates, pd.Timestamp(start).value, side="left")
+        hi = s + np.searchsorted(dates, pd.Timestamp(end).value, side="right")
+        return int(lo), int(max(lo, hi))
+
+    def slice(self, city, start, end):
+        lo, hi = self.span(city, start, end)
+        return self.frame.iloc[lo:hi]
+
+    def range_max(self, lo, hi):
+        """Max energy of rows [lo, hi), NaN-skipping; two lookups, no scan."""
+        if hi <= lo:
+            return np.nan
+        k = (hi - lo).bit_length() - 1
+        level = self._energy_max[k]
+        best = max(level[lo], level[hi - (1 << k)])
+        return best if best > -np.inf else np.nan
+
+    def kpis(self, city, start, end):
+        """Total/max energy, mean efficiency and MAE for the range (NaN-skipping)."""
+        lo, hi = self.span(city, start, end)
+
+        def mean(sums, counts):
+            n = counts[hi] - counts[lo]
+            return (sums[hi] - sums[lo]) / n if n else np.nan
+
+        return {
+            "total_energy": self._energy_sum[hi] - self._energy_sum[lo],
+            "avg_efficiency": mean(self._eff_sum, self._eff_n),
+            "max_energy": self.range_max(lo, hi),
+            "mae": mean(self._err_sum, self._err_n),
+        }
@@ -0,0 +1,153 @@
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.ensemble import RandomForestRegressor
+
+from parallel import ordered_map, resolve_workers
+
+# ======================================================
+# PER-CITY / PER-CLUSTER MODELS
+# ======================================================
+# Training modes for train_random_forest_model.py:
+#
+#   global   one forest for every city, CITY_ENCODED is just a feature
+#   city     one small forest per city
+#   cluster  one forest per group of similar cities (KMeans on each city's
+#            weather / output profile)
+#   hybrid   per-city forests for cities with at least MIN_HISTORY_MONTHS
+#            of training rows, the global forest for the rest
+#
+# In every routed mode a city without enough history falls back to the
+# global forest, which is only trained if some city needs it. The small
+# forests are fitted side by side on a process pool.
+#
+# The result is a CityRoutedModel: predict() sends each row to the forest
+# of its CITY_ENCODED value, so the recursive forecaster, the registry and
+# the evaluation step use it exactly like a single forest.
+
+TRAINING_MODES = ("global", "city", "cluster", "hybrid")
+
+CITY_COLUMN = "CITY_ENCODED"
+
+# Per-city / per-cluster forests are much smaller than the global one
+LOCAL_MODEL_PARAMS = dict(
+    n_estimators=100,
+    max_depth=10,
+    min_samples_leaf=2,
+    random_state=42,
+    n_jobs=-1
+)
+
+N_CLUSTERS = 4
+MIN_HISTORY_MONTHS = 36
+
+
+class CityRoutedModel:
+    """Sends every row to the model of its city code."""
+
+    def __init__(self, models, routes, fallback, city_index, mode):
+        self.models = models            # fitted estimators
+        self.routes = routes            # {city code: index into models}
+        self.fallback = fallback        # index for unrouted codes, or None
+        self.city_index = city_index    # position of CITY_ENCODED in X
+        self.mode = mode
+
+    def partition(self, X):
+        """[(estimator, row positions)] covering every row of X."""
+        codes = np.asarray(X)[:, self.city_index].astype(np.int64)
+        target = np.array([self.routes.get(int(c), self.fallback) for c in codes], dtype=object)
+
+        if any(t is None for t in target):
+            missing = sorted({int(c) for c, t in zip(codes, target) if t is None})
+            raise ValueError(f"❌ No model for city codes {missing} and no global fallback")
+
+        target = target.astype(np.int64)
+        return [(self.models[m], np.flatnonzero(target == m)) for m in np.unique(target)]
+
+    def predict(self, X):
+        # float32 from the forecaster stays float32, as the trees want it
+        X = np.asarray(X)
+        out = np.empty(len(X), dtype=np.float64)
+        for model, rows in self.partition(X):
+            out[rows] = model.predict(X[rows])
+        return out
+
+
+def fit_forest(X, y, params):
+    model = RandomForestRegressor(**params)
+    model.fit(X, y)
+    return model
+
+
+def city_profiles(X, y, codes, features):
+    """One z-scored row per city: mean weather / efficiency plus output level and spread."""
+    skip = {CITY_COLUMN, "ENERGY_LAG_1", "ENERGY_LAG_12"}
+    cols = [i for i, f in enumerate(features) if f not in skip]
+
+    cities = np.unique(codes)
+    profile = np.array([
+        np.concatenate([X[codes == c][:, cols].mean(axis=0),
+                        [y[codes == c].mean(), y[codes == c].std()]])
+        for c in cities
+    ])
+    std = profile.std(axis=0)
+    profile = (profile - profile.mean(axis=0)) / np.where(std > 0, std, 1.0)
+    return cities, profile
+
+
+def fit_routed_model(X, y, features, mode, global_params, local_params=LOCAL_MODEL_PARAMS,
+                     n_cities=None, n_clusters=N_CLUSTERS, min_history=MIN_HISTORY_MONTHS,
+                     workers=0):
+    """Fit a CityRoutedModel; X is the training matrix in `features` order.
+
+    `n_cities` is the number of encoder classes, so cities with no training
+    rows at all (history starting after the split) still get the fallback.
+    """
+    if mode not in TRAINING_MODES or mode == "global":
+        raise ValueError(f"❌ Routed training mode must be one of {TRAINING_MODES[1:]}, got {mode!r}")
+
+    X = np.asarray(X)
+    y = np.asarray(y, dtype=np.float64)
+    city_index = features.index(CITY_COLUMN)
+    codes = X[:, city_index].astype(np.int64)
+
+    trained, counts = np.unique(codes, return_counts=True)
+    cities = np.arange(n_cities) if n_cities is not None else trained
+
+    # Group label per city: the city itself, or its cluster
+    if mode == "cluster":
+        profile_cities, profile = city_profiles(X, y, codes, features)
+        k = min(n_clusters, len(profile_cities))
+        labels = KMeans(n_clusters=k, n_init=10, random_state=42).fit_predict(profile)
+        group_of = dict(zip(profile_cities.tolist(), labels.tolist()))
+    else:
+        needed = min_history if mode == "hybrid" else 1
+        group_of = {int(c): int(c) for c, n in zip(trained, counts) if n >= needed}
+
+    groups = sorted(set(group_of.values()))
+    masks = [np.isin(codes, [c for c, g in group_of.items() if g == group]) for group in groups]
+
+    train_X = [X[m] for m in masks]
+    train_y = [y[m] for m in masks]
+    params = [dict(local_params)] * len(groups)
+
+    fallback = None
+    short = [int(c) for c in cities if int(c) not in group_of]
+    if short:
+        # Global forest for cities with too little history of their own
+        train_X.append(X)
+        train_y.append(y)
+        params.append(dict(global_params))
+        fallback = len(groups)
+
+    if resolve_workers(workers) > 1:
+        params = [{**p, "n_jobs": 1} for p in params]
+
+    models = ordered_map(fit_forest, train_X, train_y, params, workers=workers)
+
+    position = {group: i for i, group in enumerate(groups)}
+    routes = {int(c): position[g] for c, g in group_of.items()}
+
+    print(f"🏙️ {mode} mode: {len(groups)} local models"
+          + (f", global fallback for {len(short)} cities" if short else ""))
+
+    return CityRoutedModel(models, routes, fallback, city_index, mode)
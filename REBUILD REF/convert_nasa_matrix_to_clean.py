@@ -1,116 +1,115 @@
-import pandas as pd
 import os
 
+from ingest_manifest import IngestManifest
+from instrumentation import stage
+from nasa_power import read_power_long
+from parallel import ordered_map
+from paths import CLEANED_DIR, DATA_DIR
+
 # ======================================================
 # CONFIGURATION (CHANGE ONLY THIS)
 # ======================================================
-INPUT_PATH = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\data"
-OUTPUT_FOLDER = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\cleaned"
+INPUT_PATH = DATA_DIR
+OUTPUT_FOLDER = CLEANED_DIR
+
+# Re-convert every file even if the manifest says it is unchanged
+FULL_REBUILD = False
 
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+# Worker processes for folder mode: 1 = sequential, 0 = one per CPU core
+WORKERS = 1
 
 # ======================================================
 # FUNCTION TO CONVERT ONE NASA MATRIX FILE
 # ======================================================
 def convert_nasa_matrix(file_path, output_path):
 
-    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-        lines = f.readlines()
-
-    header_line = None
-    for i, line in enumerate(lines):
-        cleaned = line.strip().upper()
-        if cleaned.startswith("PARAM") and "YEAR" in cleaned and "JAN" in cleaned:
-            header_line = i
-            break
+    # Single streaming pass: header skip + tokenize + long form
+    clean_df = read_power_long(file_path)
 
-    if header_line is None:
+    if clean_df is None:
         print(f"❌ Skipping (header not found): {os.path.basename(file_path)}")
-        return
-
-    df = pd.read_csv(
-        file_path,
-        skiprows=header_line,
-        sep=r"\s+|,",
-        engine="python"
-    )
-
-    expected_cols = [
-        "PARAM", "YEAR",
-        "JAN", "FEB", "MAR", "APR", "MAY", "JUN",
-        "JUL", "AUG", "SEP", "OCT", "NOV", "DEC", "ANN"
-    ]
-
-    df = df.iloc[:, :len(expected_cols)]
-    df.columns = expected_cols
-
-    df = df[pd.to_numeric(df["YEAR"], errors="coerce").notna()]
-    df["YEAR"] = df["YEAR"].astype(int)
-
-    df_long = df.melt(
-        id_vars=["PARAM", "YEAR"],
-        value_vars=expected_cols[2:-1],
-        var_name="MONTH",
-        value_name="VALUE"
-    )
-
-    month_map = {
-        "JAN": 1, "FEB": 2, "MAR": 3, "APR": 4,
-        "MAY": 5, "JUN": 6, "JUL": 7, "AUG": 8,
-        "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12
-    }
-
-    df_long["MONTH_NUM"] = df_long["MONTH"].map(month_map)
-
-    df_long["DATE"] = pd.to_datetime(
-        dict(
-            year=df_long["YEAR"],
-            month=df_long["MONTH_NUM"],
-            day=1
-        )
-    )
-
-    clean_df = (
-        df_long[["DATE", "PARAM", "VALUE"]]
-        .sort_values("DATE")
-        .reset_index(drop=True)
-    )
+        return None
 
     clean_df.to_csv(output_path, index=False)
     print(f"✅ Converted: {os.path.basename(file_path)}")
 
+    # Handed back so the pipeline runner can pass it on without a re-read
+    return clean_df
+
 
 # ======================================================
 # MAIN LOGIC — AUTO-DETECT FILE OR FOLDER
 # ======================================================
-if os.path.isfile(INPUT_PATH):
+def run(input_path=INPUT_PATH, output_folder=OUTPUT_FOLDER,
+        full_rebuild=FULL_REBUILD, workers=WORKERS):
+    """Convert new/changed files; returns {output path: clean frame} for them."""
 
-    # SINGLE FILE MODE
-    if INPUT_PATH.lower().endswith("_clean.csv"):
-        print("⚠️ File already cleaned. Skipping.")
-    else:
-        output_file = os.path.basename(INPUT_PATH).replace(".csv", "_clean.csv")
-        output_path = os.path.join(OUTPUT_FOLDER, output_file)
-        convert_nasa_matrix(INPUT_PATH, output_path)
+    os.makedirs(output_folder, exist_ok=True)
+
+    manifest = IngestManifest(os.path.join(output_folder, "ingest_manifest.json"))
+
+    jobs = []
 
-elif os.path.isdir(INPUT_PATH):
+    if os.path.isfile(input_path):
 
-    # FOLDER MODE
-    for filename in os.listdir(INPUT_PATH):
+        # SINGLE FILE MODE
+        if input_path.lower().endswith("_clean.csv"):
+            print("⚠️ File already cleaned. Skipping.")
+        else:
+            output_file = os.path.basename(input_path).replace(".csv", "_clean.csv")
+            jobs.append((input_path, os.path.join(output_folder, output_file)))
 
-        if not filename.lower().endswith(".csv"):
-            continue
+    elif os.path.isdir(input_path):
+
+        # FOLDER MODE (sorted, so runs are reproducible on every OS)
+        for filename in sorted(os.listdir(input_path)):
+
+            if not filename.lower().endswith(".csv"):
+                continue
+
+            if filename.lower().endswith("_clean.csv"):
+                continue
+
+            input_file = os.path.join(input_path, filename)
+            output_file = filename.replace(".csv", "_clean.csv")
+            jobs.append((input_file, os.path.join(output_folder, output_file)))
+
+        manifest.forget_missing()
+
+    else:
+        raise Exception("❌ INPUT_PATH is neither a file nor a directory")
+
+    todo = []
+    for input_file, output_path in jobs:
+        if not full_rebuild and manifest.is_current(input_file, output_path):
+            print(f"⏭️ Unchanged: {os.path.basename(input_file)}")
+        else:
+            todo.append((input_file, output_path))
+
+    # Each file is independent; results come back in `todo` order
+    with stage("CONVERT NASA MATRIX FILES", rows_in=len(todo)) as s:
+        converted = ordered_map(
+            convert_nasa_matrix,
+            [t[0] for t in todo],
+            [t[1] for t in todo],
+            workers=workers
+        )
+        frames = {
+            output_path: clean_df
+            for (_, output_path), clean_df in zip(todo, converted)
+            if clean_df is not None
+        }
+        s.output(rows=len(frames), skipped=len(jobs) - len(todo), workers=workers)
 
-        if filename.lower().endswith("_clean.csv"):
-            continue
+    for (input_file, output_path), clean_df in zip(todo, converted):
+        if clean_df is not None:
+            manifest.record(input_file, output_path)
 
-        input_file = os.path.join(INPUT_PATH, filename)
-        output_file = filename.replace(".csv", "_clean.csv")
-        output_path = os.path.join(OUTPUT_FOLDER, output_file)
+    manifest.save()
 
-        convert_nasa_matrix(input_file, output_path)
+    print("\n🎯 Processing completed successfully.")
+    return frames
 
-else:
-    raise Exception("❌ INPUT_PATH is neither a file nor a directory")
 
-print("\n🎯 Processing completed successfully.")
+if __name__ == "__main__":
+    run()
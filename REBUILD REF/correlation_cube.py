@@ -0,0 +1,200 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from paths import ANALYTICS_MASTER_PATH, CACHE_DIR
+from storage import list_cities, read_dataset
+
+# ======================================================
+# WEATHER / ENERGY CORRELATION CUBE
+# ======================================================
+# For every city, month and weather variable the cube stores the sufficient
+# statistics of (x = weather, y = energy):
+#
+#   n, Σx, Σy, Σxy, Σx², Σy²        (rows where both are present)
+#
+# as prefix sums along the month axis. The Pearson correlation of any
+# month range is then two lookups and a subtraction:
+#
+#   r = (nΣxy - ΣxΣy) / sqrt((nΣx² - (Σx)²) (nΣy² - (Σy)²))
+#
+# so the weather view never rescans rows, and the full city x variable
+# matrix for cross-city comparison is one vectorized expression.
+#
+# A range covers the months whose first day falls inside it, which is
+# exact for the monthly master. The cube is saved under cache/ with the
+# source CSV's size and mtime and rebuilt (one city at a time) when stale.
+
+WEATHER_VARIABLES = ["sunshine_hours", "wind_speed", "temperature", "allsky_sfc_sw_dwn", "rh2m"]
+TARGET = "energy_generated"
+
+CUBE_PATH = os.path.join(CACHE_DIR, "correlation_cube.npz")
+
+N, SX, SY, SXY, SXX, SYY = range(6)
+
+
+def source_signature(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def month_stats(df, variables, target=TARGET, date_col="date"):
+    """(month starts as datetime64[ns], stats[month, variable, statistic]) for one city."""
+    month = df[date_col].to_numpy(dtype="datetime64[ns]").astype("datetime64[M]")
+    months = np.unique(month)
+    pos = np.searchsorted(months, month)
+
+    y = df[target].to_numpy(dtype=np.float64)
+    stats = np.zeros((len(months), len(variables), 6), dtype=np.float64)
+
+    for v, var in enumerate(variables):
+        x = df[var].to_numpy(dtype=np.float64)
+        ok = ~(np.isnan(x) | np.isnan(y))
+        xo, yo = x[ok], y[ok]
+        for s, values in enumerate((np.ones(len(xo)), xo, yo, xo * yo, xo * xo, yo * yo)):
+            stats[:, v, s] = np.bincount(pos[ok], weights=values, minlength=len(months))
+
+    return months.astype("datetime64[ns]"), stats
+
+
+def pearson(stats):
+    """Correlation from (..., 6) sufficient statistics; NaN where undefined."""
+    n, sx, sy = stats[..., N], stats[..., SX], stats[..., SY]
+    cov = n * stats[..., SXY] - sx * sy
+    var_x = n * stats[..., SXX] - sx ** 2
+    var_y = n * stats[..., SYY] - sy ** 2
+    denom = np.sqrt(np.clip(var_x, 0, None) * np.clip(var_y, 0, None))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = cov / denom
+    return np.where((n > 1) & (denom > 0), np.clip(r, -1.0, 1.0), np.nan)
+
+
+class CorrelationCube:
+
+    def __init__(self, cities, variables, months, prefix, source=None):
+        self.cities = list(cities)
+        self.variables = list(variables)
+        self.months = np.asarray(months, dtype="datetime64[ns]")
+        self.prefix = prefix            # [city, month + 1, variable, statistic]
+        self.source = source
+        self._city_pos = {c: i for i, c in enumerate(self.cities)}
+        self._var_pos = {v: i for i, v in enumerate(self.variables)}
+
+    @classmethod
+    def from_city_stats(cls, city_stats, variables, source=None):
+        """Assemble from {city: (months, stats)} on a shared month axis."""
+        cities = sorted(city_stats)
+        months = np.unique(np.concatenate(
+            [m for m, _ in city_stats.values()] + [np.array([], dtype="datetime64[ns]")]
+        ))
+
+        cube = np.zeros((len(cities), len(months), len(variables), 6), dtype=np.float64)
+        for i, city in enumerate(cities):
+            city_months, stats = city_stats[city]
+            cube[i, np.searchsorted(months, city_months)] = stats
+
+        prefix = np.concatenate(
+            (np.zeros((len(cities), 1, len(variables), 6)), np.cumsum(cube, axis=1)), axis=1
+        )
+        return cls(cities, variables, months, prefix, source)
+
+    @classmethod
+    def from_frame(cls, df, variables=WEATHER_VARIABLES, city_col="city", source=None):
+        variables = [v for v in variables if v in df.columns]
+        city_stats = {
+            str(city): month_stats(part, variables)
+            for city, part in df.groupby(city_col, observed=True, sort=False)
+        }
+        return cls.from_city_stats(city_stats, variables, source)
+
+    @classmethod
+    def from_dataset(cls, path=ANALYTICS_MASTER_PATH, variables=WEATHER_VARIABLES):
+        """Build one city at a time, so memory stays at one city's rows."""
+        header = pd.read_csv(path, nrows=0).columns
+        variables = [v for v in variables if v in header]
+        columns = ["date", "city", TARGET] + variables
+
+        city_stats = {}
+        for city in list_cities(path):
+            part = read_dataset(path, columns=columns, cities=[city])
+            if len(part):
+                city_stats[city] = month_stats(part, variables)
+        return cls.from_city_stats(city_stats, variables, source_signature(path))
+
+    # --------------------------------------------------
+    # persistence
+    # --------------------------------------------------
+    def save(self, cube_path=CUBE_PATH):
+        os.makedirs(os.path.dirname(cube_path), exist_ok=True)
+        tmp_path = cube_path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            cities=np.array(self.cities, dtype=str),
+            variables=np.array(self.variables, dtype=str),
+            months=self.months.view("i8"),
+            prefix=self.prefix,
+            source=np.array(json.dumps(self.source)),
+        )
+        os.replace(tmp_path, cube_path)
+
+    @classmethod
+    def load(cls, cube_path=CUBE_PATH):
+        with np.load(cube_path) as f:
+            return cls(f["cities"].tolist(), f["variables"].tolist(),
+                       f["months"].view("datetime64[ns]"), f["prefix"],
+                       json.loads(str(f["source"])))
+
+    # --------------------------------------------------
+    # queries
+    # --------------------------------------------------
+    def _span(self, start, end):
+        """Month positions [lo, hi) whose first day lies in [start, end]."""
+        lo, hi = 0, len(self.months)
+        if start is not None:
+            lo = np.searchsorted(self.months, pd.Timestamp(start).to_datetime64(), side="left")
+        if end is not None:
+            hi = np.searchsorted(self.months, pd.Timestamp(end).to_datetime64(), side="right")
+        return int(lo), int(max(lo, hi))
+
+    def stats(self, city, variable, start=None, end=None):
+        """[n, Σx, Σy, Σxy, Σx², Σy²] of one city and variable over the range."""
+        lo, hi = self._span(start, end)
+        c, v = self._city_pos[city], self._var_pos[variable]
+        return self.prefix[c, hi, v] - self.prefix[c, lo, v]
+
+    def correlation(self, city, variable, start=None, end=None):
+        if city not in self._city_pos or variable not in self._var_pos:
+            return np.nan
+        return float(pearson(self.stats(city, variable, start, end)))
+
+    def matrix(self, start=None, end=None):
+        """City x variable correlation table for the range."""
+        lo, hi = self._span(start, end)
+        r = pearson(self.prefix[:, hi] - self.prefix[:, lo])
+        return pd.DataFrame(r, index=pd.Index(self.cities, name="city"), columns=self.variables)
+
+
+def load_cube(path=ANALYTICS_MASTER_PATH, cube_path=CUBE_PATH):
+    """The saved cube if it matches the dataset, else a fresh (saved) build."""
+    if os.path.exists(cube_path):
+        cube = CorrelationCube.load(cube_path)
+        if cube.source == source_signature(path):
+            return cube
+
+    cube = CorrelationCube.from_dataset(path)
+    cube.save(cube_path)
+    return cube
+
+
+if __name__ == "__main__":
+    cube = CorrelationCube.from_dataset()
+    cube.save()
+    print(cube.matrix().round(3).to_string())
+    print(f"\n✅ Correlation cube: {len(cube.cities)} cities x {len(cube.months)} months "
+          f"x {len(cube.variables)} variables")
+    print(f"📄 Saved at: {CUBE_PATH}")
@@ -1,10 +1,18 @@
-import rasterio
+import argparse
+import os
+
 import pandas as pd
 
+from paths import BASE_DIR
+from raster_sampling import RasterSampler   # needs the optional rasterio package
+
 # ------------------------------
 # 1. Your uploaded WorldPop file
 # ------------------------------
-tif_file = r"C:\Users\anuru\Downloads\ind_pop_2020_CN_1km_R2025A_UA_v1.tif"  # <-- put correct file path
+TIF_FILE = os.environ.get(
+    "WORLDPOP_TIF", r"C:\Users\anuru\Downloads\ind_pop_2020_CN_1km_R2025A_UA_v1.tif"
+)  # <-- or pass --tif
+OUTPUT_PATH = os.path.join(BASE_DIR, "population", "population_2020_extracted.csv")
 
 # ------------------------------------
 # 2. Your 15 cities with lat/lon
@@ -27,26 +35,44 @@ cities = [
     ("Guwahati", 26.1445, 91.7362)
 ]
 
-# ---------------------------------------------------
-# 3. Read the raster and extract population per city
-# ---------------------------------------------------
-pop_data = []
 
-with rasterio.open(tif_file) as src:
-    for city, lat, lon in cities:
-        # Convert lat/lon → raster row/col
-        row, col = src.index(lon, lat)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract city population from a WorldPop raster.")
+    parser.add_argument("--tif", default=TIF_FILE, help="WorldPop GeoTIFF")
+    parser.add_argument("--points", help="CSV with City, Latitude, Longitude (default: the 15 cities)")
+    parser.add_argument("--radius-km", type=float, default=0.0,
+                        help="also sum the population within this distance of each point")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.points:
+        points = pd.read_csv(args.points, usecols=["City", "Latitude", "Longitude"])
+    else:
+        points = pd.DataFrame(cities, columns=["City", "Latitude", "Longitude"])
 
-        # Extract pixel value (population count)
-        pop_2020 = src.read(1)[row, col]
+    # ---------------------------------------------------
+    # 3. Sample the raster around each city
+    # ---------------------------------------------------
+    # Only the tiles under the points are decoded (see raster_sampling.py)
+    with RasterSampler(args.tif) as raster:
+        lons, lats = points["Longitude"].to_numpy(), points["Latitude"].to_numpy()
+        points["Population_2020"] = pd.Series(raster.sample(lons, lats)).round().astype("Int64")
 
-        pop_data.append([city, lat, lon, int(pop_2020)])
+        if args.radius_km > 0:
+            column = f"Population_2020_{args.radius_km:g}km"
+            points[column] = raster.radius_sum(lons, lats, args.radius_km).round().astype("int64")
 
-# --------------------------------------
-# 4. Convert to CSV
-# --------------------------------------
-df = pd.DataFrame(pop_data, columns=["City", "Latitude", "Longitude", "Population_2020"])
+        tiles = raster.tiles_read
 
-df.to_csv("population_2020_extracted.csv", index=False)
+    # --------------------------------------
+    # 4. Convert to CSV
+    # --------------------------------------
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    points.to_csv(args.output, index=False)
 
-print("CSV saved as population_2020_extracted.csv")
+    print(f"✅ {len(points)} points sampled from {tiles} raster tiles")
+    print(f"📄 CSV saved as {args.output}")
@@ -0,0 +1,190 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from city_index import CityIndex
+from correlation_cube import load_cube
+from downsampling import binned_scatter, lttb_indices, minmax_indices
+from paths import ANALYTICS_MASTER_PATH, FORECAST_PATH
+from storage import list_cities, read_dataset
+
+# ======================================================
+# DASHBOARD DATA ACCESS LAYER
+# ======================================================
+# app.py never holds a whole dataset. Every query is for one city:
+#
+#   data = DashboardData()
+#   data.cities()                      # labels only, no rows read
+#   data.slice(city, start, end)       # chart rows for a date range
+#   data.kpis(city, start, end)        # KPI boxes
+#   data.forecast(city)                # actual + forecast for objective 4
+#
+# A city is read on first use from the dataset's per-city Parquet file (see
+# storage.py) with only the columns the dashboard shows, turned into a
+# CityIndex (prefix sums + binary search) and kept in a small LRU shared by
+# every session. Memory is bounded by HOT_CITIES city slices, however many
+# rows or cities the datasets grow to.
+#
+# Chart data is downsampled to the chart's point budget (see
+# downsampling.py) and cached per (chart, city, range, metric, budget):
+#
+#   data.line(city, start, end, metric, max_points)     LTTB
+#   data.area(city, start, end, metric, max_points)     min/max buckets
+#   data.scatter(city, start, end, x, y, max_points)    grid-aggregated
+#
+# Weather / energy correlations come from the precomputed correlation cube
+# (see correlation_cube.py) instead of the rows.
+
+# Only the columns the dashboard actually uses; dates come back typed
+MAIN_COLUMNS = [
+    "date", "city", "energy_generated", "predicted_energy",
+    "energy_efficiency_index", "sunshine_hours", "temperature", "wind_speed"
+]
+
+HOT_CITIES = 8
+CHART_CACHE_SIZE = 64
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache; Streamlit sessions share it."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        # Built outside the lock so other cities are not blocked by a slow read
+        value = build()
+
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def normalize_forecast(df):
+    """Lower-case columns and make sure there is a `date` column."""
+    df.columns = df.columns.str.lower().str.strip()
+
+    # --- Flexible time handling ---
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+
+    elif "year" in df.columns:
+        df["date"] = pd.to_datetime(df["year"].astype(str) + "-01-01")
+
+    elif "forecast_year" in df.columns:
+        df["date"] = pd.to_datetime(df["forecast_year"].astype(str) + "-01-01")
+
+    elif "ds" in df.columns:
+        df["date"] = pd.to_datetime(df["ds"])
+
+    else:
+        # LAST RESORT: generate year sequence (2014–2034)
+        start_year = 2014
+        df["date"] = pd.date_range(
+            start=f"{start_year}-01-01",
+            periods=len(df),
+            freq="YS"
+        )
+
+    return df.sort_values("date").reset_index(drop=True)
+
+
+class DashboardData:
+
+    def __init__(self, main_path=ANALYTICS_MASTER_PATH, forecast_path=FORECAST_PATH,
+                 hot_cities=HOT_CITIES):
+        self.main_path = main_path
+        self.forecast_path = forecast_path
+        self._cities = None
+        self._history = LRUCache(hot_cities)
+        self._forecasts = LRUCache(hot_cities)
+        self._charts = LRUCache(CHART_CACHE_SIZE)
+        self._cube = None
+        self.version = None
+
+    def cities(self):
+        if self._cities is None:
+            self._cities = list_cities(self.main_path)
+        return self._cities
+
+    def city_index(self, city):
+        def build():
+            df = read_dataset(self.main_path, columns=MAIN_COLUMNS, cities=[city])
+            return CityIndex(df)
+        return self._history.get(city, build)
+
+    def slice(self, city, start, end):
+        return self.city_index(city).slice(city, start, end)
+
+    def kpis(self, city, start, end):
+        return self.city_index(city).kpis(city, start, end)
+
+    def line(self, city, start, end, metric, max_points):
+        """Rows of the range that keep the line's shape (LTTB)."""
+        def build():
+            df = self.slice(city, start, end)
+            return df.iloc[lttb_indices(df["date"].to_numpy(), df[metric].to_numpy(), max_points)]
+        return self._charts.get(("line", city, start, end, metric, max_points), build)
+
+    def area(self, city, start, end, metric, max_points):
+        """Rows of the range holding each bucket's min and max."""
+        def build():
+            df = self.slice(city, start, end)
+            return df.iloc[minmax_indices(df[metric].to_numpy(), max_points)]
+        return self._charts.get(("area", city, start, end, metric, max_points), build)
+
+    def scatter(self, city, start, end, x, y, max_points):
+        """x / y / points frame: the raw points, or grid-cell means with their counts."""
+        def build():
+            df = self.slice(city, start, end)
+            x_mean, y_mean, count = binned_scatter(df[x].to_numpy(), df[y].to_numpy(), max_points)
+            return pd.DataFrame({x: x_mean, y: y_mean, "points": count})
+        return self._charts.get(("scatter", city, start, end, (x, y), max_points), build)
+
+    def correlations(self):
+        if self._cube is None:
+            self._cube = load_cube(self.main_path)
+        return self._cube
+
+    def correlation(self, city, variable, start, end):
+        return self.correlations().correlation(city, variable, start, end)
+
+    def correlation_matrix(self, start, end):
+        """City x weather variable correlations, for cross-city comparison."""
+        return self.correlations().matrix(start, end)
+
+    def forecast(self, city):
+        def build():
+            return normalize_forecast(read_dataset(self.forecast_path, cities=[city]))
+        return self._forecasts.get(city, build)
+
+    def clear(self):
+        """Forget cached slices, e.g. after the pipeline rewrote the datasets."""
+        self._cities = None
+        self._history.clear()
+        self._forecasts.clear()
+        self._charts.clear()
+        self._cube = None
+
+    def sync(self, version):
+        """Drop cached slices once a newer snapshot (forecast_jobs.py version) has landed."""
+        if version != self.version:
+            self.clear()
+            self.version = version
+            return True
+        return False
@@ -0,0 +1,110 @@
+import numpy as np
+
+# ======================================================
+# CHART DOWNSAMPLING
+# ======================================================
+# A chart cannot show more points than it has pixels, so the dashboard
+# sends at most point_budget(width) points per chart:
+#
+#   lttb_indices     lines / bars: Largest-Triangle-Three-Buckets keeps the
+#                    points that shape the curve (peaks, dips, turns)
+#   minmax_indices   areas: the lowest and highest point of every bucket,
+#                    so no spike disappears from the filled envelope
+#   binned_scatter   scatter: points averaged per grid cell with a count,
+#                    the density picture of a hexbin without a new chart type
+#
+# The index functions return sorted row positions, so the caller keeps any
+# column of the selected rows (date_str labels, hover data). Series that
+# already fit the budget are returned untouched.
+
+POINTS_PER_PIXEL = 1
+MIN_POINTS = 100
+
+
+def point_budget(width_px, points_per_pixel=POINTS_PER_PIXEL):
+    """Maximum useful points for a chart `width_px` pixels wide."""
+    return max(MIN_POINTS, int(width_px * points_per_pixel))
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype("datetime64[ns]").view("i8")
+    return values.astype(np.float64)
+
+
+def lttb_indices(x, y, n_out):
+    """Positions of the `n_out` points Largest-Triangle-Three-Buckets keeps."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = _as_float(y)
+
+    # First and last point are always kept; n_out - 2 buckets in between
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo = edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        following = y[next_lo:next_hi]
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = np.nanmean(following) if np.isfinite(following).any() else y[a]
+
+        # Twice the triangle area (previous pick, candidate, next bucket mean)
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        area = np.where(np.isnan(area), -1.0, area)
+
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+
+    return keep
+
+
+def minmax_indices(y, n_out):
+    """Positions of each bucket's min and max, about `n_out` points in time order."""
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+
+    y = _as_float(y)
+    n_buckets = max(1, n_out // 2)
+    bucket = (np.arange(n) * n_buckets) // n
+    first = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    last = np.r_[first[1:], n] - 1
+
+    # Sorting by (bucket, value) puts each bucket's min first and max last;
+    # NaNs are pushed to the middle so they are never picked over real values
+    lows = np.lexsort((np.where(np.isnan(y), np.inf, y), bucket))
+    highs = np.lexsort((np.where(np.isnan(y), -np.inf, y), bucket))
+    return np.unique(np.concatenate((lows[first], highs[last])))
+
+
+def binned_scatter(x, y, max_points):
+    """(x mean, y mean, count) per occupied cell of a grid with ~max_points cells."""
+    x = _as_float(x)
+    y = _as_float(y)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+
+    if len(x) <= max_points:
+        return x, y, np.ones(len(x), dtype=np.int64)
+
+    side = max(1, int(np.sqrt(max_points)))
+
+    def cell(values):
+        lo, hi = values.min(), values.max()
+        if hi == lo:
+            return np.zeros(len(values), dtype=np.int64)
+        return np.minimum(((values - lo) / (hi - lo) * side).astype(np.int64), side - 1)
+
+    _, inverse = np.unique(cell(x) * side + cell(y), return_inverse=True)
+    count = np.bincount(inverse)
+    return (np.bincount(inverse, weights=x) / count,
+            np.bincount(inverse, weights=y) / count,
+            count)
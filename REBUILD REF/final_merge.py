@@ -1,62 +1,68 @@
+import argparse
 import pandas as pd
 import glob
 import os
 import warnings
 
+from instrumentation import stage, timed
+from merge_engine import join_tables, load_secondary
+from nasa_power import read_power_long, read_power_params
+from paths import DATA_DIR, NASA_MASTER_PATH
+from schemas import NASA_MASTER, enforce
+from storage import DatasetWriter
+
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
 # CONFIGURATION
-DATA_FOLDER = './data'
-OUTPUT_FILE = 'Master_Dataset_Final.csv'
+DATA_FOLDER = DATA_DIR
+OUTPUT_FILE = NASA_MASTER_PATH
 
-# Month mapping for date conversion
-month_map = {
-    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
-    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
-}
+# Build one city at a time and append it to the output (see
+# build_master_streaming); peak memory is one city's rows
+STREAMING = False
 
-def process_nasa_files():
-    print("--- STEP 1: PROCESSING SOLAR & WIND FILES ---")
-    
-    # Get all solar and wind files
+
+def nasa_files():
+    """{city: [solar / wind file paths]}, cities sorted."""
     files = glob.glob(os.path.join(DATA_FOLDER, "*_solar.csv")) + \
             glob.glob(os.path.join(DATA_FOLDER, "*_wind.csv"))
-    
-    all_data = []
 
-    for file in files:
-        filename = os.path.basename(file)
-        city = filename.split('_')[0] # Extract "Ahmedabad" from "Ahmedabad_solar.csv"
-        
-        try:
-            # 1. READ: Skip the first 15 rows of metadata
-            df = pd.read_csv(file, skiprows=15)
-            
-            # 2. CLEAN: Drop the 'ANN' (Annual) column if it exists
-            if 'ANN' in df.columns:
-                df = df.drop(columns=['ANN'])
-            
-            # 3. MELT: Convert Wide (Jan, Feb...) to Long (Month rows)
-            # We keep PARAMETER and YEAR fixed, and melt the month columns
-            df_melted = df.melt(id_vars=['PARAMETER', 'YEAR'], 
-                                var_name='Month_Name', 
-                                value_name='Value')
-            
-            # 4. FORMAT: Convert Month Name to Number
-            df_melted['Month'] = df_melted['Month_Name'].map(month_map)
-            df_melted['City'] = city
-            
-            all_data.append(df_melted)
-            print(f"✅ Processed: {filename}")
-            
-        except Exception as e:
-            print(f"❌ Error in {filename}: {e}")
+    by_city = {}
+    for file in sorted(files):
+        city = os.path.basename(file).split('_')[0] # Extract "Ahmedabad" from "Ahmedabad_solar.csv"
+        by_city.setdefault(city, []).append(file)
+    return dict(sorted(by_city.items()))
 
-    # Combine all cities into one big list
-    big_df = pd.concat(all_data, ignore_index=True)
 
-    print("\n--- STEP 2: PIVOTING PARAMETERS ---")
+def melt_nasa_file(file, city):
+    """PARAMETER / Year / Month / Value / City rows of one file, or None on error."""
+    filename = os.path.basename(file)
+
+    try:
+        # 1. READ: shared streaming reader (skips the header block itself)
+        df_long = read_power_long(file)
+        if df_long is None:
+            raise ValueError("NASA POWER header not found")
+
+        # 2. FORMAT: Long rows straight from the matrix, no melt needed
+        df_melted = pd.DataFrame({
+            'PARAMETER': df_long['PARAM'],
+            'Year': df_long['DATE'].dt.year,
+            'Month': df_long['DATE'].dt.month,
+            'Value': df_long['VALUE'],
+        })
+        df_melted['City'] = city
+
+        print(f"✅ Processed: {filename}")
+        return df_melted
+
+    except Exception as e:
+        print(f"❌ Error in {filename}: {e}")
+        return None
+
+
+def pivot_parameters(big_df):
     # Now we have rows like: "ALLSKY... | 2015 | 1 | 1.6099"
     # We want "ALLSKY..." to be a COLUMN.
     
@@ -64,53 +70,109 @@ def process_nasa_files():
     pivot_df = big_df.pivot_table(index=['City', 'Year', 'Month'], 
                                   columns='PARAMETER', 
                                   values='Value').reset_index()
+    pivot_df.columns.name = None
     
     # Create a proper DateTime column
     pivot_df['Date'] = pd.to_datetime(pivot_df[['Year', 'Month']].assign(DAY=1))
+    return pivot_df
+
+
+@timed("STEP 1-2: PROCESS + PIVOT NASA FILES")
+def process_nasa_files():
+    print("--- STEP 1: PROCESSING SOLAR & WIND FILES ---")
+    
+    all_data = []
+
+    for city, files in nasa_files().items():
+        for file in files:
+            df_melted = melt_nasa_file(file, city)
+            if df_melted is not None:
+                all_data.append(df_melted)
+
+    # Combine all cities into one big list
+    big_df = pd.concat(all_data, ignore_index=True)
+
+    print("\n--- STEP 2: PIVOTING PARAMETERS ---")
+    pivot_df = pivot_parameters(big_df)
     
     print(f"Pivot Shape: {pivot_df.shape}")
     return pivot_df
 
+@timed("STEP 3: MERGE SECONDARY DATA")
 def merge_secondary_data(main_df):
     print("\n--- STEP 3: MERGING SECONDARY DATA ---")
-    
-    # 1. Cloud Cover (Join on City, Year, Month)
-    cc_path = os.path.join(DATA_FOLDER, 'cloudcover_india_2015_2024.csv')
-    if os.path.exists(cc_path):
-        cc_df = pd.read_csv(cc_path)
-        # Ensure merge keys are same type
-        main_df = pd.merge(main_df, cc_df, on=['City', 'Year', 'Month'], how='left')
-        print(f"✅ Merged Cloud Cover")
-    
-    # 2. Population (Join on City, Year) - This data is annual, so it repeats for every month
-    pop_path = os.path.join(DATA_FOLDER, 'final_population_2015_2024.csv')
-    if os.path.exists(pop_path):
-        pop_df = pd.read_csv(pop_path)
-        main_df = pd.merge(main_df, pop_df, on=['City', 'Year'], how='left')
-        print(f"✅ Merged Population")
-
-    # 3. City Energy (Join on City, Year)
-    energy_path = os.path.join(DATA_FOLDER, 'city_energy_2015_2024.csv')
-    if os.path.exists(energy_path):
-        en_df = pd.read_csv(energy_path)
-        # Clean specific column issue if needed
-        main_df = pd.merge(main_df, en_df, on=['City', 'Year'], how='left')
-        print(f"✅ Merged Energy Data")
-        
-    return main_df
 
-# --- EXECUTION ---
-if __name__ == "__main__":
-    # Run the Pipeline
+    # Cloud Cover joins on (City, Year, Month); Population and City Energy are
+    # annual and join on (City, Year), repeating for every month. One keyed
+    # join for all of them, see merge_engine.py
+    tables = load_secondary(DATA_FOLDER, ["cloud", "population", "energy"])
+    return join_tables(main_df, tables)
+
+def order_columns(df):
+    # Clean up columns (move Date to front)
+    cols = ['Date', 'City', 'Year', 'Month'] + [c for c in df.columns if c not in ['Date', 'City', 'Year', 'Month']]
+    return enforce(df[cols], NASA_MASTER)
+
+
+def build_master(output_file=OUTPUT_FILE, streaming=STREAMING):
+    if streaming:
+        return build_master_streaming(output_file)
+
     nasa_df = process_nasa_files()
     final_df = merge_secondary_data(nasa_df)
-    
-    # Clean up columns (move Date to front)
-    cols = ['Date', 'City', 'Year', 'Month'] + [c for c in final_df.columns if c not in ['Date', 'City', 'Year', 'Month']]
-    final_df = final_df[cols]
+    final_df = order_columns(final_df)
     
     # Save
-    final_df.to_csv(OUTPUT_FILE, index=False)
-    print(f"\n🎉 SUCCESS! Master dataset saved to: {OUTPUT_FILE}")
+    with stage("SAVE MASTER", df_in=final_df):
+        final_df.to_csv(output_file, index=False)
+    print(f"\n🎉 SUCCESS! Master dataset saved to: {output_file}")
     print(f"Final Shape: {final_df.shape}")
-    print(f"Sample:\n{final_df.head(2)}")
\ No newline at end of file
+    print(f"Sample:\n{final_df.head(2)}")
+    return final_df
+
+
+def build_master_streaming(output_file=OUTPUT_FILE):
+    """Same master as build_master, built and appended one city at a time.
+
+    Cities are processed in sorted order, so the output is already in the
+    (City, Year, Month) order the all-in-one pivot produces and no global
+    sort is needed. Every city gets the same parameter columns: the names
+    are collected first from the file headers, without parsing values.
+    Returns None; the master is never held in memory as a whole.
+    """
+    by_city = nasa_files()
+
+    with stage("STEP 1: COLLECT PARAMETERS") as s:
+        params = sorted({p for files in by_city.values() for f in files for p in read_power_params(f)})
+        s.output(rows=len(params))
+
+    # Small secondary tables stay in memory; NASA rows are one city at a time
+    tables = load_secondary(DATA_FOLDER, ["cloud", "population", "energy"])
+
+    with stage("STEP 2-3: PIVOT + MERGE PER CITY") as s:
+        with DatasetWriter(output_file) as writer:
+            for city, files in by_city.items():
+                parts = [df for df in (melt_nasa_file(f, city) for f in files) if df is not None]
+                if not parts:
+                    continue
+
+                pivot_df = pivot_parameters(pd.concat(parts, ignore_index=True))
+                pivot_df = pivot_df.reindex(columns=['City', 'Year', 'Month'] + params + ['Date'])
+                writer.append(order_columns(join_tables(pivot_df, tables, verbose=False)))
+        s.output(rows=writer.rows, cities=len(by_city))
+
+    print(f"\n🎉 SUCCESS! Master dataset streamed to: {output_file}")
+    print(f"Rows: {writer.rows}")
+    return None
+
+# --- EXECUTION ---
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the NASA + secondary master dataset.")
+    parser.add_argument("--streaming", action="store_true", default=STREAMING,
+                        help="build and append one city at a time")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # Run the Pipeline
+    build_master(streaming=parse_args().streaming)
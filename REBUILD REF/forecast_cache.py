@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from forecasting import band_column
+from lag_features import lag_specs, max_lookback
+from paths import CACHE_DIR
+
+# ======================================================
+# PER-CITY FORECAST CACHE
+# ======================================================
+# Every city is forecast from the month after its own last observation up
+# to the end date (forecast_cities), so a city's trajectory depends only on
+# the model and on the rows it starts from, never on the other cities.
+# That makes each trajectory cacheable on its own:
+#
+#   cache/forecasts/
+#       3f9c0a1b2d4e5f60/           <- model key (model_registry.py)
+#           Delhi.npz               <- ENERGY_GENERATED (+ P10 / P50 / P90) per step
+#           Mumbai.npz
+#
+# Each file records the city's last observed date, a hash of its latest
+# rows (the lag state the recursion starts from) and the bands it
+# holds; steps are counted from that last date. A request only recomputes
+# the cities whose entry is missing or stale, all in one batched forecast,
+# so a new month for one city costs that city's recursion. A retrained
+# model has a new key, so nothing of the old model is served.
+#
+# Trajectories are deterministic step by step, so a shorter horizon (an
+# earlier end date) is the prefix of a longer cached one and is sliced out
+# instead of recomputed.
+#
+#   cache = ForecastCache()
+#   future_df, recomputed = cache.forecast(model, model_key, history, "2034-12-01")
+
+FORECAST_CACHE = os.path.join(CACHE_DIR, "forecasts")
+
+# Rows per city hashed as the recursion's seed: at least a year (the seasonal
+# baseline's window), more if a lag feature reaches further back
+STATE_ROWS = 12
+
+
+def forecast_with_bands(model, history, future_dates, quantiles=()):
+    """model.forecast() with the model's quantile bands attached, if it has any."""
+    future_df = model.forecast(history, future_dates)
+    if quantiles:
+        bands = model.forecast_bands(history, future_dates, quantiles)
+        if bands is not None:
+            band_cols = [band_column(q) for q in quantiles]
+            future_df[band_cols] = bands[band_cols].to_numpy()
+    return future_df
+
+
+def last_dates(history):
+    """Latest DATE per city, in order of first appearance."""
+    return history.groupby("CITY", sort=False, observed=True)["DATE"].max()
+
+
+def city_future_dates(last_date, end):
+    """Month starts from the month after `last_date` through `end`."""
+    return pd.date_range(last_date + pd.offsets.MonthBegin(1), end, freq="MS")
+
+
+def forecast_cities(model, history, end, quantiles=()):
+    """Forecast every city from the month after its own last row through `end`.
+
+    Cities that end on the same month are forecast in one batch. Rows are
+    ordered by city as they first appear in `history`, then by date.
+    """
+    last = last_dates(history)
+    parts = []
+    for last_date, cities in last.groupby(last, sort=False):
+        future_dates = city_future_dates(last_date, end)
+        if len(future_dates):
+            subset = history[history["CITY"].isin(cities.index)]
+            parts.append(forecast_with_bands(model, subset, future_dates, quantiles))
+
+    if not parts:
+        return pd.DataFrame(columns=["DATE", "CITY", model.target])
+
+    out = pd.concat(parts, ignore_index=True)
+    position = {city: i for i, city in enumerate(last.index)}
+    order = out["CITY"].map(position).to_numpy().argsort(kind="stable")
+    return out.iloc[order].reset_index(drop=True)
+
+
+class ForecastCache:
+
+    def __init__(self, folder=FORECAST_CACHE):
+        self.folder = folder
+
+    def path(self, model_key, city):
+        return os.path.join(self.folder, model_key, quote(str(city), safe="") + ".npz")
+
+    # --------------------------------------------------
+    # entries
+    # --------------------------------------------------
+    @staticmethod
+    def origins(history, columns, quantiles=()):
+        """{city: origin} describing where each city's recursion starts."""
+        columns = [c for c in columns if c in history.columns]
+        n_rows = max(STATE_ROWS, max_lookback(lag_specs(columns)))
+        origins = {}
+        for city, rows in history.groupby("CITY", sort=False, observed=True):
+            rows = rows.tail(n_rows)
+            digest = hashlib.sha256(
+                pd.util.hash_pandas_object(rows[columns], index=False).values.tobytes()
+            ).hexdigest()[:16]
+            origins[city] = {
+                "last_date": str(rows["DATE"].max()),
+                "state": digest,
+                "quantiles": [float(q) for q in quantiles],
+            }
+        return origins
+
+    def load(self, model_key, city, origin, n_steps):
+        """First `n_steps` cached {column: values}, or None if missing, stale or too short."""
+        path = self.path(model_key, city)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path) as f:
+            if json.loads(str(f["origin"])) != origin:
+                return None
+            values = {name: f[name] for name in f.files if name != "origin"}
+        if any(len(v) < n_steps for v in values.values()):
+            return None
+        return {name: v[:n_steps] for name, v in values.items()}
+
+    def save(self, model_key, city, origin, values):
+        path = self.path(model_key, city)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, origin=np.array(json.dumps(origin)), **values)
+        os.replace(tmp_path, path)
+
+    # --------------------------------------------------
+    # forecasting
+    # --------------------------------------------------
+    def forecast(self, model, model_key, history, end, quantiles=()):
+        """Same frame as forecast_cities(), recomputing only uncached cities.
+
+        Returns (frame, list of recomputed cities).
+        """
+        last = last_dates(history)
+        horizons = {city: city_future_dates(d, end) for city, d in last.items()}
+        origins = self.origins(history, model.features + [model.target], quantiles)
+
+        cached = {}
+        for city, origin in origins.items():
+            values = self.load(model_key, city, origin, len(horizons[city]))
+            if values is not None:
+                cached[city] = values
+        missing = [city for city in origins if city not in cached and len(horizons[city])]
+
+        if missing:
+            # One batched recursion per distinct last month of the stale cities
+            computed = forecast_cities(model, history[history["CITY"].isin(missing)], end, quantiles)
+            columns = [c for c in computed.columns if c not in ("DATE", "CITY")]
+            for city, rows in computed.groupby("CITY", sort=False, observed=True):
+                values = {c: rows[c].to_numpy(dtype=np.float64) for c in columns}
+                self.save(model_key, city, origins[city], values)
+                cached[city] = values
+
+        parts = []
+        for city, future_dates in horizons.items():
+            if len(future_dates):
+                part = pd.DataFrame({"DATE": future_dates.values,
+                                     "CITY": np.full(len(future_dates), city, dtype=object)})
+                for c, values in cached[city].items():
+                    part[c] = values
+                parts.append(part)
+
+        if not parts:
+            return pd.DataFrame(columns=["DATE", "CITY", model.target]), missing
+        return pd.concat(parts, ignore_index=True), missing
@@ -0,0 +1,339 @@
+import argparse
+import contextlib
+import functools
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+from paths import LOG_DIR
+
+# ======================================================
+# BACKGROUND FORECAST JOBS
+# ======================================================
+# The dashboard never computes forecasts itself. It queues a job and keeps
+# serving the last good snapshot; worker processes pick jobs up and run the
+# pipeline (pipeline.py) out of band:
+#
+#   python forecast_jobs.py submit refresh        queue a job
+#   python forecast_jobs.py worker --processes 2 --watch
+#   python forecast_jobs.py status
+#
+# Jobs live in a local SQLite queue (logs/jobs.sqlite, WAL mode so the
+# dashboard can poll while workers write). Claiming a job is a single
+# IMMEDIATE transaction, so two workers never take the same job, and a job
+# waits while another running job would rebuild any of the same pipeline
+# stages (its targets plus their dependencies), e.g. a refresh waits for a
+# retrain since both write the forecast. Each job runs in its own freshly
+# spawned child process (so model_config.json and code are re-read) with
+# its output in logs/jobs/<id>.log; the worker keeps a heartbeat, and jobs
+# whose worker died are put back in the queue.
+#
+# With --watch, idle workers queue a refresh whenever the pipeline sees
+# changed inputs (new data, code or model_config.json). Forecast files are
+# swapped in atomically by storage.write_dataset, so readers only ever see
+# a complete old or a complete new snapshot.
+
+JOBS_DB_PATH = os.path.join(LOG_DIR, "jobs.sqlite")
+JOB_LOG_DIR = os.path.join(LOG_DIR, "jobs")
+
+# kind -> pipeline targets and whether to rerun them even if unchanged
+JOBS = {
+    "refresh": {"targets": ["combine", "correlation_cube"], "force": False},
+    "retrain": {"targets": ["train", "combine"], "force": True},
+    "backtest": {"targets": ["backtest"], "force": False},
+}
+
+POLL_SECONDS = 5
+WATCH_SECONDS = 60
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 120     # a running job without a heartbeat this long is requeued
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,       -- queued | running | done | failed
+    reason TEXT,
+    submitted TEXT NOT NULL,
+    started TEXT,
+    heartbeat TEXT,
+    finished TEXT,
+    worker TEXT,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _age_seconds(timestamp):
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(timestamp)).total_seconds()
+
+
+@functools.lru_cache(maxsize=None)
+def job_stages(kind):
+    """Pipeline stages that write outputs when a `kind` job runs (targets + dependencies)."""
+    import pipeline
+    runner = pipeline.Pipeline(pipeline.STAGES)
+    return frozenset(
+        name for name in runner.select(JOBS[kind]["targets"]) if runner.stages[name].outputs
+    )
+
+
+class JobQueue:
+
+    def __init__(self, path=JOBS_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # Autocommit; multi-statement updates open their own transaction
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def submit(self, kind, reason="manual"):
+        """Queue a job; returns the id of an identical job already waiting instead."""
+        if kind not in JOBS:
+            raise ValueError(f"❌ Unknown job kind {kind!r}, choose from {sorted(JOBS)}")
+
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute(
+                "SELECT id FROM jobs WHERE kind = ? AND status = 'queued' ORDER BY id LIMIT 1",
+                (kind,)
+            ).fetchone()
+            if row is None:
+                job_id = db.execute(
+                    "INSERT INTO jobs (kind, status, reason, submitted) VALUES (?, 'queued', ?, ?)",
+                    (kind, reason, _now())
+                ).lastrowid
+            else:
+                job_id = row["id"]
+            db.execute("COMMIT")
+        return job_id
+
+    def claim(self, worker):
+        """Oldest queued job that shares no stage with a running job, marked running; or None."""
+        # Resolved before the transaction: the first call imports the pipeline
+        stages = {kind: job_stages(kind) for kind in JOBS}
+
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            running = {r["kind"] for r in db.execute("SELECT kind FROM jobs WHERE status = 'running'")}
+            busy = set().union(*(stages.get(kind, ()) for kind in running))
+            queued = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id").fetchall()
+            row = next(
+                (job for job in queued
+                 if job["kind"] not in running and not stages.get(job["kind"], set()) & busy),
+                None
+            )
+            if row is not None:
+                now = _now()
+                db.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, worker = ? "
+                    "WHERE id = ?",
+                    (now, now, worker, row["id"])
+                )
+            db.execute("COMMIT")
+        return dict(row) if row is not None else None
+
+    def heartbeat(self, job_id):
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (_now(), job_id))
+
+    def finish(self, job_id, status, message=""):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, message = ? WHERE id = ?",
+                (status, _now(), message, job_id)
+            )
+            if status == "done":
+                db.execute(
+                    "INSERT INTO counters (name, value) VALUES ('data_version', 1) "
+                    "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+                )
+            db.execute("COMMIT")
+
+    def requeue_stale(self, stale_seconds=STALE_SECONDS):
+        """Put running jobs whose worker stopped sending heartbeats back in the queue."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            stale = [
+                row["id"] for row in db.execute("SELECT id, heartbeat FROM jobs WHERE status = 'running'")
+                if row["heartbeat"] is None or _age_seconds(row["heartbeat"]) > stale_seconds
+            ]
+            for job_id in stale:
+                db.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, "
+                    "message = 'requeued: worker stopped' WHERE id = ?",
+                    (job_id,)
+                )
+            db.execute("COMMIT")
+        return stale
+
+    def latest(self, kind=None):
+        """Most recent job (of `kind`), as a dict, or None."""
+        query, args = "SELECT * FROM jobs ORDER BY id DESC LIMIT 1", ()
+        if kind is not None:
+            query, args = "SELECT * FROM jobs WHERE kind = ? ORDER BY id DESC LIMIT 1", (kind,)
+        with self._connect() as db:
+            row = db.execute(query, args).fetchone()
+        return dict(row) if row is not None else None
+
+    def recent(self, limit=10):
+        with self._connect() as db:
+            return [dict(r) for r in db.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+
+    def data_version(self):
+        """Counter bumped by every successful job, in the order they finish; None before the first."""
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM counters WHERE name = 'data_version'").fetchone()
+        return row["value"] if row is not None else None
+
+
+# ======================================================
+# RUNNING A JOB (CHILD PROCESS)
+# ======================================================
+def execute_job(kind, log_path):
+    """Run the job's pipeline targets with all output in `log_path`; exit 1 on failure."""
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+    # The child process only runs this job, so everything it prints goes to
+    # the log, including the stage summary printed at exit
+    sys.stdout = sys.stderr = open(log_path, "a", encoding="utf-8", buffering=1)
+
+    import pipeline
+    spec = JOBS[kind]
+    status = pipeline.Pipeline(pipeline.STAGES).run(spec["targets"], force=spec["force"])
+
+    if any(s in ("failed", "blocked") for s in status.values()):
+        sys.exit(1)
+
+
+def run_job(queue, job, worker):
+    log_path = os.path.join(JOB_LOG_DIR, f"{job['id']}.log")
+    print(f"▶️ [{worker}] job {job['id']} ({job['kind']}, {job['reason']})")
+
+    # Spawned, not forked: a forked child would inherit modules this worker
+    # imported earlier (e.g. the trainer's config, loaded at import by
+    # stale_stages) and train with a model_config.json that has since changed
+    child = multiprocessing.get_context("spawn").Process(
+        target=execute_job, args=(job["kind"], log_path)
+    )
+    child.start()
+    while True:
+        child.join(HEARTBEAT_SECONDS)
+        if child.exitcode is not None:
+            break
+        queue.heartbeat(job["id"])
+
+    if child.exitcode == 0:
+        queue.finish(job["id"], "done", f"log: {log_path}")
+        print(f"✅ [{worker}] job {job['id']} done")
+    else:
+        queue.finish(job["id"], "failed", f"exit code {child.exitcode}, log: {log_path}")
+        print(f"❌ [{worker}] job {job['id']} failed, see {log_path}")
+
+
+def stale_stages(kind="refresh"):
+    """Pipeline stages the job would actually run right now."""
+    import pipeline
+    plan = pipeline.Pipeline(pipeline.STAGES).plan(JOBS[kind]["targets"])
+    return [name for name, _, skip in plan if not skip]
+
+
+# ======================================================
+# WORKER LOOP
+# ======================================================
+def worker_loop(path=JOBS_DB_PATH, watch=False, once=False):
+    queue = JobQueue(path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    last_watch = 0.0
+
+    while True:
+        queue.requeue_stale()
+
+        if watch and time.monotonic() - last_watch >= WATCH_SECONDS:
+            last_watch = time.monotonic()
+            changed = stale_stages("refresh")
+            if changed:
+                job_id = queue.submit("refresh", reason="changed: " + ", ".join(changed))
+                print(f"🔁 [{worker}] inputs changed ({', '.join(changed)}) -> job {job_id}")
+
+        job = queue.claim(worker)
+        if job is not None:
+            run_job(queue, job, worker)
+            continue
+
+        if once:
+            return
+        time.sleep(POLL_SECONDS)
+
+
+def run_workers(processes=1, path=JOBS_DB_PATH, watch=False, once=False):
+    if processes <= 1:
+        worker_loop(path, watch, once)
+        return
+
+    # Only the first worker watches for changes; the queue dedupes anyway
+    workers = [
+        multiprocessing.Process(target=worker_loop, args=(path, watch and i == 0, once))
+        for i in range(processes)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+
+# ======================================================
+# MAIN
+# ======================================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Background forecast refresh jobs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    submit = sub.add_parser("submit", help="queue a job")
+    submit.add_argument("kind", choices=sorted(JOBS))
+    submit.add_argument("--reason", default="manual")
+
+    worker = sub.add_parser("worker", help="run jobs from the queue")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--watch", action="store_true", help="queue a refresh when inputs change")
+    worker.add_argument("--once", action="store_true", help="exit when the queue is empty")
+
+    sub.add_parser("status", help="show recent jobs")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.command == "submit":
+        print(f"📥 Job {JobQueue().submit(args.kind, args.reason)} queued ({args.kind})")
+    elif args.command == "worker":
+        run_workers(args.processes, watch=args.watch, once=args.once)
+    else:
+        for job in JobQueue().recent():
+            print(f"{job['id']:>5}  {job['kind']:<9} {job['status']:<8} "
+                  f"{job['finished'] or job['started'] or job['submitted']}  {job['message'] or ''}")
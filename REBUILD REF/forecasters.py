@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from city_models import (CITY_COLUMN, LOCAL_MODEL_PARAMS, MIN_HISTORY_MONTHS, N_CLUSTERS,
+                         fit_routed_model)
+from forecasting import recursive_forecast, recursive_forecast_bands
+
+# ======================================================
+# FORECASTING ENGINES
+# ======================================================
+# Every engine has the same interface:
+#
+#   model = make_forecaster("ridge", FEATURES)
+#   model.fit(X, y)                       # X in FEATURES order
+#   model.predict(X)                      # one-step predictions
+#   model.forecast(history, future_dates) # DATE / CITY / ENERGY_GENERATED
+#
+# `history` is the trainer's lag-feature frame (DATE, CITY, FEATURES,
+# target), sorted by city then date. Feature engines forecast with the
+# batched recursive forecaster; seasonal_naive repeats each city's last
+# year plus its average year-on-year change, for all cities and months in
+# one array operation.
+#
+#   random_forest   the original model; global or routed (city_models.py),
+#                   the only engine with P10 / P90 bands
+#   hist_gb         histogram gradient boosting, city code as a category
+#   ridge           ridge regression on scaled features, one-hot city
+#   seasonal_naive  seasonal-trend baseline, no feature model at all
+#
+# benchmark_pipeline.py times every engine and backtest.py --engine scores
+# them, so the engine can be chosen on accuracy vs latency.
+
+DEFAULT_ENGINE = "random_forest"
+
+
+class Forecaster:
+    """Shared fit / predict / forecast plumbing; subclasses fill in _fit and _predict."""
+
+    name = None
+    default_params = {}
+    dtype = np.float64      # feature matrix type handed to the model
+    # Bumped when an engine's forecasts change; part of config(), so the
+    # registry, the forecast cache and backtest.py drop the old results
+    version = 2     # lag features rebuilt from each city's value buffer
+
+    def __init__(self, features, params=None, target="ENERGY_GENERATED"):
+        self.features = list(features)
+        self.params = {**self.default_params, **(params or {})}
+        self.target = target
+
+    def config(self):
+        """Everything that changes the fitted model; part of the registry key."""
+        return {"engine": self.name, "version": self.version, **self.params}
+
+    def _matrix(self, X):
+        if isinstance(X, pd.DataFrame):
+            X = X[self.features]
+        return np.asarray(X, dtype=self.dtype)
+
+    def fit(self, X, y):
+        self._fit(self._matrix(X), np.asarray(y, dtype=np.float64))
+        return self
+
+    def predict(self, X):
+        return self._predict(self._matrix(X))
+
+    def forecast(self, history, future_dates):
+        return recursive_forecast(self, history, self.features, future_dates,
+                                  target_col=self.target)
+
+    def forecast_bands(self, history, future_dates, quantiles):
+        """Quantile bands, or None if the engine has no spread of its own."""
+        return None
+
+    def _city_index(self):
+        return self.features.index(CITY_COLUMN) if CITY_COLUMN in self.features else None
+
+
+# ======================================================
+# ENGINES
+# ======================================================
+class RandomForestForecaster(Forecaster):
+
+    name = "random_forest"
+    default_params = dict(n_estimators=400, max_depth=20, random_state=42, n_jobs=-1)
+    # Trees split on float32 anyway, so this only skips sklearn's own copy
+    dtype = np.float32
+
+    def __init__(self, features, params=None, target="ENERGY_GENERATED",
+                 training_mode="global", n_cities=None, workers=0):
+        super().__init__(features, params, target)
+        self.training_mode = training_mode
+        self.n_cities = n_cities
+        self.workers = workers
+        self.model = None
+
+    def config(self):
+        config = super().config()
+        if self.training_mode != "global":
+            config.update(training_mode=self.training_mode, local_params=LOCAL_MODEL_PARAMS,
+                          n_clusters=N_CLUSTERS, min_history=MIN_HISTORY_MONTHS)
+        return config
+
+    def _fit(self, X, y):
+        if self.training_mode == "global":
+            self.model = RandomForestRegressor(**self.params).fit(X, y)
+        else:
+            self.model = fit_routed_model(X, y, self.features, self.training_mode, self.params,
+                                          n_cities=self.n_cities, workers=self.workers)
+
+    def _predict(self, X):
+        return self.model.predict(X)
+
+    def forecast_bands(self, history, future_dates, quantiles):
+        return recursive_forecast_bands(self.model, history, self.features, future_dates,
+                                        quantiles, target_col=self.target)
+
+
+class HistGradientBoostingForecaster(Forecaster):
+
+    name = "hist_gb"
+    default_params = dict(max_iter=300, learning_rate=0.05, max_leaf_nodes=31, random_state=42)
+
+    def _fit(self, X, y):
+        city = self._city_index()
+        # Codes beyond the bin limit are left numeric
+        categorical = [city] if city is not None and X[:, city].max() < 255 else None
+        self.model = HistGradientBoostingRegressor(categorical_features=categorical, **self.params)
+        self.model.fit(X, y)
+
+    def _predict(self, X):
+        return self.model.predict(X)
+
+
+class RidgeForecaster(Forecaster):
+
+    name = "ridge"
+    default_params = dict(alpha=1.0)
+
+    def _fit(self, X, y):
+        city = self._city_index()
+        numeric = [i for i in range(X.shape[1]) if i != city]
+        columns = [("scaled", StandardScaler(), numeric)]
+        if city is not None:
+            # Per-city intercept instead of treating the label code as a number
+            columns.append(("city", OneHotEncoder(handle_unknown="ignore"), [city]))
+
+        self.model = make_pipeline(ColumnTransformer(columns), Ridge(**self.params))
+        self.model.fit(X, y)
+
+    def _predict(self, X):
+        return self.model.predict(X)
+
+
+class SeasonalNaiveForecaster(Forecaster):
+    """Last year's value for the same month, plus the city's mean yearly change."""
+
+    name = "seasonal_naive"
+    default_params = dict(trend=True)
+    version = 2     # seasonal slots follow each city's own last month
+
+    def _fit(self, X, y):
+        lag_12 = X[:, self.features.index("ENERGY_LAG_12")]
+        change = y - lag_12 if self.params["trend"] else np.zeros_like(y)
+
+        city = self._city_index()
+        self.global_drift = float(change.mean())
+        self.drift = {}
+        if city is not None:
+            codes = X[:, city].astype(np.int64)
+            sums = np.bincount(codes, weights=change)
+            counts = np.bincount(codes)
+            self.drift = {int(c): float(sums[c] / counts[c]) for c in np.flatnonzero(counts)}
+
+    def _drift_for(self, codes):
+        return np.array([self.drift.get(int(c), self.global_drift) for c in codes])
+
+    def _predict(self, X):
+        lag_12 = X[:, self.features.index("ENERGY_LAG_12")]
+        city = self._city_index()
+        if city is None:
+            return lag_12 + self.global_drift
+        return lag_12 + self._drift_for(X[:, city])
+
+    def forecast(self, history, future_dates):
+        future_dates = pd.DatetimeIndex(future_dates)
+        n_steps = len(future_dates)
+
+        # (cities x 12) matrix of each city's latest year, oldest month first
+        last_year = history.groupby("CITY", sort=False).tail(12)
+        position = last_year.groupby("CITY", sort=False).cumcount(ascending=False)
+        cities = history["CITY"].drop_duplicates().to_numpy()
+        grid = (last_year.assign(SLOT=11 - position)
+                .pivot(index="CITY", columns="SLOT", values=self.target)
+                .reindex(index=cities, columns=range(12)))
+        # Cities with less than a year of history repeat their latest value
+        grid = grid.T.bfill().ffill().T.to_numpy()
+
+        if CITY_COLUMN in history.columns:
+            codes = history.groupby("CITY", sort=False)[CITY_COLUMN].last().to_numpy()
+            drift = self._drift_for(codes)
+        else:
+            drift = np.full(len(cities), self.global_drift)
+
+        # A city whose history ends before the month preceding future_dates[0]
+        # is `gap` months further from its latest year; step k of the city
+        # then falls on slot (k + gap) % 12, (k + gap) // 12 + 1 years on
+        gap = np.zeros(len(cities), dtype=np.int64)
+        if "DATE" in history.columns and n_steps:
+            last = pd.DatetimeIndex(history.groupby("CITY", sort=False)["DATE"].max().reindex(cities))
+            first = future_dates[0]
+            gap = (first.year * 12 + first.month) - (last.year * 12 + last.month).to_numpy() - 1
+
+        steps = np.arange(n_steps)[None, :] + gap[:, None]
+        predictions = (np.take_along_axis(grid, steps % 12, axis=1)
+                       + drift[:, None] * (steps // 12 + 1))
+
+        return pd.DataFrame({
+            "DATE": np.tile(future_dates.values, len(cities)),
+            "CITY": np.repeat(cities, n_steps),
+            self.target: predictions.ravel(),
+        })
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (RandomForestForecaster, HistGradientBoostingForecaster,
+                   RidgeForecaster, SeasonalNaiveForecaster)
+}
+
+
+def make_forecaster(engine, features, params=None, **options):
+    """Instantiate an engine by name; `options` are engine specific (e.g. training_mode)."""
+    if engine not in ENGINES:
+        raise ValueError(f"❌ Unknown forecasting engine {engine!r}, choose from {sorted(ENGINES)}")
+    return ENGINES[engine](features, params, **options)
@@ -0,0 +1,176 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from lag_features import feature_name, lag_specs, max_lookback, next_lag_row
+
+# ======================================================
+# BATCHED RECURSIVE FORECASTER
+# ======================================================
+# All cities are advanced together one month at a time, so each step is a
+# single model.predict call on a (cities x features) NumPy matrix instead of
+# one call per city per month on a one-row DataFrame.
+#
+# Each city keeps a buffer of its last max_lookback() values. Every step the
+# prediction is pushed onto it and every lag / rolling / seasonal_diff
+# feature of the model is rebuilt from it (lag_features.next_lag_row), so
+# the forecast uses the same definitions the model was trained on.
+#
+# recursive_forecast_bands() runs the same loop once per tree of the forest
+# to give P10 / P50 / P90 style prediction bands. Both accept the
+# per-city / per-cluster models of city_models.py as well.
+
+
+def forecast_state(history, features,
+                   city_col="CITY",
+                   target_col="ENERGY_GENERATED",
+                   prefix="ENERGY"):
+    """(last_rows, buffer, specs) that a recursive forecast starts from.
+
+    `history` is sorted by city then date. `last_rows` holds each city's
+    latest row, `buffer` its latest max_lookback() target values (cities x
+    lookback, oldest first) and `specs` the lag features among `features`.
+    """
+    specs = lag_specs(features, prefix)
+    lookback = max_lookback(specs)
+    cities = history.groupby(city_col, sort=False)
+    last_rows = cities.tail(1)
+
+    tail = cities.tail(lookback)
+    row = tail[city_col].map({city: i for i, city in enumerate(last_rows[city_col])})
+    slot = lookback - 1 - tail.groupby(city_col, sort=False).cumcount(ascending=False)
+    buffer = np.full((len(last_rows), lookback), np.nan)
+    buffer[row.to_numpy(), slot.to_numpy()] = tail[target_col].to_numpy(dtype=np.float64)
+
+    # Months before the city's first row are still known through its lags
+    for kind, size in specs:
+        if kind == "lag" and size < lookback:
+            col = lookback - 1 - size
+            lagged = last_rows[feature_name(kind, size, prefix)].to_numpy(dtype=np.float64)
+            buffer[:, col] = np.where(np.isnan(buffer[:, col]), lagged, buffer[:, col])
+
+    return last_rows, buffer, specs
+
+
+def _lag_update(state, buffer, specs, features, prefix):
+    """Overwrite the lag columns of `state` with the features next_lag_row() builds."""
+    if specs:
+        for name, values in next_lag_row(buffer, specs, prefix).items():
+            state[..., features.index(name)] = values
+
+
+def recursive_forecast(model, history, features, future_dates,
+                       city_col="CITY",
+                       target_col="ENERGY_GENERATED",
+                       prefix="ENERGY"):
+    """Forecast every city in `history` over `future_dates`.
+
+    Non-lag features are carried forward from each city's latest row; the
+    lag features of every step are rebuilt from the city's value buffer,
+    observed months first, then its own predictions.
+
+    Returns a long DATE / CITY / ENERGY_GENERATED frame ordered by city,
+    then date.
+    """
+    future_dates = pd.DatetimeIndex(future_dates)
+    last_rows, buffer, specs = forecast_state(history, features, city_col, target_col, prefix)
+    n_cities = len(last_rows)
+    n_steps = len(future_dates)
+
+    # Preallocated state and output arrays, updated in place every step
+    state = last_rows[features].to_numpy(dtype=np.float64, copy=True)
+    predictions = np.empty((n_steps, n_cities), dtype=np.float64)
+    _lag_update(state, buffer, specs, features, prefix)
+
+    with warnings.catch_warnings():
+        # Model may have been fitted on a DataFrame; NumPy input is intentional
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+        for step in range(n_steps):
+            prediction = model.predict(state)
+            predictions[step] = prediction
+
+            buffer[:, :-1] = buffer[:, 1:]
+            buffer[:, -1:] = prediction[:, None]
+            _lag_update(state, buffer, specs, features, prefix)
+
+    return pd.DataFrame({
+        "DATE": np.tile(future_dates.values, n_cities),
+        city_col: np.repeat(last_rows[city_col].to_numpy(), n_steps),
+        target_col: predictions.T.ravel(),
+    })
+
+
+def band_column(quantile, prefix="ENERGY"):
+    return f"{prefix}_P{int(round(quantile * 100))}"
+
+
+def recursive_forecast_bands(model, history, features, future_dates,
+                             quantiles=(0.1, 0.5, 0.9),
+                             city_col="CITY",
+                             target_col="ENERGY_GENERATED",
+                             prefix="ENERGY"):
+    """Quantile bands (e.g. ENERGY_P10 / P50 / P90) from the forest's own trees.
+
+    Every tree forecasts its own path: its prediction feeds its own value
+    buffer, so disagreement between trees compounds over the horizon and the
+    bands widen the way real uncertainty does. Each month is one pass over
+    the trees, each tree predicting all cities at once straight from its
+    node arrays; nothing is refitted or bootstrapped.
+
+    Returns a long DATE / CITY / band frame in the same row order as
+    recursive_forecast().
+    """
+    last_rows, buffer, specs = forecast_state(history, features, city_col, target_col, prefix)
+    return _forecast_bands(model, last_rows, buffer, specs, features, future_dates,
+                           quantiles, city_col, prefix)
+
+
+def _forecast_bands(model, last_rows, buffer, specs, features, future_dates,
+                    quantiles, city_col, prefix):
+    if hasattr(model, "partition"):
+        # City-routed model (city_models.py): each forest runs its own cities
+        parts = [
+            _forecast_bands(sub_model, last_rows.iloc[rows], buffer[rows], specs, features,
+                            future_dates, quantiles, city_col, prefix)
+            for sub_model, rows in model.partition(last_rows[features].to_numpy(dtype=np.float64))
+        ]
+        position = {city: i for i, city in enumerate(last_rows[city_col])}
+        out = pd.concat(parts, ignore_index=True)
+        order = out[city_col].map(position).to_numpy().argsort(kind="stable")
+        return out.iloc[order].reset_index(drop=True)
+
+    future_dates = pd.DatetimeIndex(future_dates)
+    n_cities = len(last_rows)
+    n_steps = len(future_dates)
+    trees = [est.tree_ for est in model.estimators_]
+
+    # (trees x cities x features) state and (trees x cities x lookback)
+    # buffers, one trajectory per tree
+    base = last_rows[features].to_numpy(dtype=np.float64)
+    state = np.repeat(base[None, :, :], len(trees), axis=0)
+    buffer = np.repeat(buffer[None, :, :], len(trees), axis=0)
+    paths = np.empty((len(trees), n_cities), dtype=np.float64)
+    bands = np.empty((len(quantiles), n_steps, n_cities), dtype=np.float64)
+    _lag_update(state, buffer, specs, features, prefix)
+
+    for step in range(n_steps):
+        # sklearn trees evaluate float32 input
+        state32 = state.astype(np.float32)
+        for t, tree in enumerate(trees):
+            paths[t] = tree.predict(state32[t]).reshape(n_cities, -1)[:, 0]
+
+        bands[:, step, :] = np.quantile(paths, quantiles, axis=0)
+
+        buffer[..., :-1] = buffer[..., 1:]
+        buffer[..., -1:] = paths[..., None]
+        _lag_update(state, buffer, specs, features, prefix)
+
+    out = pd.DataFrame({
+        "DATE": np.tile(future_dates.values, n_cities),
+        city_col: np.repeat(last_rows[city_col].to_numpy(), n_steps),
+    })
+    for q, values in zip(quantiles, bands):
+        out[band_column(q, prefix)] = values.T.ravel()
+    return out
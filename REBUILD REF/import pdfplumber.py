@@ -4,6 +4,8 @@ import os
 import re
 import numpy as np
 
+from merge_engine import join_tables, load_secondary
+
 # -----------------------------------------------------------
 # 1️⃣  SET YOUR DATA DIRECTORY
 # -----------------------------------------------------------
@@ -22,16 +24,8 @@ cities = [
 # -----------------------------------------------------------
 print("\n📌 Loading sunshine/cloud/population/energy datasets...\n")
 
-sunshine = pd.read_csv(f"{DATA_DIR}/sunshine_india_2015_2024.csv")
-cloud = pd.read_csv(f"{DATA_DIR}/cloudcover_india_2015_2024.csv")
-population = pd.read_csv(f"{DATA_DIR}/final_population_2015_2024.csv")
-energy = pd.read_csv(f"{DATA_DIR}/city_energy_2015_2024.csv")
-
-# Standardize column names
-sunshine.columns = ["City","Year","Month","Sunshine_Hours"]
-cloud.columns = ["City","Year","Month","Cloud_Cover"]
-population.columns = ["City","Year","Population","Population_Density","Growth_Rate"]
-energy.columns = ["City","State","Year","Energy_Consumption_GWh","Per_Capita_kWh","Peak_Demand_MW"]
+# Standard column names; keys are typed by the merge engine
+secondary = load_secondary(DATA_DIR)
 
 # -----------------------------------------------------------
 # 4️⃣  LOAD SOLAR + WIND NASA FILES WITH DEBUGGING
@@ -97,20 +91,14 @@ solar_df = solar_df[[c for c in solar_cols if c in solar_df.columns]]
 wind_df = wind_df[[c for c in wind_cols if c in wind_df.columns]]
 
 # -----------------------------------------------------------
-# 6️⃣  MERGE SOLAR + WIND
-# -----------------------------------------------------------
-merged = solar_df.merge(wind_df, on=["City","Year","Month"], how="left")
-
-# -----------------------------------------------------------
-# 7️⃣  MERGE WITH OTHER DATASETS
+# 6️⃣  MERGE SOLAR + WIND AND OTHER DATASETS
 # -----------------------------------------------------------
-merged = merged.merge(sunshine, on=["City","Year","Month"], how="left")
-merged = merged.merge(cloud, on=["City","Year","Month"], how="left")
-merged = merged.merge(population, on=["City","Year"], how="left")
-merged = merged.merge(energy, on=["City","Year"], how="left")
+# One keyed join for everything (see merge_engine.py); annual
+# population / energy values repeat for every month of their year
+merged = join_tables(solar_df, {"wind": wind_df, **secondary})
 
 # -----------------------------------------------------------
-# 8️⃣  ADD WIND POWER DENSITY (W/m²)
+# 7️⃣  ADD WIND POWER DENSITY (W/m²)
 # -----------------------------------------------------------
 AIR_DENSITY = 1.225
 if "WS10M" in merged.columns:
@@ -119,5 +107,5 @@ else:
     merged["Wind_Power_Density"] = np.nan
 
 # -----------------------------------------------------------
-# 9️⃣  SAVE FINAL MASTER DATASET
+# 8️⃣  SAVE FINAL MASTER DATASET
 # -------------
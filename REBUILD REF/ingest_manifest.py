@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+
+# ======================================================
+# INGEST MANIFEST
+# ======================================================
+# Remembers, for every input file a pipeline step has processed, its content
+# hash, mtime, size and the output it produced. A step can then skip inputs
+# that have not changed since the last run.
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """JSON manifest of processed inputs, stored next to the outputs."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._dirty = False
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+
+    @staticmethod
+    def _key(input_path):
+        return os.path.normcase(os.path.abspath(input_path))
+
+    def is_current(self, input_path, output_path):
+        """True if `input_path` is unchanged and its recorded output exists."""
+        entry = self.entries.get(self._key(input_path))
+
+        if entry is None or not os.path.exists(output_path):
+            return False
+        if entry["output"] != os.path.abspath(output_path):
+            return False
+
+        stat = os.stat(input_path)
+        if stat.st_mtime_ns == entry["mtime_ns"] and stat.st_size == entry["size"]:
+            return True
+
+        # mtime/size moved (copy, touch, re-download) -> fall back to the hash
+        if file_sha256(input_path) != entry["sha256"]:
+            return False
+
+        entry["mtime_ns"] = stat.st_mtime_ns
+        entry["size"] = stat.st_size
+        self._dirty = True
+        return True
+
+    def record(self, input_path, output_path):
+        stat = os.stat(input_path)
+        self.entries[self._key(input_path)] = {
+            "sha256": file_sha256(input_path),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "output": os.path.abspath(output_path),
+        }
+        self._dirty = True
+
+    def forget_missing(self):
+        """Drop entries whose input file no longer exists.
+
+        Returns the outputs those inputs had produced, so the caller can
+        rebuild or remove them.
+        """
+        missing = {k: v["output"] for k, v in self.entries.items() if not os.path.exists(k)}
+        for key in missing:
+            del self.entries[key]
+        self._dirty = self._dirty or bool(missing)
+        return set(missing.values())
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        # Write-then-rename so an interrupted run never leaves half a manifest
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
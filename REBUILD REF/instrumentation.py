@@ -0,0 +1,259 @@
+import atexit
+import cProfile
+import functools
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# ======================================================
+# STAGE INSTRUMENTATION
+# ======================================================
+# Wrap each STEP of a pipeline script:
+#
+#   with stage("STEP 2: PIVOT", df_in=df) as s:
+#       ...
+#       s.output(pivot_df)
+#
+# or decorate a function with @timed(). Every stage records wall time,
+# rows in/out, DataFrame memory in/out and the process peak RSS. Each record
+# is appended to a JSON lines file as soon as the stage ends, and a summary
+# table is printed when the script exits. Records carry their nesting depth;
+# the summary indents nested stages and takes "%" of the outermost ones only,
+# whose time already includes everything nested inside them.
+#
+# Environment variables:
+#   RENEWLYTICS_METRICS      JSON lines path (default logs/pipeline_metrics.jsonl)
+#   RENEWLYTICS_PROFILE      "cprofile" -> cProfile each stage, save .prof files
+#                            "sample"   -> sample the stage thread's stack every
+#                                          few ms, save collapsed stacks
+#   RENEWLYTICS_PROFILE_DIR  where profiles go (default logs/profiles)
+#
+# Only the outermost stage of each thread is profiled; stages opened inside
+# it (a script's STEPs under the pipeline runner's stage) are part of its
+# profile. cProfile can only run once per process, so while one thread is
+# profiling, stages started on other threads are timed but not profiled.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+METRICS_PATH = os.environ.get(
+    "RENEWLYTICS_METRICS", os.path.join(BASE_DIR, "logs", "pipeline_metrics.jsonl")
+)
+PROFILE_MODE = os.environ.get("RENEWLYTICS_PROFILE", "").strip().lower()
+PROFILE_DIR = os.environ.get(
+    "RENEWLYTICS_PROFILE_DIR", os.path.join(BASE_DIR, "logs", "profiles")
+)
+
+SAMPLE_INTERVAL = 0.005
+
+RUN_ID = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "interactive"))[0]
+
+_records = []                       # (start order, payload)
+_start_order = itertools.count()
+_summary_registered = False
+
+_local = threading.local()          # .depth = open stages on this thread
+_cprofile_lock = threading.Lock()   # held by the one thread running cProfile
+
+
+def peak_rss_mb():
+    """Process high-water-mark RSS in MB, or None if the OS won't say."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2**20, 1)
+    except ImportError:
+        return None
+
+
+def frame_mb(df):
+    if df is None or not hasattr(df, "memory_usage"):
+        return None
+    usage = df.memory_usage(deep=True)
+    total = usage.sum() if hasattr(usage, "sum") else usage
+    return round(float(total) / 2**20, 3)
+
+
+def _rows(df):
+    return None if df is None else len(df)
+
+
+class StageRecord:
+
+    def __init__(self, name, df_in=None, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in if rows_in is not None else _rows(df_in)
+        self.mem_in_mb = frame_mb(df_in)
+        self.rows_out = None
+        self.mem_out_mb = None
+        self.extra = {}
+
+    def output(self, df=None, rows=None, **extra):
+        """Record what the stage produced."""
+        self.rows_out = rows if rows is not None else _rows(df)
+        self.mem_out_mb = frame_mb(df)
+        self.extra.update(extra)
+
+
+class _StackSampler(threading.Thread):
+    """Collects a thread's call stack every SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, target_id):
+        super().__init__(daemon=True)
+        self.target_id = target_id
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.target_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _profile_path(name, suffix):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe = "".join(c if c.isalnum() else "_" for c in name).strip("_")
+    return os.path.join(PROFILE_DIR, f"{RUN_ID}_{SCRIPT}_{safe}{suffix}")
+
+
+def _emit(payload):
+    os.makedirs(os.path.dirname(METRICS_PATH) or ".", exist_ok=True)
+    with open(METRICS_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(payload, default=str) + "\n")
+
+
+@contextmanager
+def stage(name, df_in=None, rows_in=None):
+    global _summary_registered
+    if not _summary_registered:
+        atexit.register(print_summary)
+        _summary_registered = True
+
+    record = StageRecord(name, df_in, rows_in)
+    order = next(_start_order)
+
+    # Nested stages run inside the outer stage's profile
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+
+    profiler = sampler = None
+    if depth == 0 and PROFILE_MODE == "cprofile" and _cprofile_lock.acquire(blocking=False):
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif depth == 0 and PROFILE_MODE == "sample":
+        sampler = _StackSampler(threading.get_ident())
+        sampler.start()
+
+    status = "ok"
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - t0
+        _local.depth = depth
+
+        profile_file = None
+        if profiler is not None:
+            profiler.disable()
+            _cprofile_lock.release()
+            profile_file = _profile_path(name, ".prof")
+            profiler.dump_stats(profile_file)
+        elif sampler is not None:
+            sampler.stop()
+            profile_file = _profile_path(name, ".folded")
+            with open(profile_file, "w", encoding="utf-8") as f:
+                for stack, count in sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        payload = {
+            "run_id": RUN_ID,
+            "script": SCRIPT,
+            "stage": name,
+            "depth": depth,
+            "status": status,
+            "seconds": round(seconds, 4),
+            "rows_in": record.rows_in,
+            "rows_out": record.rows_out,
+            "mem_in_mb": record.mem_in_mb,
+            "mem_out_mb": record.mem_out_mb,
+            "peak_rss_mb": peak_rss_mb(),
+            "profile": profile_file,
+            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **record.extra,
+        }
+        _records.append((order, payload))
+        _emit(payload)
+
+
+def timed(name=None):
+    """Decorator form of stage(); the function's return value is recorded as output."""
+    def decorator(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(label) as s:
+                result = func(*args, **kwargs)
+                if hasattr(result, "memory_usage"):
+                    s.output(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def print_summary():
+    if not _records:
+        return
+
+    # Start order puts nested stages under their outer stage, whose seconds
+    # already include them
+    records = [payload for _, payload in sorted(_records, key=lambda item: item[0])]
+    total = sum(r["seconds"] for r in records if r["depth"] == 0) or 1.0
+    labels = ["  " * r["depth"] + r["stage"] for r in records]
+    width = max(len(label) for label in labels)
+
+    print(f"\n⏱️ STAGE SUMMARY ({SCRIPT}, run {RUN_ID})")
+    print(f"{'stage':<{width}}  {'sec':>8}  {'%':>5}  {'rows in':>10}  {'rows out':>10}  {'peak MB':>8}")
+    for label, r in zip(labels, records):
+        print(
+            f"{label:<{width}}  {r['seconds']:>8.3f}  {100 * r['seconds'] / total:>5.1f}  "
+            f"{r['rows_in'] if r['rows_in'] is not None else '-':>10}  "
+            f"{r['rows_out'] if r['rows_out'] is not None else '-':>10}  "
+            f"{r['peak_rss_mb'] if r['peak_rss_mb'] is not None else '-':>8}"
+        )
+    print(f"📄 Metrics: {METRICS_PATH}")
+
+    if PROFILE_MODE == "cprofile":
+        slowest = max(records, key=lambda r: r["seconds"])
+        if slowest["profile"]:
+            print(f"\n🔬 Top functions in slowest stage: {slowest['stage']}")
+            pstats.Stats(slowest["profile"]).sort_stats("cumulative").print_stats(10)
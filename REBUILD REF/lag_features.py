@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ======================================================
+# LAG / ROLLING FEATURE ENGINE
+# ======================================================
+# Features are declared as a list of (kind, size) pairs, e.g.
+#
+#   LAG_FEATURES = [
+#       ("lag", 1),             -> ENERGY_LAG_1        value 1 step back
+#       ("lag", 12),            -> ENERGY_LAG_12       value 12 steps back
+#       ("rolling_mean", 3),    -> ENERGY_ROLL_MEAN_3  mean of the previous 3
+#       ("rolling_std", 12),    -> ENERGY_ROLL_STD_12  std of the previous 12
+#       ("seasonal_diff", 12),  -> ENERGY_SDIFF_12     LAG_1 - LAG_13
+#   ]
+#
+# Everything only looks at past values (nothing uses the current row), so the
+# same features are available when forecasting: the recursive forecaster
+# (forecasting.py) keeps each city's last max_lookback() values and rebuilds
+# every spec from them with next_lag_row() after each predicted month.
+#
+# The frame is sorted by (city, date) once, then every feature is computed on
+# the flat value array in a single vectorised pass; rows too close to the
+# start of their city get NaN, exactly like groupby().shift()/rolling().
+# extend_lag_features() fills only newly arrived months from each city's tail.
+
+FEATURE_KINDS = ("lag", "rolling_mean", "rolling_std", "seasonal_diff")
+
+SUFFIXES = {
+    "lag": "LAG",
+    "rolling_mean": "ROLL_MEAN",
+    "rolling_std": "ROLL_STD",
+    "seasonal_diff": "SDIFF",
+}
+
+
+def feature_name(kind, size, prefix="ENERGY"):
+    return f"{prefix}_{SUFFIXES[kind]}_{size}"
+
+
+def feature_names(specs, prefix="ENERGY"):
+    return [feature_name(kind, size, prefix) for kind, size in specs]
+
+
+def lag_specs(names, prefix="ENERGY"):
+    """The (kind, size) specs behind the lag feature columns among `names`."""
+    kinds = {f"{prefix}_{suffix}_": kind for kind, suffix in SUFFIXES.items()}
+    specs = []
+    for name in names:
+        for start, kind in kinds.items():
+            size = name[len(start):] if name.startswith(start) else ""
+            if size.isdigit():
+                specs.append((kind, int(size)))
+    return specs
+
+
+def max_lookback(specs):
+    """How many past rows per city the specs need to fill one new row."""
+    lookback = 0
+    for kind, size in specs:
+        if kind not in FEATURE_KINDS:
+            raise ValueError(f"Unknown lag feature kind: {kind!r}")
+        lookback = max(lookback, size + 1 if kind == "seasonal_diff" else size)
+    return lookback
+
+
+def _shift(values, k):
+    out = np.full(len(values), np.nan)
+    if k < len(values):
+        out[k:] = values[:len(values) - k]
+    return out
+
+
+def _rolling(values, window, how):
+    # Window ending at i-1, i.e. the `window` values before row i
+    out = np.full(len(values), np.nan)
+    if window < len(values):
+        windows = sliding_window_view(values[:-1], window)
+        if how == "mean":
+            out[window:] = windows.mean(axis=1)
+        else:
+            out[window:] = windows.std(axis=1, ddof=1)
+    return out
+
+
+def compute_lag_matrix(values, position, specs, prefix="ENERGY"):
+    """Feature arrays for a flat, group-contiguous value array.
+
+    `position` is each row's index within its own group; rows whose lookback
+    would cross into the previous group are set to NaN.
+    """
+    features = {}
+    for kind, size in specs:
+        if kind == "lag":
+            out, need = _shift(values, size), size
+        elif kind == "rolling_mean":
+            out, need = _rolling(values, size, "mean"), size
+        elif kind == "rolling_std":
+            out, need = _rolling(values, size, "std"), size
+        elif kind == "seasonal_diff":
+            out, need = _shift(values, 1) - _shift(values, size + 1), size + 1
+        else:
+            raise ValueError(f"Unknown lag feature kind: {kind!r}")
+
+        out[position < need] = np.nan
+        features[feature_name(kind, size, prefix)] = out
+    return features
+
+
+def _group_positions(groups):
+    labels = np.asarray(groups)
+    n = len(labels)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    breaks = np.flatnonzero(labels[1:] != labels[:-1]) + 1
+    starts = np.concatenate(([0], breaks))
+    lengths = np.diff(np.concatenate((starts, [n])))
+    return np.arange(n) - np.repeat(starts, lengths)
+
+
+def add_lag_features(df, specs,
+                     group_col="CITY",
+                     date_col="DATE",
+                     value_col="ENERGY_GENERATED",
+                     prefix="ENERGY"):
+    """Return `df` sorted by (group, date) with the spec'd feature columns added."""
+    df = df.sort_values([group_col, date_col], kind="stable").reset_index(drop=True)
+
+    values = df[value_col].to_numpy(dtype=np.float64)
+    position = _group_positions(df[group_col].astype(str).to_numpy())
+
+    features = compute_lag_matrix(values, position, specs, prefix)
+    return pd.concat([df, pd.DataFrame(features, index=df.index)], axis=1)
+
+
+def next_lag_row(buffer, specs, prefix="ENERGY"):
+    """Features of the month after each row of `buffer`.
+
+    `buffer` is (..., lookback): every series' latest values, oldest first,
+    NaN where a series is shorter. Goes through compute_lag_matrix(), so the
+    forecast sees exactly the definitions the model was trained on.
+    """
+    lookback = buffer.shape[-1]
+    series = buffer.reshape(-1, lookback)
+    values = np.concatenate([series, np.full((len(series), 1), np.nan)], axis=1)
+    position = np.tile(np.arange(lookback + 1), len(series))
+
+    features = compute_lag_matrix(values.ravel(), position, specs, prefix)
+    return {
+        name: out.reshape(len(series), lookback + 1)[:, -1].reshape(buffer.shape[:-1])
+        for name, out in features.items()
+    }
+
+
+def extend_lag_features(history, new_rows, specs,
+                        group_col="CITY",
+                        date_col="DATE",
+                        value_col="ENERGY_GENERATED",
+                        prefix="ENERGY"):
+    """Features for `new_rows` only, using just the tail of `history`.
+
+    Only the last max_lookback(specs) rows per city are read from `history`,
+    so appending a month never recomputes the whole frame.
+    """
+    lookback = max_lookback(specs)
+    keys = [group_col, date_col, value_col]
+
+    tail = (
+        history.sort_values([group_col, date_col], kind="stable")
+        .groupby(group_col, sort=False, observed=True)
+        .tail(lookback)[keys]
+    )
+    tail = tail.assign(_NEW=False)
+    fresh = new_rows.assign(_NEW=True)
+
+    combined = pd.concat([tail, fresh], ignore_index=True)
+    combined[group_col] = combined[group_col].astype(str)
+
+    out = add_lag_features(combined, specs, group_col, date_col, value_col, prefix)
+    out = out[out["_NEW"]].drop(columns="_NEW").reset_index(drop=True)
+    return out
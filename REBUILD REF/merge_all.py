@@ -2,6 +2,9 @@ import pandas as pd
 import os
 import numpy as np
 
+from merge_engine import join_tables, load_secondary
+from nasa_power import read_power_long
+
 # =====================================================================
 # 1. SET YOUR DATA DIRECTORY
 # =====================================================================
@@ -13,27 +16,16 @@ cities = [
 ]
 
 # =====================================================================
-# 2. UNIVERSAL NASA CSV READER — ALWAYS WORKS
+# 2. NASA CSV READER (shared streaming parser in nasa_power.py)
 # =====================================================================
 def read_nasa_csv(path):
-    """Reads NASA POWER CSV and extracts Year/Month from DATE column."""
-    # Read file ignoring metadata rows
-    df = pd.read_csv(path, engine="python", on_bad_lines="skip", encoding="utf-8")
-    df.columns = [str(c).strip().upper() for c in df.columns]
-
-    # Detect a DATE column or fallback to first column
-    date_col = None
-    for c in df.columns:
-        if "DATE" in c or "TIME" in c:
-            date_col = c
-            break
-
-    # If no DATE column exists, assume first column is date-like
-    if date_col is None:
-        date_col = df.columns[0]
+    """Reads a NASA POWER matrix file into one row per month, one column per PARAM."""
+    df_long = read_power_long(path)
+    if df_long is None:
+        raise ValueError(f"NASA POWER header not found: {path}")
 
-    # Convert to datetime
-    df["DATE"] = pd.to_datetime(df[date_col], errors="coerce", infer_datetime_format=True)
+    df = df_long.pivot(index="DATE", columns="PARAM", values="VALUE").reset_index()
+    df.columns.name = None
 
     # Extract Year and Month
     df["Year"] = df["DATE"].dt.year
@@ -44,22 +36,8 @@ def read_nasa_csv(path):
 # =====================================================================
 # 3. LOAD STATIC CSV FILES
 # =====================================================================
-sunshine = pd.read_csv(f"{DATA_DIR}/sunshine_india_2015_2024.csv")
-cloud = pd.read_csv(f"{DATA_DIR}/cloudcover_india_2015_2024.csv")
-population = pd.read_csv(f"{DATA_DIR}/final_population_2015_2024.csv")
-energy = pd.read_csv(f"{DATA_DIR}/city_energy_2015_2024.csv")
-
-sunshine.columns = ["City","Year","Month","Sunshine_Hours"]
-cloud.columns = ["City","Year","Month","Cloud_Cover"]
-population.columns = ["City","Year","Population","Population_Density","Growth_Rate"]
-energy.columns = ["City","State","Year","Energy_Consumption_GWh","Per_Capita_kWh","Peak_Demand_MW"]
-
-# Convert types
-for df in [sunshine, cloud, population, energy]:
-    df["City"] = df["City"].astype(str)
-    df["Year"] = pd.to_numeric(df["Year"], errors="coerce").astype("Int64")
-    if "Month" in df.columns:
-        df["Month"] = pd.to_numeric(df["Month"], errors="coerce").astype("Int64")
+# Standard column names; keys are typed by the merge engine
+secondary = load_secondary(DATA_DIR)
 
 # =====================================================================
 # 4. READ ALL SOLAR + WIND FILES
@@ -115,11 +93,9 @@ wind_df = wind_df[[c for c in wind_cols if c in wind_df.columns]]
 # =====================================================================
 # 6. MERGE EVERYTHING
 # =====================================================================
-merged = solar_df.merge(wind_df, on=["City","Year","Month"], how="left")
-merged = merged.merge(sunshine, on=["City","Year","Month"], how="left")
-merged = merged.merge(cloud, on=["City","Year","Month"], how="left")
-merged = merged.merge(population, on=["City","Year"], how="left")
-merged = merged.merge(energy, on=["City","Year"], how="left")
+# One keyed join for wind and all secondary tables (see merge_engine.py);
+# annual population / energy values repeat for every month of their year
+merged = join_tables(solar_df, {"wind": wind_df, **secondary})
 
 # =====================================================================
 # 7. ADD WIND POWER DENSITY
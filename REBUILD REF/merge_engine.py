@@ -0,0 +1,152 @@
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+# ======================================================
+# SECONDARY DATA MERGE ENGINE
+# ======================================================
+# The NASA master is joined with several city tables (sunshine, cloud
+# cover, population, city energy). Instead of one pd.merge per table, each
+# building a new full-size frame, the base rows are encoded once into an
+# integer key:
+#
+#   month key = (city code * n_years + year offset) * 12 + month - 1
+#   year key  =  city code * n_years + year offset
+#
+# Every table is encoded the same way, checked to hold at most one row per
+# key, and matched with a single get_indexer on the integer keys. Annual
+# tables are matched on the year key, so each value is gathered straight
+# into its monthly row without expanding the table to months first. All
+# gathered columns are attached to the base in one concat.
+#
+#   merged = join_tables(base, {"cloud": cloud_df, "population": pop_df})
+#
+# City names are compared stripped, Year / Month as numbers, so "2015",
+# 2015 and 2015.0 all match. Rows with unusable keys never match.
+
+KEY_COLUMNS = ["City", "Year", "Month"]
+
+# name -> (file under data/, column names by position)
+SECONDARY_TABLES = {
+    "sunshine": ("sunshine_india_2015_2024.csv",
+                 ["City", "Year", "Month", "Sunshine_Hours"]),
+    "cloud": ("cloudcover_india_2015_2024.csv",
+              ["City", "Year", "Month", "Cloud_Cover"]),
+    "population": ("final_population_2015_2024.csv",
+                   ["City", "Year", "Population", "Population_Density", "Growth_Rate"]),
+    "energy": ("city_energy_2015_2024.csv",
+               ["City", "State", "Year", "Energy_Consumption_GWh", "Per_Capita_kWh",
+                "Peak_Demand_MW"]),
+}
+
+
+def load_secondary(data_dir, names=SECONDARY_TABLES):
+    """{name: frame} for the secondary tables that exist, with standard column names."""
+    tables = {}
+    for name in names:
+        filename, columns = SECONDARY_TABLES[name]
+        path = os.path.join(data_dir, filename)
+        if os.path.exists(path):
+            df = pd.read_csv(path)
+            df.columns = columns
+            tables[name] = df
+    return tables
+
+
+class KeyEncoder:
+    """Maps City / Year / Month to compact int64 keys over the base frame's range."""
+
+    def __init__(self, base):
+        self.cities = pd.Index(pd.unique(_clean(pd.unique(base["City"]))))
+        years = _number(base["Year"])
+        known = np.isfinite(years).any()
+        self.first_year = int(np.nanmin(years)) if known else 0
+        self.n_years = int(np.nanmax(years)) - self.first_year + 1 if known else 1
+
+    def encode(self, df, monthly=None):
+        """Month keys (default: if `df` has a Month column) or year keys; -1 where unusable."""
+        # Cities are cleaned and looked up once per distinct name, not per row
+        codes, names = pd.factorize(df["City"], use_na_sentinel=False)
+        code = self.cities.get_indexer(_clean(names))[codes]
+        year = _number(df["Year"]) - self.first_year
+
+        ok = (code >= 0) & (year >= 0) & (year < self.n_years) & (year == np.floor(year))
+        key = code * self.n_years + np.where(ok, year, 0).astype(np.int64)
+
+        if monthly is None:
+            monthly = "Month" in df.columns
+        if monthly:
+            month = _number(df["Month"])
+            ok &= (month >= 1) & (month <= 12) & (month == np.floor(month))
+            key = key * 12 + np.where(ok, month - 1, 0).astype(np.int64)
+
+        return np.where(ok, key, -1)
+
+
+def _clean(names):
+    return pd.Index(names).astype(str).str.strip().to_numpy(dtype=object)
+
+
+def _number(values):
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return pd.to_numeric(pd.Series(uniques), errors="coerce").to_numpy(dtype=np.float64)[codes]
+
+
+def join_tables(base, tables, encoder=None, verbose=True):
+    """Left join every table in {name: frame} onto `base` by City / Year (/ Month).
+
+    Raises ValueError if a table has more than one row for a key (the join
+    would duplicate base rows) or brings a column the result already has.
+    """
+    encoder = encoder or KeyEncoder(base)
+    base_keys = {}
+    gathered = []
+    columns = set(base.columns)
+
+    for name, table in tables.items():
+        monthly = "Month" in table.columns
+        keys = encoder.encode(table)
+        usable = keys >= 0
+
+        duplicated = pd.Series(keys[usable]).duplicated()
+        if duplicated.any():
+            raise ValueError(
+                f"❌ {name}: {int(duplicated.sum())} duplicate "
+                f"{'City/Year/Month' if monthly else 'City/Year'} rows, join would not be many-to-one"
+            )
+
+        value_columns = [c for c in table.columns if c not in KEY_COLUMNS]
+        clash = columns.intersection(value_columns)
+        if clash:
+            raise ValueError(f"❌ {name}: columns {sorted(clash)} already present")
+        columns.update(value_columns)
+
+        # Base keys are encoded once per granularity and shared by the tables
+        if monthly not in base_keys:
+            base_keys[monthly] = encoder.encode(base, monthly)
+        wanted = base_keys[monthly]
+
+        position = pd.Index(keys[usable]).get_indexer(wanted)
+        position[wanted < 0] = -1
+        rows = np.flatnonzero(usable)
+
+        # Missing rows become NaN, as in a left merge
+        source = np.full(len(wanted), -1, dtype=np.int64)
+        hit = position >= 0
+        source[hit] = rows[position[hit]]
+        gathered.append(pd.DataFrame(
+            {c: take(table[c].array, source, allow_fill=True) for c in value_columns},
+            index=base.index
+        ))
+
+        if verbose:
+            print(f"✅ Merged {name}: {int(hit.sum())}/{len(base)} rows matched")
+
+    if not gathered:
+        return base
+    return pd.concat([base] + gathered, axis=1)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+
+# ======================================================
+# MODEL ARTIFACT REGISTRY
+# ======================================================
+# Fitted models are stored under a key derived from the training data, the
+# feature list and the hyperparameters:
+#
+#   models/
+#       LATEST                  <- key of the most recently saved artifact
+#       3f9c0a1b2d4e5f60/
+#           model.joblib        <- fitted estimator (uncompressed)
+#           encoder.joblib      <- city LabelEncoder
+#           meta.json           <- features, params, classes, timestamp
+#
+# If nothing that affects the fit has changed, the trainer reuses the stored
+# forest instead of refitting, and other code (dashboard, refresh jobs) can
+# load the latest model lazily.
+#
+# Loading with mmap_mode only maps the large NumPy arrays joblib stores
+# directly (e.g. linear coefficients). A forest's node arrays are copied
+# into sklearn's own Tree buffers on unpickling, so each process that loads
+# a forest holds its own copy of the trees.
+
+# Settings that change speed/logging but not the fitted model
+NON_FIT_PARAMS = {"n_jobs", "verbose"}
+
+
+def training_key(X, y, params, features):
+    """Stable short hash of training data + features + fit hyperparameters."""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(X[features], index=False).values.tobytes())
+    digest.update(pd.util.hash_pandas_object(y, index=False).values.tobytes())
+
+    fit_params = {k: v for k, v in params.items() if k not in NON_FIT_PARAMS}
+    digest.update(json.dumps({"params": fit_params, "features": list(features)},
+                             sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+class ModelArtifact:
+    """A stored model; the estimator and encoder are only loaded when used."""
+
+    def __init__(self, folder, mmap=True):
+        self.folder = folder
+        self.key = os.path.basename(folder)
+        self._mmap = mmap
+        self._model = None
+        self._encoder = None
+
+        with open(os.path.join(folder, "meta.json"), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+
+        self.features = self.metadata["features"]
+
+    @property
+    def model(self):
+        if self._model is None:
+            # Only top-level arrays are mapped; tree nodes are copied regardless
+            self._model = joblib.load(
+                os.path.join(self.folder, "model.joblib"),
+                mmap_mode="r" if self._mmap else None
+            )
+        return self._model
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            self._encoder = joblib.load(os.path.join(self.folder, "encoder.joblib"))
+        return self._encoder
+
+
+class ModelRegistry:
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def path(self, key):
+        return os.path.join(self.folder, key)
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self.path(key), "meta.json"))
+
+    def save(self, key, model, encoder, features, params=None, extra=None):
+        target = self.path(key)
+        tmp_target = target + ".tmp"
+        shutil.rmtree(tmp_target, ignore_errors=True)
+        os.makedirs(tmp_target)
+
+        # No compression, otherwise joblib cannot memory-map on load
+        joblib.dump(model, os.path.join(tmp_target, "model.joblib"))
+        joblib.dump(encoder, os.path.join(tmp_target, "encoder.joblib"))
+
+        meta = {
+            "key": key,
+            "features": list(features),
+            "params": params or {},
+            "classes": [str(c) for c in getattr(encoder, "classes_", [])],
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        meta.update(extra or {})
+        with open(os.path.join(tmp_target, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, default=str)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp_target, target)
+        self._set_latest(key)
+
+        # Hand back the in-memory objects rather than re-reading them
+        artifact = ModelArtifact(target)
+        artifact._model = model
+        artifact._encoder = encoder
+        return artifact
+
+    def load(self, key, mmap=True):
+        if not self.exists(key):
+            raise FileNotFoundError(f"No model artifact for key {key} in {self.folder}")
+        return ModelArtifact(self.path(key), mmap=mmap)
+
+    def _set_latest(self, key):
+        tmp_path = os.path.join(self.folder, "LATEST.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(key)
+        os.replace(tmp_path, os.path.join(self.folder, "LATEST"))
+
+    def latest(self, mmap=True):
+        """The most recently saved artifact, or None if the registry is empty."""
+        pointer = os.path.join(self.folder, "LATEST")
+        if not os.path.exists(pointer):
+            return None
+
+        with open(pointer, "r", encoding="utf-8") as f:
+            key = f.read().strip()
+        return self.load(key, mmap=mmap) if self.exists(key) else None
+
+    def get_or_train(self, key, train_fn, encoder, features, params=None, extra=None):
+        """Reuse the artifact for `key`, or call train_fn() and store the result.
+
+        Returns (artifact, reused).
+        """
+        if self.exists(key):
+            self._set_latest(key)
+            return self.load(key), True
+
+        model = train_fn()
+        return self.save(key, model, encoder, features, params, extra), False
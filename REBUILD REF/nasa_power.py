@@ -0,0 +1,100 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# ======================================================
+# NASA POWER "-BEGIN HEADER-" MATRIX READER
+# ======================================================
+# NASA POWER monthly exports look like:
+#
+#   -BEGIN HEADER-
+#   ... metadata ...
+#   -END HEADER-
+#   PARAMETER,YEAR,JAN,FEB,...,DEC,ANN
+#   ALLSKY_SFC_SW_DIFF,2015,1.6099,1.7148,...,2.1278
+#
+# The file is read once, line by line: the metadata block is skipped until
+# the PARAM/YEAR/JAN header, then each matrix row is tokenized straight into
+# NumPy arrays. The long DATE / PARAM / VALUE frame is built from those
+# arrays directly, with no wide DataFrame or melt in between.
+
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+          "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+_SPLIT = re.compile(r"\s+|,")
+
+
+def _is_matrix_header(line):
+    cleaned = line.strip().upper()
+    return cleaned.startswith("PARAM") and "YEAR" in cleaned and "JAN" in cleaned
+
+
+def iter_matrix_rows(lines):
+    """Yield (param, year, [12 month strings]) for every data row.
+
+    `lines` is any iterable of text lines (an open file works). Nothing is
+    yielded if the PARAM/YEAR/JAN header never appears.
+    """
+    lines = iter(lines)
+
+    for line in lines:
+        if _is_matrix_header(line):
+            break
+    else:
+        return
+
+    for line in lines:
+        tokens = [t for t in _SPLIT.split(line.strip()) if t]
+        if len(tokens) < 14:
+            continue
+
+        # Same rule as before: rows whose YEAR is not numeric are dropped
+        try:
+            year = int(float(tokens[1]))
+        except ValueError:
+            continue
+
+        yield tokens[0], year, tokens[2:14]
+
+
+def read_power_long(path):
+    """Read a NASA POWER matrix file as a DATE, PARAM, VALUE frame.
+
+    Rows come out sorted by DATE exactly like the old melt-based converter.
+    Returns None when the file has no PARAM/YEAR/JAN header.
+    """
+    params = []
+    years = []
+    values = []
+
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for param, year, months in iter_matrix_rows(f):
+            params.append(param)
+            years.append(year)
+            values.extend(months)
+
+    if not params:
+        return None
+
+    n_rows = len(params)
+    matrix = np.array(values, dtype=np.float64).reshape(n_rows, 12)
+    years = np.array(years, dtype=np.int64)
+
+    # Month-major order (all rows for JAN, then FEB, ...), matching melt
+    month_index = (years - 1970) * 12
+    dates = (month_index[None, :] + np.arange(12)[:, None]).ravel()
+
+    long_df = pd.DataFrame({
+        "DATE": dates.astype("datetime64[M]").astype("datetime64[ns]"),
+        "PARAM": np.tile(np.array(params, dtype=object), 12),
+        "VALUE": matrix.T.ravel(),
+    })
+
+    return long_df.sort_values("DATE").reset_index(drop=True)
+
+
+def read_power_params(path):
+    """Sorted PARAM names of a NASA POWER matrix file; values are not converted."""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return sorted({param for param, _, _ in iter_matrix_rows(f)})
@@ -1,87 +1,156 @@
+import argparse
+import contextlib
 import pandas as pd
 import os
 
-# ======================================================
-# STEP 1: ABSOLUTE PATHS (FIXES FILE ERRORS)
-# ======================================================
-HISTORICAL_PATH = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\master\india_renewable_energy_analytics_master.csv"
-FORECAST_PATH = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\renewable_energy_forecast_till_2034.csv"
-
-# ======================================================
-# STEP 2: LOAD DATA
-# ======================================================
-historical_df = pd.read_csv(HISTORICAL_PATH)
-forecast_df = pd.read_csv(FORECAST_PATH)
-
-print("✅ Datasets loaded")
-
-# ======================================================
-# STEP 3: STANDARDIZE COMMON IDENTIFIERS
-# ======================================================
-historical_df.rename(columns={
-    "date": "DATE",
-    "city": "CITY"
-}, inplace=True)
-
-forecast_df.rename(columns={
-    "DATE": "DATE",
-    "CITY": "CITY"
-}, inplace=True)
-
-historical_df["DATE"] = pd.to_datetime(historical_df["DATE"])
-forecast_df["DATE"] = pd.to_datetime(forecast_df["DATE"])
-
-# ======================================================
-# STEP 4: ADD DATA TYPE FLAG
-# ======================================================
-historical_df["DATA_TYPE"] = "Actual"
-forecast_df["DATA_TYPE"] = "Forecast"
+from instrumentation import stage
+from paths import ANALYTICS_MASTER_PATH, FORECAST_PATH, FULL_DATASET_PATH
+from storage import DatasetWriter, list_cities, read_dataset, write_dataset
 
 # ======================================================
-# STEP 5: ALIGN COLUMNS WITHOUT DROPPING ANY
-# ======================================================
-# Union of all columns
-all_columns = sorted(
-    set(historical_df.columns).union(set(forecast_df.columns))
-)
-
-historical_df = historical_df.reindex(columns=all_columns)
-forecast_df = forecast_df.reindex(columns=all_columns)
-
-# ======================================================
-# STEP 6: COMBINE DATASETS
-# ======================================================
-combined_df = pd.concat(
-    [historical_df, forecast_df],
-    ignore_index=True
-)
-
-combined_df = combined_df.sort_values(
-    ["CITY", "DATE"]
-).reset_index(drop=True)
-
-# ======================================================
-# STEP 7: SAVE FINAL STREAMLIT DATASET
-# ======================================================
-OUTPUT_PATH = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\renewable_energy_full_actual_and_forecast.csv"
-
-combined_df.to_csv(OUTPUT_PATH, index=False)
-
-print("\n✅ Full combined dataset created")
-print(f"📁 Saved at: {OUTPUT_PATH}")
-
-# ======================================================
-# STEP 8: SANITY CHECK
+# STEP 1: ABSOLUTE PATHS (FIXES FILE ERRORS)
 # ======================================================
-print("\n📊 Columns retained:")
-print(list(combined_df.columns))
-
-print("\n📅 Year range:")
-print(
-    combined_df["DATE"].dt.year.min(),
-    "→",
-    combined_df["DATE"].dt.year.max()
-)
-
-print("\n📈 Data type distribution:")
-print(combined_df["DATA_TYPE"].value_counts())
+HISTORICAL_PATH = ANALYTICS_MASTER_PATH
+OUTPUT_PATH = FULL_DATASET_PATH
+
+# Combine and append one city at a time instead of loading both datasets
+# (see run_streaming); peak memory is one city's actual + forecast rows
+STREAMING = False
+
+
+def combine_actual_and_forecast(historical_df, forecast_df, track=True):
+
+    # ======================================================
+    # STEP 3: STANDARDIZE COMMON IDENTIFIERS
+    # ======================================================
+    historical_df = historical_df.rename(columns={
+        "date": "DATE",
+        "city": "CITY"
+    })
+
+    forecast_df = forecast_df.rename(columns={
+        "DATE": "DATE",
+        "CITY": "CITY"
+    })
+
+    # ======================================================
+    # STEP 4: ADD DATA TYPE FLAG
+    # ======================================================
+    historical_df["DATA_TYPE"] = "Actual"
+    forecast_df["DATA_TYPE"] = "Forecast"
+
+    # ======================================================
+    # STEP 5: ALIGN COLUMNS WITHOUT DROPPING ANY
+    # ======================================================
+    # Union of all columns
+    all_columns = sorted(
+        set(historical_df.columns).union(set(forecast_df.columns))
+    )
+
+    historical_df = historical_df.reindex(columns=all_columns)
+    forecast_df = forecast_df.reindex(columns=all_columns)
+
+    # ======================================================
+    # STEP 6: COMBINE DATASETS
+    # ======================================================
+    # Per-city calls from run_streaming are timed as one stage instead
+    tracker = stage("STEP 6: COMBINE DATASETS", rows_in=len(historical_df) + len(forecast_df)) \
+        if track else contextlib.nullcontext()
+
+    with tracker as s:
+        combined_df = pd.concat(
+            [historical_df, forecast_df],
+            ignore_index=True
+        )
+
+        combined_df = combined_df.sort_values(
+            ["CITY", "DATE"]
+        ).reset_index(drop=True)
+        if s is not None:
+            s.output(combined_df)
+
+    return combined_df
+
+
+def run_streaming():
+    """Same dataset as run(), combined and appended one city at a time.
+
+    The output is sorted by city then date, so each city can be combined
+    and sorted on its own and appended in city order; no global sort is
+    needed. Both inputs are read per city from their Parquet copies.
+    Returns None; the combined dataset is never held in memory as a whole.
+    """
+    cities = sorted(set(list_cities(HISTORICAL_PATH)) | set(list_cities(FORECAST_PATH)))
+
+    with stage("STEP 2-7: COMBINE + SAVE PER CITY") as s:
+        with DatasetWriter(OUTPUT_PATH) as writer:
+            for city in cities:
+                writer.append(combine_actual_and_forecast(
+                    read_dataset(HISTORICAL_PATH, cities=[city]),
+                    read_dataset(FORECAST_PATH, cities=[city]),
+                    track=False
+                ))
+        s.output(rows=writer.rows, cities=len(cities))
+
+    print("\n✅ Full combined dataset created (streaming)")
+    print(f"📁 Saved at: {OUTPUT_PATH}")
+    print(f"Rows: {writer.rows}")
+    return None
+
+
+def run(historical_df=None, forecast_df=None, streaming=STREAMING):
+    """Build the Streamlit dataset; frames already in memory skip the read."""
+    if streaming and historical_df is None and forecast_df is None:
+        return run_streaming()
+
+    # ======================================================
+    # STEP 2: LOAD DATA
+    # ======================================================
+    with stage("STEP 2: LOAD DATA") as s:
+        if historical_df is None:
+            historical_df = read_dataset(HISTORICAL_PATH)
+        if forecast_df is None:
+            forecast_df = read_dataset(FORECAST_PATH)
+        s.output(rows=len(historical_df) + len(forecast_df))
+
+    print("✅ Datasets loaded")
+
+    combined_df = combine_actual_and_forecast(historical_df, forecast_df)
+
+    # ======================================================
+    # STEP 7: SAVE FINAL STREAMLIT DATASET
+    # ======================================================
+    with stage("STEP 7: SAVE FINAL STREAMLIT DATASET", df_in=combined_df):
+        write_dataset(combined_df, OUTPUT_PATH)
+
+    print("\n✅ Full combined dataset created")
+    print(f"📁 Saved at: {OUTPUT_PATH}")
+
+    # ======================================================
+    # STEP 8: SANITY CHECK
+    # ======================================================
+    print("\n📊 Columns retained:")
+    print(list(combined_df.columns))
+
+    print("\n📅 Year range:")
+    print(
+        combined_df["DATE"].dt.year.min(),
+        "→",
+        combined_df["DATE"].dt.year.max()
+    )
+
+    print("\n📈 Data type distribution:")
+    print(combined_df["DATA_TYPE"].value_counts())
+
+    return combined_df
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Combine actual and forecast data for the dashboard.")
+    parser.add_argument("--streaming", action="store_true", default=STREAMING,
+                        help="combine and append one city at a time")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(streaming=parse_args().streaming)
@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# ======================================================
+# ORDERED PROCESS-POOL MAP
+# ======================================================
+# Shared by the ingest scripts. Results always come back in input order, so
+# anything concatenated from them is identical to a sequential run.
+#
+# Scripts that use this must keep their top-level work under
+# `if __name__ == "__main__":` (worker processes re-import the module on
+# Windows).
+
+
+def resolve_workers(workers):
+    """1 = sequential, N > 1 = N processes, 0 or None = one per CPU core."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def ordered_map(func, *iterables, workers=1):
+    """Like map(func, ...), fanned out over `workers` processes."""
+    args = list(zip(*iterables))
+    workers = min(resolve_workers(workers), len(args))
+
+    if workers <= 1:
+        return [func(*a) for a in args]
+
+    # Small chunks keep all workers busy without per-task round trips
+    chunksize = max(1, len(args) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*args), chunksize=chunksize))
@@ -0,0 +1,34 @@
+import os
+
+# ======================================================
+# PROJECT PATHS
+# ======================================================
+# Every pipeline script resolves its folders from here instead of a
+# hard-coded desktop path. The project root is the folder this file lives
+# in; set RENEWLYTICS_HOME to run the pipeline against another copy.
+
+BASE_DIR = os.environ.get("RENEWLYTICS_HOME", os.path.dirname(os.path.abspath(__file__)))
+
+DATA_DIR = os.path.join(BASE_DIR, "data")
+CLEANED_DIR = os.path.join(BASE_DIR, "cleaned")
+FEATURE_DIR = os.path.join(BASE_DIR, "features")
+MASTER_DIR = os.path.join(BASE_DIR, "master")
+MODEL_DIR = os.path.join(BASE_DIR, "models")
+LOG_DIR = os.path.join(BASE_DIR, "logs")
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+
+# Datasets shared between scripts
+ANALYTICS_MASTER_PATH = os.path.join(MASTER_DIR, "india_renewable_energy_analytics_master.csv")
+FEATURE_MASTER_PATH = os.path.join(MASTER_DIR, "india_renewable_master.csv")
+FORECAST_PATH = os.path.join(MASTER_DIR, "renewable_energy_forecast_till_2034.csv")
+FULL_DATASET_PATH = os.path.join(BASE_DIR, "renewable_energy_full_actual_and_forecast.csv")
+NASA_MASTER_PATH = os.path.join(BASE_DIR, "Master_Dataset_Final.csv")
+
+# Best forest settings found by tune_model.py, read by the trainer
+MODEL_CONFIG_PATH = os.path.join(BASE_DIR, "model_config.json")
+TUNING_RESULTS_PATH = os.path.join(MASTER_DIR, "tuning_results.csv")
+
+# Walk-forward backtest results (backtest.py), read by the dashboard
+BACKTEST_PREDICTIONS_PATH = os.path.join(MASTER_DIR, "backtest_predictions.csv")
+BACKTEST_CITY_PATH = os.path.join(MASTER_DIR, "backtest_metrics_by_city.csv")
+BACKTEST_HORIZON_PATH = os.path.join(MASTER_DIR, "backtest_metrics_by_horizon.csv")
@@ -0,0 +1,479 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import backtest
+import build_features_and_master
+import convert_nasa_matrix_to_clean
+import correlation_cube
+import final_merge
+import newdataset
+import train_random_forest_model
+from ingest_manifest import file_sha256
+from instrumentation import stage
+from paths import (ANALYTICS_MASTER_PATH, BACKTEST_CITY_PATH, BACKTEST_HORIZON_PATH,
+                   BACKTEST_PREDICTIONS_PATH, BASE_DIR, CLEANED_DIR, DATA_DIR, FEATURE_DIR,
+                   FEATURE_MASTER_PATH, FORECAST_PATH, FULL_DATASET_PATH, LOG_DIR,
+                   MODEL_CONFIG_PATH, NASA_MASTER_PATH)
+from storage import read_dataset
+
+# ======================================================
+# PIPELINE RUNNER
+# ======================================================
+# The scripts below used to be run by hand, in the right order. Here they
+# are declared as a dependency graph:
+#
+#   analytics_master ──┬──> train ──> combine
+#                      ├──────────────────^
+#                      ├──> backtest
+#                      └──> correlation_cube
+#   clean ──> features
+#   nasa_master
+#
+# Every stage lists its input files (data and the code that processes it)
+# and its outputs. A stage's fingerprint is the hash of its inputs plus the
+# fingerprints of the stages it depends on; if that matches the last
+# successful run and the outputs still exist, the stage is skipped.
+#
+# Stages whose dependencies are done run at the same time (threads, so
+# results stay in memory). A stage's return value is handed straight to the
+# stages that depend on it instead of being re-read from disk; a skipped
+# stage is only loaded from its outputs if something downstream runs.
+#
+#   python pipeline.py                 run whatever is out of date
+#   python pipeline.py combine         just `combine` and what it needs
+#   python pipeline.py --dry-run       show what would run
+#   python pipeline.py --force         rerun everything
+#
+# merge_all.py and "import pdfplumber.py" build the same NASA + secondary
+# merge as final_merge.py and are not part of the graph; csvconvert.py needs
+# the population raster, which lives outside the project.
+
+STATE_PATH = os.path.join(LOG_DIR, "pipeline_state.json")
+
+# Stages running at the same time
+WORKERS = 4
+
+
+class Stage:
+
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), load=None):
+        self.name = name
+        self.run = run            # run(upstream) -> value, upstream = {dep name: value}
+        self.deps = list(deps)
+        self.inputs = list(inputs)    # files or glob patterns
+        self.outputs = list(outputs)  # files or folders that must exist to skip
+        self.load = load          # load() -> value, used when skipped but needed
+
+    def outputs_exist(self):
+        return all(os.path.exists(path) for path in self.outputs)
+
+
+# ======================================================
+# FINGERPRINTS
+# ======================================================
+def expand_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            files.extend(sorted(glob.glob(pattern)))
+        else:
+            files.append(pattern)
+    return files
+
+
+def _relative(path):
+    return os.path.relpath(path, BASE_DIR).replace(os.sep, "/")
+
+
+class FileHashes:
+    """Content hashes that are only recomputed when mtime or size moved."""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        if not os.path.exists(path):
+            return "missing"
+
+        key = os.path.normcase(os.path.abspath(path))
+        stat = os.stat(path)
+
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["sha256"]
+
+        sha = file_sha256(path)
+        with self._lock:
+            self.entries[key] = {"sha256": sha, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        return sha
+
+
+def stage_fingerprint(stage_, hashes, dep_fingerprints):
+    payload = {
+        "stage": stage_.name,
+        "inputs": [[_relative(p), hashes.digest(p)] for p in expand_inputs(stage_.inputs)],
+        "deps": {d: dep_fingerprints[d] for d in stage_.deps},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# ======================================================
+# GRAPH EXECUTION
+# ======================================================
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` (created if missing) across processes."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    # LK_LOCK retries for about 10 s before raising
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class Pipeline:
+
+    def __init__(self, stages, state_path=STATE_PATH):
+        self.stages = {s.name: s for s in stages}
+        self.state_path = state_path
+
+        for s in stages:
+            for dep in s.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {s.name!r} depends on unknown stage {dep!r}")
+        self.order = self._topological_order()
+
+        self.state = {"files": {}, "stages": {}}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.hashes = FileHashes(self.state.get("files"))
+        self._state_lock = threading.Lock()
+        self._ran = set()   # stages recorded by this process
+
+    def _topological_order(self):
+        order, visiting, done = [], set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage {name!r}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def select(self, targets=None):
+        """Stage names needed for `targets` (all stages if None), in run order."""
+        if not targets:
+            return list(self.order)
+
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name!r}; choose from {', '.join(self.order)}")
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].deps)
+        return [n for n in self.order if n in needed]
+
+    def plan(self, targets=None, force=False):
+        """[(name, fingerprint, skip)] in run order."""
+        fingerprints, plan = {}, []
+        recorded = self.state.get("stages", {})
+
+        for name in self.select(targets):
+            s = self.stages[name]
+            fp = stage_fingerprint(s, self.hashes, fingerprints)
+            fingerprints[name] = fp
+
+            last = recorded.get(name, {}).get("fingerprint")
+            skip = not force and last == fp and s.outputs_exist()
+            plan.append((name, fp, skip))
+        return plan
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with file_lock(self.state_path + ".lock"):
+            self._merge_and_write_state()
+
+    def _merge_and_write_state(self):
+        # Another process (forecast_jobs.py worker) may have recorded other
+        # stages since this run started; keep those entries. The file lock
+        # keeps two processes from merging at the same time
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                on_disk = json.load(f)
+            stages = on_disk.get("stages", {})
+            stages.update({n: e for n, e in self.state.get("stages", {}).items() if n in self._ran})
+            self.state["stages"] = stages
+            for path, entry in on_disk.get("files", {}).items():
+                self.hashes.entries.setdefault(path, entry)
+
+        self.state["files"] = self.hashes.entries
+
+        # Write-then-rename so an interrupted run never leaves half a file
+        tmp_path = f"{self.state_path}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def _record(self, name, fingerprint, seconds):
+        with self._state_lock:
+            self._ran.add(name)
+            self.state.setdefault("stages", {})[name] = {
+                "fingerprint": fingerprint,
+                "seconds": round(seconds, 3),
+                "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            self._save_state()
+
+    def run(self, targets=None, force=False, workers=WORKERS):
+        plan = self.plan(targets, force)
+        fingerprints = {name: fp for name, fp, _ in plan}
+        to_run = {name for name, _, skip in plan if not skip}
+        selected = [name for name, _, _ in plan]
+
+        # How many running stages still need each stage's value
+        consumers = {name: 0 for name in selected}
+        for name in to_run:
+            for dep in self.stages[name].deps:
+                consumers[dep] += 1
+
+        values, value_locks = {}, {name: threading.Lock() for name in selected}
+        status, seconds = {}, {}
+
+        def value_of(name):
+            # Skipped stages are only read back from disk when needed
+            with value_locks[name]:
+                if name not in values:
+                    loader = self.stages[name].load
+                    values[name] = loader() if loader else None
+                return values[name]
+
+        def release(name):
+            with value_locks[name]:
+                consumers[name] -= 1
+                if consumers[name] <= 0:
+                    values.pop(name, None)
+
+        def execute(name):
+            s = self.stages[name]
+            upstream = {dep: value_of(dep) for dep in s.deps}
+            t0 = time.perf_counter()
+            with stage(f"PIPELINE: {name}"):
+                result = s.run(upstream)
+            elapsed = time.perf_counter() - t0
+
+            with value_locks[name]:
+                if consumers[name] > 0:
+                    values[name] = result
+            for dep in s.deps:
+                release(dep)
+            self._record(name, fingerprints[name], elapsed)
+            return elapsed
+
+        for name in selected:
+            if name not in to_run:
+                status[name] = "skipped"
+                print(f"⏭️ Unchanged: {name}")
+
+        pending = [n for n in selected if n in to_run]
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.stages[name].deps
+                    if any(status.get(d) in ("failed", "blocked") for d in deps):
+                        status[name] = "blocked"
+                        pending.remove(name)
+                        print(f"⛔ Blocked (upstream failed): {name}")
+                    elif all(status.get(d) in ("done", "skipped") for d in deps):
+                        print(f"▶️ Running: {name}")
+                        running[pool.submit(execute, name)] = name
+                        pending.remove(name)
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        seconds[name] = future.result()
+                        status[name] = "done"
+                        print(f"✅ Finished: {name} ({seconds[name]:.1f}s)")
+                    except Exception as e:
+                        status[name] = "failed"
+                        traceback.print_exception(e)
+                        print(f"❌ Failed: {name}: {e!r}")
+
+        with self._state_lock:
+            self._save_state()
+
+        print("\n🧭 PIPELINE SUMMARY")
+        for name in selected:
+            extra = f"  {seconds[name]:.1f}s" if name in seconds else ""
+            print(f"  {name:<18} {status[name]}{extra}")
+
+        return status
+
+
+# ======================================================
+# STAGE DEFINITIONS
+# ======================================================
+def _code(*modules):
+    # Every repo module that shapes a stage's output, imported directly or
+    # not; an edit to any of them reruns the stage
+    return [os.path.join(BASE_DIR, m) for m in modules]
+
+
+NASA_FILES = [os.path.join(DATA_DIR, "*_solar.csv"), os.path.join(DATA_DIR, "*_wind.csv")]
+
+SECONDARY_FILES = [
+    os.path.join(DATA_DIR, "cloudcover_india_2015_2024.csv"),
+    os.path.join(DATA_DIR, "final_population_2015_2024.csv"),
+    os.path.join(DATA_DIR, "city_energy_2015_2024.csv"),
+]
+
+
+def load_analytics_master():
+    return read_dataset(ANALYTICS_MASTER_PATH)
+
+
+def load_forecast():
+    return read_dataset(FORECAST_PATH)
+
+
+STAGES = [
+    Stage(
+        "analytics_master",
+        run=lambda up: load_analytics_master(),
+        inputs=[ANALYTICS_MASTER_PATH],
+        load=load_analytics_master,
+    ),
+    Stage(
+        "clean",
+        run=lambda up: convert_nasa_matrix_to_clean.run(),
+        inputs=NASA_FILES + _code("convert_nasa_matrix_to_clean.py", "nasa_power.py",
+                                  "ingest_manifest.py", "parallel.py"),
+        outputs=[CLEANED_DIR],
+    ),
+    Stage(
+        "features",
+        run=lambda up: build_features_and_master.run(frames=up["clean"]),
+        deps=["clean"],
+        inputs=_code("build_features_and_master.py", "schemas.py", "storage.py",
+                     "ingest_manifest.py", "parallel.py"),
+        outputs=[FEATURE_DIR, FEATURE_MASTER_PATH],
+    ),
+    Stage(
+        "nasa_master",
+        run=lambda up: final_merge.build_master(),
+        inputs=NASA_FILES + SECONDARY_FILES + _code("final_merge.py", "merge_engine.py",
+                                                    "nasa_power.py", "schemas.py", "storage.py"),
+        outputs=[NASA_MASTER_PATH],
+    ),
+    Stage(
+        "train",
+        run=lambda up: train_random_forest_model.run(df=up["analytics_master"]),
+        deps=["analytics_master"],
+        inputs=[MODEL_CONFIG_PATH] + _code("train_random_forest_model.py", "forecasters.py",
+                                           "forecasting.py", "city_models.py", "lag_features.py",
+                                           "model_registry.py", "forecast_cache.py", "parallel.py",
+                                           "storage.py", "schemas.py"),
+        outputs=[FORECAST_PATH],
+        load=load_forecast,
+    ),
+    Stage(
+        "combine",
+        run=lambda up: newdataset.run(historical_df=up["analytics_master"], forecast_df=up["train"]),
+        deps=["analytics_master", "train"],
+        inputs=_code("newdataset.py", "storage.py", "schemas.py"),
+        outputs=[FULL_DATASET_PATH],
+    ),
+    Stage(
+        "correlation_cube",
+        run=lambda up: correlation_cube.CorrelationCube.from_frame(
+            up["analytics_master"],
+            source=correlation_cube.source_signature(ANALYTICS_MASTER_PATH)
+        ).save(),
+        deps=["analytics_master"],
+        inputs=_code("correlation_cube.py", "storage.py", "schemas.py"),
+        outputs=[correlation_cube.CUBE_PATH],
+    ),
+    Stage(
+        "backtest",
+        run=lambda up: backtest.run(df=up["analytics_master"]),
+        deps=["analytics_master"],
+        inputs=[MODEL_CONFIG_PATH] + _code("backtest.py", "train_random_forest_model.py",
+                                           "forecasters.py", "forecasting.py", "city_models.py",
+                                           "lag_features.py", "model_registry.py", "parallel.py",
+                                           "storage.py", "schemas.py"),
+        outputs=[BACKTEST_PREDICTIONS_PATH, BACKTEST_CITY_PATH, BACKTEST_HORIZON_PATH],
+    ),
+]
+
+
+# ======================================================
+# MAIN
+# ======================================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Renewlytics data pipeline.")
+    parser.add_argument("targets", nargs="*", help="stages to bring up to date (default: all)")
+    parser.add_argument("--force", action="store_true", help="rerun even if nothing changed")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="stages run at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would run")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    pipeline = Pipeline(STAGES)
+
+    if args.dry_run:
+        for name, fp, skip in pipeline.plan(args.targets, args.force):
+            print(f"{'⏭️ skip' if skip else '▶️ run '}  {name:<18} {fp}")
+        sys.exit(0)
+
+    result = pipeline.run(args.targets, args.force, args.workers)
+    sys.exit(1 if any(v in ("failed", "blocked") for v in result.values()) else 0)
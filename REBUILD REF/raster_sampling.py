@@ -0,0 +1,210 @@
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import rasterio
+    from rasterio.features import bounds as geometry_bounds
+    from rasterio.features import geometry_mask
+    from rasterio.transform import rowcol
+    from rasterio.warp import transform as warp_points
+    from rasterio.windows import Window
+    HAS_RASTERIO = True
+except ImportError:  # optional: only csvconvert.py samples rasters
+    HAS_RASTERIO = False
+
+# ======================================================
+# RASTER SAMPLING
+# ======================================================
+# Population (and any other gridded layer) is read from the GeoTIFF a
+# window at a time instead of decoding the whole band per lookup:
+#
+#   with RasterSampler(tif_path) as raster:
+#       raster.sample(lons, lats)                 # pixel value per point
+#       raster.radius_sum(lons, lats, radius_km)  # total within N km
+#       raster.zonal_sum(geometries)              # total inside polygons
+#
+# The raster is read in tiles aligned to its internal blocks and the last
+# BLOCK_CACHE tiles are kept, so thousands of nearby points decode each
+# tile once. Points are grouped by tile and looked up with one fancy-index
+# per tile. Coordinates are lon / lat (EPSG:4326) and are reprojected if
+# the raster uses another CRS; nodata and out-of-raster pixels count as 0
+# in sums and NaN in point samples.
+#
+# rasterio is an optional dependency (see requirements.txt); the rest of
+# the project imports nothing from here.
+
+TILE_SIZE = 512          # target tile edge in pixels, rounded to whole blocks
+BLOCK_CACHE = 32         # decoded tiles kept in memory
+EARTH_RADIUS_KM = 6371.0088
+POINTS_CRS = "EPSG:4326"
+
+
+class RasterSampler:
+
+    def __init__(self, path, band=1, tile_size=TILE_SIZE, cache_size=BLOCK_CACHE):
+        if not HAS_RASTERIO:
+            raise ImportError("❌ Raster sampling needs rasterio: pip install rasterio")
+        self.path = path
+        self.band = band
+        self.src = rasterio.open(path)
+        self.cache_size = cache_size
+        self._tiles = OrderedDict()
+        self.tiles_read = 0
+
+        block_h, block_w = self.src.block_shapes[band - 1]
+        self.tile_h = min(self.src.height, block_h * max(1, tile_size // block_h))
+        self.tile_w = min(self.src.width, block_w * max(1, tile_size // block_w))
+
+        nodata = self.src.nodatavals[band - 1]
+        self.nodata = None if nodata is None else float(nodata)
+        self.geographic = self.src.crs is None or self.src.crs.is_geographic
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._tiles.clear()
+        self.src.close()
+
+    # --------------------------------------------------
+    # tiles
+    # --------------------------------------------------
+    def _tile(self, tile_row, tile_col):
+        """Decoded tile as float64 with nodata as NaN; least recently used is dropped."""
+        key = (tile_row, tile_col)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+            return self._tiles[key]
+
+        window = Window(tile_col * self.tile_w, tile_row * self.tile_h,
+                        min(self.tile_w, self.src.width - tile_col * self.tile_w),
+                        min(self.tile_h, self.src.height - tile_row * self.tile_h))
+        data = self.src.read(self.band, window=window).astype(np.float64)
+        if self.nodata is not None:
+            data[data == self.nodata] = np.nan
+        self.tiles_read += 1
+
+        self._tiles[key] = data
+        while len(self._tiles) > self.cache_size:
+            self._tiles.popitem(last=False)
+        return data
+
+    def _values(self, rows, cols):
+        """Pixel values at integer positions, NaN outside the raster."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.full(rows.shape, np.nan)
+
+        inside = (rows >= 0) & (rows < self.src.height) & (cols >= 0) & (cols < self.src.width)
+        tile = (rows // self.tile_h) * (self.src.width // self.tile_w + 1) + cols // self.tile_w
+        for key in np.unique(tile[inside]):
+            hit = inside & (tile == key)
+            tile_row, tile_col = rows[hit][0] // self.tile_h, cols[hit][0] // self.tile_w
+            data = self._tile(int(tile_row), int(tile_col))
+            values[hit] = data[rows[hit] - tile_row * self.tile_h, cols[hit] - tile_col * self.tile_w]
+        return values
+
+    def read_window(self, row_off, col_off, height, width):
+        """Window assembled from cached tiles; pixels outside the raster are NaN."""
+        out = np.full((height, width), np.nan)
+        r0, r1 = max(row_off, 0), min(row_off + height, self.src.height)
+        c0, c1 = max(col_off, 0), min(col_off + width, self.src.width)
+        if r0 >= r1 or c0 >= c1:
+            return out
+
+        for tile_row in range(r0 // self.tile_h, (r1 - 1) // self.tile_h + 1):
+            for tile_col in range(c0 // self.tile_w, (c1 - 1) // self.tile_w + 1):
+                data = self._tile(tile_row, tile_col)
+                top, left = tile_row * self.tile_h, tile_col * self.tile_w
+                tr0, tr1 = max(r0, top), min(r1, top + data.shape[0])
+                tc0, tc1 = max(c0, left), min(c1, left + data.shape[1])
+                out[tr0 - row_off:tr1 - row_off, tc0 - col_off:tc1 - col_off] = \
+                    data[tr0 - top:tr1 - top, tc0 - left:tc1 - left]
+        return out
+
+    # --------------------------------------------------
+    # coordinates
+    # --------------------------------------------------
+    def _to_raster_crs(self, lons, lats):
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        if self.src.crs is None or self.src.crs == POINTS_CRS:
+            return lons, lats
+        xs, ys = warp_points(POINTS_CRS, self.src.crs, lons, lats)
+        return np.asarray(xs), np.asarray(ys)
+
+    def _rowcol(self, xs, ys):
+        rows, cols = rowcol(self.src.transform, xs, ys)
+        return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+    # --------------------------------------------------
+    # queries
+    # --------------------------------------------------
+    def sample(self, lons, lats):
+        """Value of the pixel under each point."""
+        return self._values(*self._rowcol(*self._to_raster_crs(lons, lats)))
+
+    def radius_sum(self, lons, lats, radius_km):
+        """Sum of the pixels whose centre lies within `radius_km` of each point."""
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        xs, ys = self._to_raster_crs(lons, lats)
+        res_x, res_y = abs(self.src.transform.a), abs(self.src.transform.e)
+
+        # Nearby points share tiles, so walk them in raster order
+        centre_rows, centre_cols = self._rowcol(xs, ys)
+        totals = np.zeros(len(xs))
+        for i in np.lexsort((centre_cols, centre_rows)):
+            if self.geographic:
+                half_h = np.degrees(radius_km / EARTH_RADIUS_KM)
+                half_w = half_h / max(np.cos(np.radians(lats[i])), 1e-6)
+            else:
+                half_h = half_w = radius_km * 1000.0
+            reach_r = int(np.ceil(half_h / res_y))
+            reach_c = int(np.ceil(half_w / res_x))
+
+            row_off, col_off = centre_rows[i] - reach_r, centre_cols[i] - reach_c
+            data = self.read_window(row_off, col_off, 2 * reach_r + 1, 2 * reach_c + 1)
+
+            # Pixel centres of the window, in raster coordinates
+            r = np.arange(row_off, row_off + data.shape[0]) + 0.5
+            c = np.arange(col_off, col_off + data.shape[1]) + 0.5
+            px, py = self.src.transform * tuple(np.meshgrid(c, r))
+
+            if self.geographic:
+                distance = _haversine_km(lons[i], lats[i], px, py)
+            else:
+                distance = np.hypot(px - xs[i], py - ys[i]) / 1000.0
+            totals[i] = np.nansum(np.where(distance <= radius_km, data, np.nan))
+        return totals
+
+    def zonal_sum(self, geometries):
+        """Sum of the pixels whose centre falls inside each GeoJSON-like geometry.
+
+        Geometries must already be in the raster's CRS.
+        """
+        totals = np.zeros(len(geometries))
+        for i, geometry in enumerate(geometries):
+            left, bottom, right, top = geometry_bounds(geometry)
+            (r0, r1), (c0, c1) = self._rowcol([left, right], [top, bottom])
+            row_off, col_off = int(min(r0, r1)), int(min(c0, c1))
+            height, width = abs(int(r1 - r0)) + 1, abs(int(c1 - c0)) + 1
+
+            data = self.read_window(row_off, col_off, height, width)
+            outside = geometry_mask(
+                [geometry], out_shape=data.shape,
+                transform=self.src.window_transform(Window(col_off, row_off, width, height))
+            )
+            totals[i] = np.nansum(np.where(outside, np.nan, data))
+        return totals
+
+
+def _haversine_km(lon, lat, lons, lats):
+    lon, lat, lons, lats = map(np.radians, (lon, lat, lons, lats))
+    a = (np.sin((lats - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
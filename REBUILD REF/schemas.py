@@ -0,0 +1,169 @@
+import fnmatch
+import os
+
+import pandas as pd
+
+# ======================================================
+# DATASET SCHEMAS
+# ======================================================
+# One place that says what type every dataset column has in memory:
+#
+#   DATE      datetime64[ns]   dates, never strings
+#   LABEL     category         city / state / PARAM / DATA_TYPE
+#   PERIOD    int16            calendar year / month
+#   WEATHER   float32          NASA parameters and other weather values
+#   ENERGY    float64          energy targets, forecasts and metrics derived
+#                              from them (model input / output precision
+#                              is kept)
+#
+# storage.read_dataset / write_dataset enforce the schema of the dataset
+# they are given (matched by file name, see SCHEMAS), and the scripts that
+# still use plain CSVs read them through read_csv here. Columns a schema
+# does not declare fall back to name rules (COLUMN_RULES), so new columns
+# still come out typed. A value that does not fit its declared type raises
+# instead of being silently turned into NaN.
+
+DATE = "datetime64[ns]"
+LABEL = "category"
+PERIOD = "int16"
+WEATHER = "float32"
+ENERGY = "float64"
+
+NASA_PARAMETERS = [
+    "ALLSKY_SFC_SW_DWN", "ALLSKY_SFC_SW_DNI", "ALLSKY_SFC_SW_DIFF",
+    "T2M", "T2M_MAX", "T2M_MIN", "RH2M", "CLD_FRAC", "PS",
+    "WS2M", "WS10M", "WD10M",
+]
+
+# Lower-cased column name -> type, for columns no schema declares
+COLUMN_RULES = {
+    "date": DATE,
+    "city": LABEL, "state": LABEL, "data_type": LABEL, "param": LABEL,
+    "year": PERIOD, "month": PERIOD,
+    **{p.lower(): WEATHER for p in NASA_PARAMETERS},
+}
+
+ANALYTICS_MASTER = {
+    "date": DATE,
+    "city": LABEL,
+    "energy_generated": ENERGY,
+    "predicted_energy": ENERGY,
+    "energy_efficiency_index": ENERGY,
+    "sunshine_hours": WEATHER,
+    "temperature": WEATHER,
+    "wind_speed": WEATHER,
+    "allsky_sfc_sw_dwn": WEATHER,
+    "rh2m": WEATHER,
+}
+
+FORECAST = {
+    "DATE": DATE,
+    "CITY": LABEL,
+    "ENERGY_GENERATED": ENERGY,
+    "ENERGY_P10": ENERGY,
+    "ENERGY_P50": ENERGY,
+    "ENERGY_P90": ENERGY,
+}
+
+# Actual rows (analytics master with DATE / CITY) + forecast rows
+FULL_DATASET = {
+    **{k: v for k, v in ANALYTICS_MASTER.items() if k not in ("date", "city")},
+    **FORECAST,
+    "DATA_TYPE": LABEL,
+}
+
+CITY_FEATURES = {"DATE": DATE, "CITY": LABEL, **{p: WEATHER for p in NASA_PARAMETERS}}
+
+CLEAN_LONG = {"DATE": DATE, "PARAM": LABEL, "VALUE": WEATHER}
+
+NASA_MASTER = {
+    "Date": DATE,
+    "City": LABEL,
+    "State": LABEL,
+    "Year": PERIOD,
+    "Month": PERIOD,
+    **{p: WEATHER for p in NASA_PARAMETERS},
+    "Sunshine_Hours": WEATHER,
+    "Cloud_Cover": WEATHER,
+    "Wind_Power_Density": WEATHER,
+}
+
+# File name pattern -> schema
+SCHEMAS = {
+    "india_renewable_energy_analytics_master.csv": ANALYTICS_MASTER,
+    "renewable_energy_forecast_till_2034.csv": FORECAST,
+    "renewable_energy_full_actual_and_forecast.csv": FULL_DATASET,
+    "renewable_energy_actual_and_forecast.csv": FULL_DATASET,
+    "india_renewable_master.csv": CITY_FEATURES,
+    "*_features.csv": CITY_FEATURES,
+    "*_clean.csv": CLEAN_LONG,
+    "Master_Dataset_Final.csv": NASA_MASTER,
+    "MASTER_DATASET.csv": NASA_MASTER,
+}
+
+
+def schema_for(path):
+    """Declared schema of the dataset stored at `path`, or None."""
+    name = os.path.basename(path)
+    for pattern, schema in SCHEMAS.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            return schema
+    return None
+
+
+def column_type(column, schema=None):
+    if schema and column in schema:
+        return schema[column]
+    return COLUMN_RULES.get(str(column).lower())
+
+
+def _cast(series, dtype):
+    if dtype == DATE:
+        if not pd.api.types.is_datetime64_any_dtype(series):
+            return pd.to_datetime(series)
+        return series
+    if dtype == LABEL:
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            return series.astype("category")
+        return series
+    if series.dtype == dtype:
+        return series
+    if dtype == PERIOD and series.isna().any():
+        # Missing years / months need the nullable integer
+        return series.astype("Int16")
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    return series.astype(dtype)
+
+
+def enforce(df, schema=None):
+    """Cast `df`'s columns (in place) to the schema, falling back to COLUMN_RULES."""
+    for col in df.columns:
+        dtype = column_type(col, schema)
+        if dtype is not None:
+            df[col] = _cast(df[col], dtype)
+    return df
+
+
+def read_csv(path, schema=None, **kwargs):
+    """pd.read_csv that parses straight into the schema's types.
+
+    `schema` defaults to the one registered for `path`. With `chunksize`
+    it returns an iterator of typed chunks.
+    """
+    schema = schema if schema is not None else schema_for(path)
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = kwargs.get("usecols")
+    columns = header if usecols is None else [c for c in header if c in set(usecols)]
+
+    # Floats and labels are parsed as such; dates and (maybe missing)
+    # periods are converted after the read
+    dtype = {}
+    for col in columns:
+        wanted = column_type(col, schema)
+        if wanted in (WEATHER, ENERGY, LABEL):
+            dtype[col] = wanted
+    if kwargs.get("chunksize"):
+        return (enforce(chunk, schema) for chunk in pd.read_csv(path, dtype=dtype, **kwargs))
+    return enforce(pd.read_csv(path, dtype=dtype, **kwargs), schema)
+
@@ -0,0 +1,356 @@
+import json
+import os
+import shutil
+import uuid
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from schemas import DATE, ENERGY, LABEL, PERIOD, WEATHER, column_type, enforce, read_csv, schema_for
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    HAS_PARQUET = True
+except ImportError:  # CSV-only fallback
+    pa = ds = pq = None
+    HAS_PARQUET = False
+
+# ======================================================
+# COLUMNAR STORAGE LAYER
+# ======================================================
+# Every dataset keeps its CSV path as its public name (so nothing else in the
+# project has to change), with a Parquet copy stored next to it:
+#
+#   master/india_renewable_energy_analytics_master.csv
+#   master/india_renewable_energy_analytics_master.parquet/
+#       Ahmedabad.parquet
+#       Bengaluru.parquet
+#       ...
+#       _source.json
+#
+# One file per city, with dates stored as native timestamps. Readers can ask
+# for a subset of columns, cities and a date range; only the matching city
+# files are opened and the date filter is pushed down into Parquet.
+# Without pyarrow everything transparently falls back to the CSV.
+#
+# Column types come from the dataset's schema (schemas.py): frames are cast
+# to it before they are written and every reader returns it, so Parquet
+# stores float32 weather columns and labels come back as categories.
+
+SOURCE_MARKER = "_source.json"
+
+# Rows per chunk when a CSV is converted or streamed
+CHUNK_ROWS = 500_000
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def _find_column(columns, name):
+    for col in columns:
+        if str(col).lower() == name:
+            return col
+    return None
+
+
+def apply_column_types(df, csv_path=None):
+    """Cast `df` in place to the schema registered for `csv_path` (or the name rules)."""
+    return enforce(df, schema_for(csv_path) if csv_path else None)
+
+
+def _csv_signature(csv_path):
+    if not os.path.exists(csv_path):
+        return None
+    stat = os.stat(csv_path)
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _is_fresh(csv_path):
+    marker = os.path.join(columnar_path(csv_path), SOURCE_MARKER)
+    if not os.path.exists(marker):
+        return False
+
+    with open(marker, "r", encoding="utf-8") as f:
+        recorded = json.load(f)
+
+    # A CSV edited by hand after the Parquet copy was written wins
+    current = _csv_signature(csv_path)
+    return current is None or current == recorded.get("csv")
+
+
+def _plain_labels(df):
+    """Categories as plain strings for Parquet; they are rebuilt on read."""
+    labels = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+    return df.astype({c: object for c in labels}) if labels else df
+
+
+def _arrow_schema(df, schema=None):
+    """One Arrow schema for every file of a dataset, inferred from its first chunk.
+
+    A column with no values in that chunk would be inferred as Arrow's null
+    type, which later files cannot be cast to; it gets its schemas.py type
+    instead, or string.
+    """
+    arrow_types = {DATE: pa.timestamp("ns"), LABEL: pa.string(), PERIOD: pa.int16(),
+                   WEATHER: pa.float32(), ENERGY: pa.float64()}
+    inferred = pa.Schema.from_pandas(_plain_labels(df), preserve_index=False)
+    fields = [
+        field.with_type(arrow_types.get(column_type(field.name, schema), pa.string()))
+        if pa.types.is_null(field.type) else field
+        for field in inferred
+    ]
+    return pa.schema(fields, metadata=inferred.metadata)
+
+
+class DatasetWriter:
+    """Write a dataset chunk by chunk; the new CSV and Parquet copy appear on close.
+
+        with DatasetWriter(csv_path) as writer:
+            for chunk in chunks:
+                writer.append(chunk)
+
+    Only the chunk being appended is in memory. Chunks may hold any rows in
+    any order (each city's rows go to its own Parquet file), but all need
+    the first chunk's columns. Rows land in the CSV in append order. If the
+    block raises, the old files are left untouched.
+    """
+
+    def __init__(self, csv_path, write_csv=True, columnar=None):
+        self.csv_path = csv_path
+        self.schema = schema_for(csv_path)
+        self.columns = None
+        self.rows = 0
+
+        # Unique names: two processes may write the same dataset at the same time
+        self._suffix = f".{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._csv_tmp = f"{csv_path}{self._suffix}.tmp" if write_csv else None
+        self._dir_tmp = None
+        if (HAS_PARQUET if columnar is None else columnar):
+            self._dir_tmp = columnar_path(csv_path) + ".tmp" + self._suffix
+            os.makedirs(self._dir_tmp)
+        self._parquet = {}      # file name -> open ParquetWriter
+        self._arrow_schema = None   # shared by every city file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = [str(c) for c in df.columns]
+        elif set(map(str, df.columns)) != set(self.columns):
+            raise ValueError(
+                f"❌ {os.path.basename(self.csv_path)}: chunk columns differ from the first chunk "
+                f"(missing {sorted(set(self.columns) - set(map(str, df.columns)))}, "
+                f"new {sorted(set(map(str, df.columns)) - set(self.columns))})"
+            )
+
+        df = enforce(df[self.columns].copy(), self.schema)
+
+        if self._csv_tmp is not None:
+            header = not os.path.exists(self._csv_tmp)
+            df.to_csv(self._csv_tmp, mode="a", header=header, index=False)
+
+        if self._dir_tmp is not None and self._arrow_schema is None:
+            self._arrow_schema = _arrow_schema(df, self.schema)
+
+        if self._dir_tmp is not None and len(df):
+            city_col = _find_column(self.columns, "city")
+            parts = [("data", df)] if city_col is None else df.groupby(city_col, observed=True)
+            for city, part in parts:
+                self._write_part(quote(str(city), safe="") + ".parquet", _plain_labels(part))
+
+        self.rows += len(df)
+
+    def _write_part(self, file_name, part):
+        table = pa.Table.from_pandas(part, schema=self._arrow_schema, preserve_index=False)
+        writer = self._parquet.get(file_name)
+        if writer is None:
+            writer = pq.ParquetWriter(os.path.join(self._dir_tmp, file_name), self._arrow_schema)
+            self._parquet[file_name] = writer
+        writer.write_table(table)
+
+    def close(self):
+        for writer in self._parquet.values():
+            writer.close()
+        self._parquet = {}
+
+        if self._csv_tmp is not None:
+            if self.columns is None:
+                pd.DataFrame().to_csv(self._csv_tmp, index=False)
+            # Write-then-rename: a reader (dashboard, refresh job) sees the
+            # old file or the new one, never half of it
+            os.replace(self._csv_tmp, self.csv_path)
+
+        if self._dir_tmp is not None:
+            self._install_columnar()
+
+    def abort(self):
+        for writer in self._parquet.values():
+            writer.close()
+        self._parquet = {}
+        if self._csv_tmp is not None and os.path.exists(self._csv_tmp):
+            os.remove(self._csv_tmp)
+        if self._dir_tmp is not None:
+            shutil.rmtree(self._dir_tmp, ignore_errors=True)
+
+    def _install_columnar(self):
+        target = columnar_path(self.csv_path)
+        with open(os.path.join(self._dir_tmp, SOURCE_MARKER), "w", encoding="utf-8") as f:
+            json.dump({"columns": self.columns or [], "csv": _csv_signature(self.csv_path)}, f)
+
+        # Directories cannot be replaced in one step: move the old copy aside
+        # first so the gap without a store is two renames long
+        old_target = target + ".old" + self._suffix
+        try:
+            os.replace(target, old_target)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(self._dir_tmp, target)
+        except OSError:
+            # Another writer installed its copy in that gap; keep theirs
+            shutil.rmtree(self._dir_tmp, ignore_errors=True)
+        shutil.rmtree(old_target, ignore_errors=True)
+
+
+def _write_columnar(csv_path, chunksize=CHUNK_ROWS):
+    """(Re)build the Parquet copy from the CSV, one chunk of rows at a time."""
+    with DatasetWriter(csv_path, write_csv=False, columnar=True) as writer:
+        for chunk in read_csv(csv_path, chunksize=chunksize):
+            writer.append(chunk)
+
+
+def write_dataset(df, csv_path, write_csv=True):
+    """Save `df` under `csv_path` and refresh its Parquet copy.
+
+    The CSV is still written by default so existing tools and the committed
+    data files keep working. Use DatasetWriter to write a dataset that does
+    not fit in memory.
+    """
+    with DatasetWriter(csv_path, write_csv=write_csv) as writer:
+        writer.append(df)
+
+
+def _read_columnar(csv_path, columns, cities, start, end):
+    target = columnar_path(csv_path)
+
+    with open(os.path.join(target, SOURCE_MARKER), "r", encoding="utf-8") as f:
+        all_columns = json.load(f)["columns"]
+
+    city_col = _find_column(all_columns, "city")
+    date_col = _find_column(all_columns, "date")
+
+    # City predicate -> only open that city's files
+    if cities is not None and city_col is not None:
+        files = [os.path.join(target, quote(str(c), safe="") + ".parquet") for c in cities]
+        files = [f for f in files if os.path.exists(f)]
+    else:
+        files = sorted(
+            os.path.join(target, f) for f in os.listdir(target) if f.endswith(".parquet")
+        )
+
+    if not files:
+        return apply_column_types(pd.DataFrame(columns=columns or all_columns), csv_path)
+
+    # Date predicate -> pushed down to Parquet row groups
+    expr = None
+    if date_col is not None:
+        if start is not None:
+            expr = ds.field(date_col) >= pd.Timestamp(start).to_pydatetime()
+        if end is not None:
+            upper = ds.field(date_col) <= pd.Timestamp(end).to_pydatetime()
+            expr = upper if expr is None else expr & upper
+
+    # The dataset would take its schema from the first file; unify them so
+    # stores written before all files shared one schema still read
+    schema = pa.unify_schemas([pq.read_schema(f) for f in files])
+    table = ds.dataset(files, format="parquet", schema=schema).to_table(columns=columns, filter=expr)
+    return apply_column_types(table.to_pandas(), csv_path)
+
+
+def _read_csv(csv_path, columns, cities, start, end):
+    usecols = None
+    if columns is not None:
+        # Filter columns have to be loaded even if the caller did not ask for them
+        header = pd.read_csv(csv_path, nrows=0).columns
+        extra = [c for c in (_find_column(header, "city"), _find_column(header, "date")) if c]
+        usecols = list(dict.fromkeys(list(columns) + extra))
+
+    df = read_csv(csv_path, usecols=usecols)
+
+    city_col = _find_column(df.columns, "city")
+    date_col = _find_column(df.columns, "date")
+
+    mask = pd.Series(True, index=df.index)
+    if cities is not None and city_col is not None:
+        mask &= df[city_col].isin(list(cities))
+    if start is not None and date_col is not None:
+        mask &= df[date_col] >= pd.Timestamp(start)
+    if end is not None and date_col is not None:
+        mask &= df[date_col] <= pd.Timestamp(end)
+
+    if not mask.all():
+        df = df[mask].reset_index(drop=True)
+        if city_col is not None:
+            df[city_col] = df[city_col].cat.remove_unused_categories()
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def read_dataset(csv_path, columns=None, cities=None, start=None, end=None):
+    """Load the dataset stored under `csv_path`.
+
+    `columns` selects columns, `cities` restricts to a list of cities and
+    `start`/`end` bound the date column (inclusive). Columns come back in
+    the dataset's schema (see schemas.py). Rows are grouped by city.
+
+    Reads the Parquet copy when it is up to date, otherwise parses the CSV
+    and (if pyarrow is installed) writes the Parquet copy for next time.
+    """
+    if columns is not None:
+        columns = list(columns)
+
+    if HAS_PARQUET:
+        if not _is_fresh(csv_path):
+            _write_columnar(csv_path)
+        return _read_columnar(csv_path, columns, cities, start, end)
+
+    return _read_csv(csv_path, columns, cities, start, end)
+
+
+def list_cities(csv_path, chunksize=CHUNK_ROWS):
+    """Sorted city labels of a dataset without loading its rows.
+
+    With the Parquet copy this is just the per-city file names; the CSV
+    fallback streams the city column in chunks.
+    """
+    if HAS_PARQUET:
+        if not _is_fresh(csv_path):
+            _write_columnar(csv_path)
+        target = columnar_path(csv_path)
+        with open(os.path.join(target, SOURCE_MARKER), "r", encoding="utf-8") as f:
+            if _find_column(json.load(f)["columns"], "city") is None:
+                return []
+        return sorted(
+            unquote(f[:-len(".parquet")]) for f in os.listdir(target) if f.endswith(".parquet")
+        )
+
+    header = pd.read_csv(csv_path, nrows=0).columns
+    city_col = _find_column(header, "city")
+    if city_col is None:
+        return []
+
+    cities = set()
+    for chunk in pd.read_csv(csv_path, usecols=[city_col], chunksize=chunksize):
+        cities.update(chunk[city_col].dropna().astype(str))
+    return sorted(cities)
@@ -1,22 +1,38 @@
+import json
+import os
+
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.preprocessing import LabelEncoder
 
+from forecast_cache import ForecastCache, forecast_cities
+from forecasters import DEFAULT_ENGINE, make_forecaster
+from forecasting import band_column
+from instrumentation import stage
+from lag_features import add_lag_features
+from model_registry import ModelRegistry, training_key
+from paths import ANALYTICS_MASTER_PATH, FORECAST_PATH, MODEL_CONFIG_PATH, MODEL_DIR
+from storage import read_dataset, write_dataset
+
 # ======================================================
-# STEP 1: LOAD DATA
+# CONFIGURATION
 # ======================================================
-DATA_PATH = r"C:\Users\anuru\OneDrive\Desktop\REBUILD REF\master\india_renewable_energy_analytics_master.csv"
+DATA_PATH = ANALYTICS_MASTER_PATH
+MODEL_FOLDER = MODEL_DIR
+OUTPUT_PATH = FORECAST_PATH
 
-df = pd.read_csv(DATA_PATH)
+FORECAST_END = "2034-12-01"
 
-# ======================================================
-# STEP 2: STANDARDIZE COLUMN NAMES
-# ======================================================
-df.rename(columns={
+# Prediction bands stored next to the point forecast (ENERGY_P10 / P50 / P90)
+FORECAST_QUANTILES = (0.1, 0.5, 0.9)
+
+# Share of the months used for training in the STEP 6 hold-out check
+TRAIN_FRACTION = 0.8
+
+# Analytics master column -> model column
+COLUMN_MAP = {
     "date": "DATE",
     "city": "CITY",
     "energy_generated": "ENERGY_GENERATED",
@@ -26,31 +42,17 @@ df.rename(columns={
     "wind_speed": "WIND_SPEED",
     "allsky_sfc_sw_dwn": "SOLAR_IRRADIANCE",
     "rh2m": "HUMIDITY"
-}, inplace=True)
-
-df["DATE"] = pd.to_datetime(df["DATE"])
-df = df.sort_values(["CITY", "DATE"]).reset_index(drop=True)
-
-print("✅ Dataset loaded and standardized")
+}
 
-# ======================================================
-# STEP 3: CREATE LAG FEATURES (CRITICAL)
-# ======================================================
-df["ENERGY_LAG_1"] = df.groupby("CITY")["ENERGY_GENERATED"].shift(1)
-df["ENERGY_LAG_12"] = df.groupby("CITY")["ENERGY_GENERATED"].shift(12)
-
-df = df.dropna().reset_index(drop=True)
-
-# ======================================================
-# STEP 4: ENCODE CITY
-# ======================================================
-le = LabelEncoder()
-df["CITY_ENCODED"] = le.fit_transform(df["CITY"])
+# Declarative spec, computed in one sorted pass (see lag_features.py);
+# the recursive forecaster rebuilds every spec after each predicted month
+LAG_FEATURES = [
+    ("lag", 1),
+    ("lag", 12)
+]
 
-# ======================================================
-# STEP 5: FEATURE SET (EFFICIENCY DOMINANT)
-# ======================================================
-FEATURES = [
+# Efficiency dominant feature set
+DEFAULT_FEATURES = [
     "CITY_ENCODED",
     "EFFICIENCY_INDEX",
     "SUNSHINE_HOURS",
@@ -64,82 +66,206 @@ FEATURES = [
 
 TARGET = "ENERGY_GENERATED"
 
-X = df[FEATURES]
-y = df[TARGET]
-
-# ======================================================
-# STEP 6: TIME-BASED SPLIT
-# ======================================================
-split_index = int(len(df) * 0.8)
-
-X_train, X_test = X.iloc[:split_index], X.iloc[split_index:]
-y_train, y_test = y.iloc[:split_index], y.iloc[split_index:]
-
-# ======================================================
-# STEP 7: TRAIN RANDOM FOREST
-# ======================================================
-model = RandomForestRegressor(
+DEFAULT_MODEL_PARAMS = dict(
     n_estimators=400,
     max_depth=20,
     random_state=42,
     n_jobs=-1
 )
 
-model.fit(X_train, y_train)
 
-# ======================================================
-# STEP 8: EVALUATION
-# ======================================================
-y_pred = model.predict(X_test)
+# "random_forest", "hist_gb", "ridge" or "seasonal_naive" (see forecasters.py);
+# an "engine" entry in model_config.json overrides it
+FORECAST_ENGINE = DEFAULT_ENGINE
 
-print("\n📊 MODEL PERFORMANCE")
-print(f"MAE  : {mean_absolute_error(y_test, y_pred):.3f}")
-print(f"RMSE : {np.sqrt(mean_squared_error(y_test, y_pred)):.3f}")
-print(f"R²   : {r2_score(y_test, y_pred):.3f}")
+# "global" = one forest for all cities; "city" / "cluster" / "hybrid" fit
+# smaller routed models in parallel (see city_models.py)
+TRAINING_MODE = "global"
+TRAIN_WORKERS = 0   # processes for routed modes, 0 = one per CPU core
 
-# ======================================================
-# STEP 9: RECURSIVE FORECASTING TILL 2034
-# ======================================================
-future_dates = pd.date_range(
-    start=df["DATE"].max() + pd.offsets.MonthBegin(1),
-    end="2034-12-01",
-    freq="MS"
-)
+# Reuse each city's stored trajectory while the model and the city's latest
+# rows are unchanged (see forecast_cache.py)
+USE_FORECAST_CACHE = True
 
-future_rows = []
 
-for city in df["CITY"].unique():
-    city_df = df[df["CITY"] == city].copy()
-    last_row = city_df.iloc[-1].copy()
+def load_model_config(path=MODEL_CONFIG_PATH):
+    """(features, forest params, engine) from model_config.json if saved, else the defaults."""
+    if not os.path.exists(path):
+        return list(DEFAULT_FEATURES), dict(DEFAULT_MODEL_PARAMS), FORECAST_ENGINE
 
-    for date in future_dates:
-        row = last_row.copy()
-        row["DATE"] = date
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
 
-        X_future = pd.DataFrame([row[FEATURES]], columns=FEATURES)
-        prediction = model.predict(X_future)[0]
+    params = {**DEFAULT_MODEL_PARAMS, **config.get("params", {})}
+    features = list(config.get("features", DEFAULT_FEATURES))
+    return features, params, config.get("engine", FORECAST_ENGINE)
 
 
-        row["ENERGY_GENERATED"] = prediction
-        row["ENERGY_LAG_12"] = row["ENERGY_LAG_1"]
-        row["ENERGY_LAG_1"] = prediction
+FEATURES, MODEL_PARAMS, FORECAST_ENGINE = load_model_config()
 
-        future_rows.append(row)
-        last_row = row
+# Routed models find each row's forest through the city code
+if (FORECAST_ENGINE == "random_forest" and TRAINING_MODE != "global"
+        and "CITY_ENCODED" not in FEATURES):
+    FEATURES = ["CITY_ENCODED"] + FEATURES
 
-future_df = pd.DataFrame(future_rows)
 
-# ======================================================
-# STEP 10: MERGE HISTORICAL + FUTURE
-# ======================================================
-final_df = pd.concat([
-    df[["DATE", "CITY", "ENERGY_GENERATED"]],
-    future_df[["DATE", "CITY", "ENERGY_GENERATED"]]
-]).reset_index(drop=True)
+def standardize_columns(df):
+    # Not inplace: a caller's in-memory frame must stay untouched
+    df = df.rename(columns=COLUMN_MAP)
+    return df.sort_values(["CITY", "DATE"]).reset_index(drop=True)
+
+
+def prepare_training_frame(df):
+    """STEP 2-4 in one call: model column names, lag features, city codes.
+
+    Returns (frame sorted by city then date, fitted LabelEncoder). Used by
+    the backtester and tuner so they train on exactly what the trainer does.
+    """
+    df = standardize_columns(df)
+    df = add_lag_features(df, LAG_FEATURES).dropna().reset_index(drop=True)
+
+    le = LabelEncoder()
+    df["CITY_ENCODED"] = le.fit_transform(df["CITY"])
+    return df, le
+
+
+def training_cutoff(dates, fraction=TRAIN_FRACTION):
+    """First month held out: January of the year holding the `fraction` point.
+
+    Rounding to a year keeps the cutoff (and so the training rows and the
+    model key) fixed while new months are appended, so the stored model
+    and its cached forecasts are reused; it moves about once a year.
+    """
+    months = np.sort(pd.unique(dates))
+    point = pd.Timestamp(months[int(len(months) * fraction)])
+    return pd.Timestamp(year=point.year, month=1, day=1)
+
+
+def run(df=None):
+    """Train (or reuse) the forest and forecast every city to FORECAST_END.
+
+    `df` is the analytics master if the caller already has it in memory.
+    Returns the historical + forecast frame that is also written to OUTPUT_PATH.
+    """
+    # ======================================================
+    # STEP 1: LOAD DATA
+    # ======================================================
+    with stage("STEP 1: LOAD DATA") as s:
+        if df is None:
+            df = read_dataset(DATA_PATH)
+        s.output(df)
+
+    # ======================================================
+    # STEP 2-4: STANDARDIZE, LAG FEATURES (CRITICAL), ENCODE CITY
+    # ======================================================
+    # The same call as backtest.py and tune_model.py, so all three train
+    # on an identical frame
+    with stage("STEP 2-4: STANDARDIZE + LAG FEATURES + ENCODE CITY", df_in=df) as s:
+        df, le = prepare_training_frame(df)
+        s.output(df, cities=len(le.classes_))
+
+        print("✅ Dataset loaded, standardized and lag features created")
+
+    # ======================================================
+    # STEP 5: FEATURE SET (EFFICIENCY DOMINANT)
+    # ======================================================
+    with stage("STEP 5: FEATURE SET (EFFICIENCY DOMINANT)", df_in=df) as s:
+        X = df[FEATURES]
+        y = df[TARGET]
+        s.output(X)
+
+    # ======================================================
+    # STEP 6: TIME-BASED SPLIT
+    # ======================================================
+    with stage("STEP 6: TIME-BASED SPLIT", df_in=X) as s:
+        # Rows are sorted by city, so a row-count split would hold out whole
+        # cities; cut on the calendar instead so every city is tested on its
+        # latest months. Full walk-forward folds live in backtest.py.
+        cutoff = training_cutoff(df["DATE"])
+        is_train = (df["DATE"] < cutoff).to_numpy()
+
+        X_train, X_test = X[is_train], X[~is_train]
+        y_train, y_test = y[is_train], y[~is_train]
+        s.output(X_train, test_rows=len(X_test))
+
+    # ======================================================
+    # STEP 7: TRAIN MODEL
+    # ======================================================
+    with stage("STEP 7: TRAIN MODEL", df_in=X_train) as s:
+        if FORECAST_ENGINE == "random_forest":
+            model = make_forecaster(FORECAST_ENGINE, FEATURES, MODEL_PARAMS,
+                                    training_mode=TRAINING_MODE, n_cities=len(le.classes_),
+                                    workers=TRAIN_WORKERS)
+        else:
+            model = make_forecaster(FORECAST_ENGINE, FEATURES)
+
+        # Same data + features + params -> reuse the stored model (see model_registry.py)
+        registry = ModelRegistry(MODEL_FOLDER)
+        model_key = training_key(X_train, y_train, model.config(), FEATURES)
+
+        def fit_model():
+            return model.fit(X_train, y_train)
+
+        artifact, reused = registry.get_or_train(model_key, fit_model, le, FEATURES, model.config())
+        model = artifact.model
+        s.output(model_key=model_key, reused=reused, engine=FORECAST_ENGINE,
+                 training_mode=TRAINING_MODE)
+
+        print(f"{'♻️ Reused' if reused else '💾 Trained and saved'} model {model_key}")
+
+    # ======================================================
+    # STEP 8: EVALUATION
+    # ======================================================
+    with stage("STEP 8: EVALUATION", df_in=X_test) as s:
+        y_pred = model.predict(X_test)
+
+        print("\n📊 MODEL PERFORMANCE")
+        print(f"MAE  : {mean_absolute_error(y_test, y_pred):.3f}")
+        print(f"RMSE : {np.sqrt(mean_squared_error(y_test, y_pred)):.3f}")
+        print(f"R²   : {r2_score(y_test, y_pred):.3f}")
+
+        s.output(rows=len(y_pred), mae=float(mean_absolute_error(y_test, y_pred)))
+
+    # ======================================================
+    # STEP 9: RECURSIVE FORECASTING TILL 2034
+    # ======================================================
+    with stage("STEP 9: RECURSIVE FORECASTING TILL 2034", df_in=df) as s:
+        # Every city from the month after its own last row, cities ending on
+        # the same month batched into one step per month (see forecasters.py);
+        # the forest's per-tree trajectories give the uncertainty bands
+        if USE_FORECAST_CACHE:
+            future_df, recomputed = ForecastCache().forecast(
+                model, model_key, df, FORECAST_END, FORECAST_QUANTILES
+            )
+            print(f"♻️ Forecast cache: {df['CITY'].nunique() - len(recomputed)} cities reused, "
+                  f"{len(recomputed)} recomputed")
+        else:
+            future_df = forecast_cities(model, df, FORECAST_END, FORECAST_QUANTILES)
+            recomputed = future_df["CITY"].unique()
+
+        band_cols = [band_column(q) for q in FORECAST_QUANTILES if band_column(q) in future_df]
+        s.output(future_df, recomputed=len(recomputed))
+
+    # ======================================================
+    # STEP 10: MERGE HISTORICAL + FUTURE
+    # ======================================================
+    with stage("STEP 10: MERGE HISTORICAL + FUTURE") as s:
+        final_df = pd.concat([
+            df[["DATE", "CITY", "ENERGY_GENERATED"]],
+            future_df[["DATE", "CITY", "ENERGY_GENERATED"] + band_cols]
+        ]).reset_index(drop=True)
+        s.output(final_df)
+
+    # ======================================================
+    # STEP 11: SAVE OUTPUT
+    # ======================================================
+    with stage("STEP 11: SAVE OUTPUT", df_in=final_df) as s:
+        write_dataset(final_df, OUTPUT_PATH)
+
+        print("\n✅ Renewable energy forecast generated till 2034 successfully.")
+
+    return final_df
 
-# ======================================================
-# STEP 11: SAVE OUTPUT
-# ======================================================
-final_df.to_csv("renewable_energy_forecast_till_2034.csv", index=False)
 
-print("\n✅ Renewable energy forecast generated till 2034 successfully.")
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,230 @@
+import argparse
+import itertools
+import json
+import math
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backtest import (FeatureMatrix, error_metrics, fold_origins, fold_params, run_fold)
+from instrumentation import stage
+from parallel import ordered_map
+from paths import MODEL_CONFIG_PATH, TUNING_RESULTS_PATH
+from storage import read_dataset
+from train_random_forest_model import (DATA_PATH, DEFAULT_FEATURES, DEFAULT_MODEL_PARAMS, TARGET,
+                                       prepare_training_frame)
+
+# ======================================================
+# HYPERPARAMETER SEARCH (SUCCESSIVE HALVING)
+# ======================================================
+# Candidates are forest settings x feature sets, scored by the same
+# walk-forward recursive forecast as backtest.py (MAE over every city and
+# horizon month). Instead of fully training every candidate, the search
+# runs in rungs:
+#
+#   rung 1: 24 candidates,  50 trees, latest fold
+#   rung 2:  8 candidates, 150 trees, 2 latest folds
+#   rung 3:  3 candidates, 400 trees, 3 latest folds   -> winner
+#
+# Only the best 1 / ETA of each rung is promoted, so most of the budget goes
+# to the candidates that are still in the running.
+#
+# The lag-feature matrix is built once and memory-mapped by every worker
+# (see backtest.FeatureMatrix); feature sets are column subsets of it.
+# Fold results are cached by backtest.run_fold, so rerunning the search
+# with more candidates only trains the new ones. The winner is written to
+# model_config.json, which train_random_forest_model.py picks up.
+#
+#   python tune_model.py --candidates 24 --workers 0
+
+# Searched forest settings; n_estimators is the budget that grows per rung
+SEARCH_SPACE = {
+    "max_depth": [8, 12, 20, None],
+    "min_samples_leaf": [1, 2, 5],
+    "max_features": [1.0, 0.6, "sqrt"],
+}
+
+# Column subsets of DEFAULT_FEATURES. Every set keeps both lags, which the
+# recursive forecaster rolls forward.
+WEATHER = ["SUNSHINE_HOURS", "SOLAR_IRRADIANCE", "TEMPERATURE", "WIND_SPEED", "HUMIDITY"]
+FEATURE_SETS = {
+    "full": DEFAULT_FEATURES,
+    "no_weather": [f for f in DEFAULT_FEATURES if f not in WEATHER],
+    "solar_weather": [f for f in DEFAULT_FEATURES
+                      if f not in ("TEMPERATURE", "WIND_SPEED", "HUMIDITY")],
+    "no_city": [f for f in DEFAULT_FEATURES if f != "CITY_ENCODED"],
+}
+
+N_CANDIDATES = 24   # sampled from the grid; 0 = the whole grid
+ETA = 3             # keep the best 1 / ETA of each rung
+MIN_TREES = 50
+MAX_TREES = DEFAULT_MODEL_PARAMS["n_estimators"]
+N_FOLDS = 3
+HORIZON = 12
+SEED = 42
+
+# Candidate processes: 1 = sequential, 0 = one per CPU core
+WORKERS = 0
+
+
+# ======================================================
+# CANDIDATES
+# ======================================================
+def build_candidates(n_candidates=N_CANDIDATES, seed=SEED):
+    """List of {"feature_set", "params"}; a seeded sample of the full grid."""
+    names = list(SEARCH_SPACE)
+    grid = [
+        {"feature_set": feature_set, "params": dict(zip(names, values))}
+        for feature_set in FEATURE_SETS
+        for values in itertools.product(*(SEARCH_SPACE[n] for n in names))
+    ]
+
+    if n_candidates and n_candidates < len(grid):
+        rng = np.random.default_rng(seed)
+        picked = sorted(rng.choice(len(grid), size=n_candidates, replace=False))
+        grid = [grid[i] for i in picked]
+    return grid
+
+
+def rung_budget(rung, n_origins, min_trees=MIN_TREES, max_trees=MAX_TREES, eta=ETA):
+    """(trees, folds) for a rung; both grow until they reach the full budget."""
+    trees = min(max_trees, min_trees * eta ** rung)
+    return trees, min(n_origins, rung + 1)
+
+
+# ======================================================
+# SCORING (RUNS IN WORKER PROCESSES)
+# ======================================================
+def score_candidate(matrix_folder, origins, horizon, params, features):
+    """Pooled walk-forward MAE of one candidate over the given fold origins."""
+    folds = [run_fold(matrix_folder, origin, horizon, params, features) for origin in origins]
+    return float(error_metrics(pd.concat(folds, ignore_index=True))["MAE"])
+
+
+# ======================================================
+# MAIN
+# ======================================================
+def run(df=None, n_candidates=N_CANDIDATES, eta=ETA, min_trees=MIN_TREES,
+        max_trees=MAX_TREES, n_folds=N_FOLDS, horizon=HORIZON, seed=SEED,
+        workers=WORKERS, save=True):
+    """Successive-halving search; writes model_config.json and returns the winner."""
+
+    with stage("TUNE: FEATURE MATRIX") as s:
+        if df is None:
+            df = read_dataset(DATA_PATH)
+        prepared, _ = prepare_training_frame(df)
+        matrix = FeatureMatrix.from_frame(prepared, DEFAULT_FEATURES, TARGET)
+        s.output(prepared, matrix_key=matrix.key)
+
+    origins = fold_origins(matrix.months(), n_folds, horizon)
+    if not origins:
+        raise ValueError("❌ Not enough history for a single tuning fold")
+
+    candidates = build_candidates(n_candidates, seed)
+    base_params = {k: v for k, v in DEFAULT_MODEL_PARAMS.items() if k != "n_estimators"}
+
+    print(f"🎯 {len(candidates)} candidates, {len(origins)} folds, horizon {horizon}, eta {eta}")
+
+    history = []
+    alive = list(range(len(candidates)))
+    rung = 0
+
+    while True:
+        trees, n_used = rung_budget(rung, len(origins), min_trees, max_trees, eta)
+        if len(alive) == 1:
+            # A lone survivor is scored once at the full budget, which is
+            # what the saved config (and so the trainer) will use
+            trees, n_used = max_trees, len(origins)
+        rung_origins = origins[-n_used:]
+        params = [
+            fold_params({**base_params, **candidates[i]["params"], "n_estimators": trees}, workers)
+            for i in alive
+        ]
+
+        with stage(f"TUNE: RUNG {rung + 1}", rows_in=len(alive)) as s:
+            scores = ordered_map(
+                score_candidate,
+                [matrix.folder] * len(alive),
+                [rung_origins] * len(alive),
+                [horizon] * len(alive),
+                params,
+                [FEATURE_SETS[candidates[i]["feature_set"]] for i in alive],
+                workers=workers
+            )
+            s.output(rows=len(alive), trees=trees, folds=n_used)
+
+        for i, score in zip(alive, scores):
+            history.append({
+                "RUNG": rung + 1,
+                "CANDIDATE": i,
+                "FEATURE_SET": candidates[i]["feature_set"],
+                **{k.upper(): v for k, v in candidates[i]["params"].items()},
+                "N_ESTIMATORS": trees,
+                "FOLDS": n_used,
+                "MAE": score,
+            })
+
+        ranked = [i for _, i in sorted(zip(scores, alive))]
+        print(f"🔁 Rung {rung + 1}: {len(alive)} candidates, {trees} trees, {n_used} folds "
+              f"-> best MAE {min(scores):.3f}")
+
+        final_budget = trees >= max_trees and n_used >= len(origins)
+        if final_budget:
+            best = ranked[0]
+            best_mae = min(scores)
+            break
+
+        alive = ranked[:max(1, math.ceil(len(alive) / eta))]
+        rung += 1
+
+    winner = candidates[best]
+    config = {
+        "params": {**{k: v for k, v in base_params.items() if k != "n_jobs"},
+                   **winner["params"], "n_estimators": trees},
+        "features": list(FEATURE_SETS[winner["feature_set"]]),
+        "feature_set": winner["feature_set"],
+        "mae": best_mae,
+        "horizon": horizon,
+        "folds": [str(pd.Timestamp(o).date()) for o in rung_origins],
+        "matrix_key": matrix.key,
+        "tuned_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+    results = pd.DataFrame(history)
+    results.to_csv(TUNING_RESULTS_PATH, index=False)
+
+    print("\n✅ Best configuration")
+    print(json.dumps(config, indent=2))
+    print(f"📄 All rungs: {TUNING_RESULTS_PATH}")
+
+    if save:
+        tmp_path = MODEL_CONFIG_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+        os.replace(tmp_path, MODEL_CONFIG_PATH)
+        print(f"📄 Trainer config saved at: {MODEL_CONFIG_PATH}")
+
+    return config, results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Successive-halving search over forest settings.")
+    parser.add_argument("--candidates", type=int, default=N_CANDIDATES, help="0 = whole grid")
+    parser.add_argument("--eta", type=int, default=ETA, help="keep the best 1/eta per rung")
+    parser.add_argument("--min-trees", type=int, default=MIN_TREES)
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES)
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="months per fold")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="0 = one per CPU core")
+    parser.add_argument("--no-save", action="store_true", help="don't write model_config.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(n_candidates=args.candidates, eta=args.eta, min_trees=args.min_trees,
+        max_trees=args.max_trees, n_folds=args.folds, horizon=args.horizon,
+        seed=args.seed, workers=args.workers, save=not args.no_save)